@@ -0,0 +1,23 @@
+import mikrolab_synthetic
+
+import os
+
+import pytest
+
+
+EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasource', 'influx-export.csv')
+# the real export has 69934 lines, the header takes three of them
+EXPORT_ROWS = 69931
+
+
+@pytest.fixture(scope='session', autouse=True)
+def influx_export():
+    # the real export is not in the repository, a synthetic one with the same layout stands in for it
+    if os.path.exists(EXPORT_PATH):
+        yield EXPORT_PATH
+        return
+    mikrolab_synthetic.write_export(EXPORT_PATH, EXPORT_ROWS)
+    try:
+        yield EXPORT_PATH
+    finally:
+        os.remove(EXPORT_PATH)
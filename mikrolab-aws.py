@@ -1,155 +1,603 @@
+import argparse
 import boto3
 import botocore
+import botocore.config
+import botocore.response
+import concurrent.futures
+import functools
+import io
 import logging
 import os
+import shutil
 import sys
+import time
+import uuid
+from boto3.s3.transfer import TransferConfig
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
+import mikrolab_cache
+import mikrolab_charts
+import mikrolab_codec
+import mikrolab_dataset
+import mikrolab_index
+import mikrolab_metrics
+import mikrolab_pipeline
 import mikrolab_source_data as mikrolab
+import mikrolab_time
 
-logging.basicConfig(filename='./logs/aws-mikrolab', level=logging.INFO)
+
+MB = 1024 * 1024
+MAX_TRANSFERS = 8
+CACHE_DIRECTORY = './aws-cache'
+CACHE_MAX_BYTES = 2048 * MB
+DATASET_PATH = './aws-dataset.npz'
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * MB,
+    multipart_chunksize=16 * MB,
+    max_concurrency=8,
+    use_threads=True
+)
+
+# buckets, local directories and charted attributes of the job, see run_job
+JOB = {
+    'source_bucket': 'ie-mikrolab-raw-data',
+    'converted_bucket': 'ie-mikrolab-converted-data',
+    'eda_bucket': 'ie-mikrolab-eda',
+    'data_directory': './aws-datasource',
+    'target_directory': './aws-converted',
+    'charts_directory': './aws-diagrams',
+    'attributes': ['co2_hum', 'co2_ppm', 'co2_tmp', 'ec', 'ph', 'rpi_t', 'rtd_t', 'tsl'],
+    'file_prefix': None,
+}
+
+# a directory standing in for S3 in dry runs, see use_local_s3
+_local_s3 = {'directory': None}
 
 
 def get_data_from_s3(bucket, source_file_name, target_file_name):
-    BUCKET_NAME = bucket
-    KEY = source_file_name  # replace with your object key
-    s3 = boto3.resource('s3')
     try:
-        s3.Bucket(BUCKET_NAME).download_file(KEY, target_file_name)
+        _download_file(bucket, source_file_name, target_file_name)
     except botocore.exceptions.ClientError as e:
-        if e.response['Error']['Code'] == "404":
+        if e.response['Error']['Code'] in ("404", "NoSuchKey"):
             print("The object does not exist.")
         else:
             raise
     return True
 
-def upload_converted_data(bucket, source_directory):
+def upload_converted_data(bucket, source_directory, cache_directory=None):
     print("uploading converted data to AWS")
     logging.info("uploading converted data to AWS")
-    s3 = boto3.client('s3')
-    files = os.listdir(source_directory)
-    filename = files[0]
-    source_file = os.path.join(source_directory, filename)
-    target_file = filename
-    s3.upload_file(source_file, bucket, target_file)
-    return True
+    files = [(os.path.join(source_directory, filename), filename)
+             for filename in mikrolab_dataset.converted_files(source_directory)]
+    return upload_files(bucket, files, cache_directory=cache_directory)
 
-def upload_charts(bucket, charts_directory):
-    print("uploading converted data to AWS")
-    logging.info("uploading converted data to AWS")
-    s3 = boto3.client('s3')
-    for filename in os.listdir(charts_directory):
-        source_file = os.path.join(charts_directory, filename)
-        target_file = filename
-        print("uploading file: " + filename + " data to AWS")
-        logging.info("uploading file: " + filename + " data to AWS")
-        s3.upload_file(source_file, bucket, target_file)
-    return True
+def upload_charts(bucket, charts_directory, cache_directory=None):
+    print("uploading charts to AWS")
+    logging.info("uploading charts to AWS")
+    files = [(os.path.join(charts_directory, filename), filename) for filename in os.listdir(charts_directory)]
+    return upload_files(bucket, files, cache_directory=cache_directory)
+
+def upload_files(bucket, files, max_workers=MAX_TRANSFERS, cache_directory=None):
+    files, keys = _pending_uploads(bucket, files, cache_directory)
+    upload = functools.partial(_upload_marked, bucket, cache_directory=cache_directory)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(upload, files, keys))
+
+def upload_file(bucket, file, cache_directory=None):
+    # one file as soon as it is there, None when it did not change since its last upload
+    files, keys = _pending_uploads(bucket, [file], cache_directory)
+    return _upload_marked(bucket, files[0], keys[0], cache_directory) if files else None
+
+def _pending_uploads(bucket, files, cache_directory):
+    keys = [None] * files.__len__()
+    if cache_directory is not None:
+        # a file is uploaded again only when its size or modification time changed
+        keys = [_upload_key(bucket, source_file, target_file) for source_file, target_file in files]
+        pending = [(file, key) for file, key in zip(files, keys) if not mikrolab_cache.is_marked(cache_directory, key)]
+        if pending.__len__() < files.__len__():
+            logging.info("skipping {} unchanged uploads".format(files.__len__() - pending.__len__()))
+        files, keys = [file for file, key in pending], [key for file, key in pending]
+    return files, keys
+
+def _upload_key(bucket, source_file, target_file):
+    return mikrolab_cache.cache_key('upload', bucket, target_file, mikrolab_cache.file_stamp(source_file))
+
+def _upload_marked(bucket, file, key, cache_directory=None):
+    transfer = _upload_file(file[0], bucket, file[1])
+    if key is not None:
+        mikrolab_cache.mark(cache_directory, key)
+    return transfer
+
+def download_files(bucket, files, max_workers=MAX_TRANSFERS):
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(lambda file: _download_file(bucket, file[0], file[1]), files))
+
+def use_local_s3(directory):
+    # every transfer goes to directory/<bucket>/<key> instead of S3, None goes back to S3
+    _local_s3['directory'] = directory
+    _s3_client.cache_clear()
+
+def source_etag(bucket, source_file_name):
+    return _s3_client().head_object(Bucket=bucket, Key=source_file_name)['ETag'].strip('"')
+
+def convert_cached(conversion_key, source_bucket, source_file_name, source_file_path, target_directory,
+                   file_prefix=None, cache_directory=CACHE_DIRECTORY, rollup_directory=None, mirror=None):
+    path = _cached_output(conversion_key, target_directory, cache_directory)
+    if path is not None:
+        return path, False
+    get_data_from_s3(source_bucket, source_file_name, source_file_path)
+    # a mirror gets a copy of the converted rows while they are written
+    if rollup_directory is None:
+        path = mikrolab.convert_file(source_file_path, target_directory, file_prefix, mirror=mirror)
+    else:
+        # the export only grows, only the new rows are converted and folded into the rollups
+        os.makedirs(rollup_directory, exist_ok=True)
+        path = mikrolab.convert_incremental(source_file_path, target_directory, file_prefix,
+                                            rollup_directory=rollup_directory, mirror=mirror)
+    if cache_directory is not None:
+        mikrolab_cache.store_value(cache_directory, conversion_key,
+                                   {'output': os.path.basename(path), 'stamp': mikrolab_cache.file_stamp(path)})
+    return path, True
+
+def _cached_output(conversion_key, target_directory, cache_directory):
+    # the key holds the ETag of the export, its output is used as long as it is still in place unchanged
+    if cache_directory is None:
+        return None
+    converted = mikrolab_cache.fetch_value(cache_directory, conversion_key)
+    if converted is None:
+        return None
+    path = os.path.join(target_directory, converted['output'])
+    if not os.path.isfile(path) or mikrolab_cache.file_stamp(path) != converted['stamp']:
+        return None
+    print("converted data unchanged, using " + path)
+    logging.info("converted data unchanged, using " + path)
+    return path
+
+def convert_uploaded(conversion_key, source_bucket, source_file_name, source_file_path, target_directory,
+                     target_bucket, file_prefix=None, cache_directory=CACHE_DIRECTORY, rollup_directory=None):
+    # the converted rows are uploaded in parts while the export is parsed, the transfer is None when nothing changed
+    path = _cached_output(conversion_key, target_directory, cache_directory)
+    if path is not None:
+        return path, None
+    start = time.perf_counter()
+    client = _s3_client()
+    # the final name depends on the last data point, so the rows go to a temporary key first
+    part_key = source_file_name + '.' + uuid.uuid4().hex + '.part'
+    with S3MultipartWriter(client, target_bucket, part_key) as writer:
+        path = convert_cached(conversion_key, source_bucket, source_file_name, source_file_path, target_directory,
+                              file_prefix, cache_directory, rollup_directory, writer)[0]
+    target_file = os.path.basename(path)
+    client.copy({'Bucket': target_bucket, 'Key': part_key}, target_bucket, target_file, Config=TRANSFER_CONFIG)
+    client.delete_object(Bucket=target_bucket, Key=part_key)
+    # the converted file is not uploaded again
+    if cache_directory is not None:
+        mikrolab_cache.mark(cache_directory, _upload_key(target_bucket, path, target_file))
+    return path, _report_transfer("uploaded", target_file, writer.size, time.perf_counter() - start)
+
+def render_charts_cached(conversion_key, charts_directory, jobs, load_dataset, cache_directory=CACHE_DIRECTORY,
+                         workers=None):
+    return [filename for filename, rendered in iter_charts_cached(
+        conversion_key, charts_directory, jobs, load_dataset, cache_directory, workers) if rendered]
+
+def iter_charts_cached(conversion_key, charts_directory, jobs, load_dataset, cache_directory=CACHE_DIRECTORY,
+                       workers=None):
+    # every chart as soon as it is there, the cached ones first, then the others in the order they are rendered
+    missing, keys = [], {}
+    for chart, filename, kwargs in jobs:
+        keys[filename] = mikrolab_cache.cache_key('chart', conversion_key, os.path.basename(filename), chart, kwargs)
+        if cache_directory is not None and mikrolab_cache.fetch(cache_directory, keys[filename], charts_directory):
+            yield filename, False
+        else:
+            missing.append((chart, filename, kwargs))
+    # the dataset is only needed when a chart has to be rendered
+    if missing:
+        for filename in mikrolab_charts.render_charts(load_dataset(), missing, workers):
+            print("rendered " + filename)
+            if cache_directory is not None:
+                mikrolab_cache.store(cache_directory, keys[filename], [filename])
+            yield filename, True
+
+def convert_from_s3(source_bucket, source_file_name, target_bucket, file_prefix=None, minimal_length=4, codec=None,
+                    level=None):
+    print("converting " + source_file_name + " from S3 to S3")
+    logging.info("converting " + source_file_name + " from S3 to S3")
+    start = time.perf_counter()
+    client = _s3_client()
+    with mikrolab_metrics.stage('s3_convert', key=source_file_name) as record:
+        body = client.get_object(Bucket=source_bucket, Key=source_file_name)['Body']
+        source_codec = mikrolab_codec.codec_from_name(source_file_name)
+        if source_codec is None:
+            lines = (line.decode() for line in body.iter_lines(chunk_size=TRANSFER_CONFIG.multipart_chunksize))
+        else:
+            # compressed exports are decoded while the body streams in
+            lines = mikrolab_codec.open_input(body, codec=source_codec)
+        location, feature_names, column_lengths, data_points = \
+            mikrolab.process_stream(mikrolab.read_raw_lines(lines, minimal_length))
+
+        # the final name depends on the last data point, so the rows go to a temporary key first
+        part_key = source_file_name + '.' + uuid.uuid4().hex + '.part'
+        with S3MultipartWriter(client, target_bucket, part_key) as writer:
+            out = writer if codec is None else mikrolab_codec.open_output(writer, codec=codec, level=level)
+            first_time, last_time, next_id = mikrolab.write_csv_rows(out, feature_names, data_points)
+            if not first_time:
+                raise mikrolab.NoDataPoints(location, "No data points to write")
+            if out is not writer:
+                out.close()
+        record.update(rows=next_id - 1, bytes=writer.size)
+    target_file = mikrolab.target_filename(file_prefix, location, first_time, last_time,
+                                           '.csv' + mikrolab_codec.extension(codec))
+    client.copy({'Bucket': target_bucket, 'Key': part_key}, target_bucket, target_file, Config=TRANSFER_CONFIG)
+    client.delete_object(Bucket=target_bucket, Key=part_key)
+    _report_transfer("converted", target_file, writer.size, time.perf_counter() - start)
+    return target_file
+
+class S3MultipartWriter:
+    def __init__(self, client, bucket, key, part_size=TRANSFER_CONFIG.multipart_chunksize,
+                 max_pending=TRANSFER_CONFIG.max_request_concurrency):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_pending = max_pending
+        self.size = 0
+        self.buffer = io.BytesIO()
+        self.pending = []
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_pending)
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+
+    def write(self, data):
+        # text from the csv writer, bytes from a compressor
+        data = data.encode() if isinstance(data, str) else data
+        self.buffer.write(data)
+        if self.buffer.tell() >= self.part_size:
+            self._upload_part()
+        return data.__len__()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buffer.tell() or not self.pending:
+            self._upload_part()
+        parts = [future.result() for future in self.pending]
+        self.pool.shutdown()
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                              MultipartUpload={'Parts': parts})
+
+    def abort(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _upload_part(self):
+        # parts are uploaded in the background, only max_pending parts are kept in memory
+        running = [future for future in self.pending if not future.done()]
+        if running.__len__() >= self.max_pending:
+            concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        self.size += data.__len__()
+        self.pending.append(self.pool.submit(self._send_part, self.pending.__len__() + 1, data))
+
+    def _send_part(self, number, data):
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=number, Body=data)
+        return {'ETag': response['ETag'], 'PartNumber': number}
+
+class LocalS3Client:
+    # the calls of this module against a directory with one sub directory per bucket, for dry runs
+    def __init__(self, directory):
+        self.directory = directory
+
+    def head_object(self, Bucket, Key):
+        path = self._existing(Bucket, Key, 'HeadObject')
+        return {'ETag': '"' + mikrolab_cache.file_digest(path) + '"', 'ContentLength': os.path.getsize(path)}
+
+    def get_object(self, Bucket, Key):
+        path = self._existing(Bucket, Key, 'GetObject')
+        return {'Body': botocore.response.StreamingBody(open(path, 'rb'), os.path.getsize(path))}
+
+    def put_object(self, Bucket, Key, Body):
+        with open(self._target(Bucket, Key), 'wb') as fh:
+            fh.write(Body.encode() if isinstance(Body, str) else Body)
+        return {}
+
+    def download_file(self, Bucket, Key, Filename, Config=None):
+        shutil.copyfile(self._existing(Bucket, Key, 'HeadObject'), Filename)
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        shutil.copyfile(Filename, self._target(Bucket, Key))
 
-def build_dataset(source_directory):
+    def copy(self, CopySource, Bucket, Key, Config=None):
+        source = self._existing(CopySource['Bucket'], CopySource['Key'], 'CopyObject')
+        shutil.copyfile(source, self._target(Bucket, Key))
+
+    def delete_object(self, Bucket, Key):
+        path = os.path.join(self.directory, Bucket, Key)
+        if os.path.exists(path):
+            os.remove(path)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._part(upload_id, 0))
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with open(self._part(UploadId, PartNumber), 'wb') as fh:
+            fh.write(Body)
+        return {'ETag': '"{}"'.format(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        with open(self._target(Bucket, Key), 'wb') as out:
+            for part in MultipartUpload['Parts']:
+                with open(self._part(UploadId, part['PartNumber']), 'rb') as fh:
+                    shutil.copyfileobj(fh, out)
+        shutil.rmtree(self._part(UploadId, 0))
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        shutil.rmtree(self._part(UploadId, 0), ignore_errors=True)
+        return {}
+
+    def _existing(self, bucket, key, operation):
+        path = os.path.join(self.directory, bucket, key)
+        if not os.path.isfile(path):
+            raise botocore.exceptions.ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+        return path
+
+    def _target(self, bucket, key):
+        path = os.path.join(self.directory, bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _part(self, upload_id, number):
+        # part 0 is the directory of the upload
+        path = os.path.join(self.directory, '.uploads', upload_id)
+        return os.path.join(path, str(number)) if number else path
+
+# one client for all transfers, boto3 clients are thread safe, sessions are not
+@functools.lru_cache(maxsize=None)
+def _s3_client():
+    if _local_s3['directory'] is not None:
+        return LocalS3Client(_local_s3['directory'])
+    session = boto3.session.Session()
+    config = botocore.config.Config(max_pool_connections=MAX_TRANSFERS * TRANSFER_CONFIG.max_request_concurrency)
+    return session.client('s3', config=config)
+
+def _upload_file(source_file, bucket, target_file):
+    start = time.perf_counter()
+    with mikrolab_metrics.stage('s3_upload', key=target_file, bytes=os.path.getsize(source_file)):
+        _s3_client().upload_file(source_file, bucket, target_file, Config=TRANSFER_CONFIG)
+    return _report_transfer("uploaded", target_file, os.path.getsize(source_file), time.perf_counter() - start)
+
+def _download_file(bucket, source_file, target_file):
+    start = time.perf_counter()
+    with mikrolab_metrics.stage('s3_download', key=source_file) as record:
+        _s3_client().download_file(bucket, source_file, target_file, Config=TRANSFER_CONFIG)
+        record.update(bytes=os.path.getsize(target_file))
+    return _report_transfer("downloaded", source_file, os.path.getsize(target_file), time.perf_counter() - start)
+
+def _report_transfer(action, key, size, seconds):
+    throughput = size / MB / seconds if seconds else 0.0
+    message = "{} {} ({} bytes) in {:.2f} s, {:.2f} MB/s".format(action, key, size, seconds, throughput)
+    print(message)
+    logging.info(message)
+    return {'key': key, 'bytes': size, 'seconds': seconds, 'throughput': throughput}
+
+def build_dataset(source_directory, merge_tolerance=None, start=None, end=None):
     print("building dataset")
     logging.info("building dataset")
-    files = os.listdir(source_directory)
-    filename = files[0]
-    source_file = os.path.join(source_directory, filename)
-    data = pd.read_csv(source_file)
+    with mikrolab_metrics.stage('build_dataset') as record:
+        data = _build_dataset(source_directory, merge_tolerance, start, end)
+        record.update(rows=data.__len__())
+    return data
+
+def _build_dataset(source_directory, merge_tolerance, start, end):
+    files = mikrolab_dataset.converted_files(source_directory)
+    # prefer the binary columnar format, it is memory mapped instead of parsed
+    binary_files = [filename for filename in files if filename.endswith('.npz')]
+    if binary_files:
+        parts = []
+        for filename in binary_files:
+            feature_names, columns = mikrolab.read_npz_file(os.path.join(source_directory, filename), mmap_mode='c')
+            if start is not None or end is not None:
+                columns = mikrolab_index.slice_columns(feature_names, columns, start, end)
+            parts.append(columns)
+        columns = _ordered_columns(feature_names, parts)
+        if merge_tolerance is not None:
+            columns = mikrolab.merge_sparse_rows(feature_names, columns, merge_tolerance)
+        return _complete_data(_utc_frame(feature_names, columns))
+    if start is not None or end is not None:
+        # only the rows around [start, end) are read, from every converted file covering it
+        data = mikrolab_index.read_directory_window(source_directory, start, end)
+    else:
+        data = pd.concat([pd.read_csv(os.path.join(source_directory, filename)) for filename in files],
+                         ignore_index=True)
+        data.time = mikrolab_time.to_datetime(data.time.to_numpy())
     data.drop(['ID'], axis=1, inplace=True)
-    data.time = pd.to_datetime(data.time)
+    data = _ordered_frame(data)
     data.set_index('time', inplace=True)
+    if merge_tolerance is not None:
+        data = mikrolab.merge_sparse_frame(data, merge_tolerance)
+    return _complete_data(data)
+
+def _utc_frame(feature_names, columns):
+    # typed columns hold UTC times without a zone, the frame has the zone of one read from csv
+    data = mikrolab.to_frame(feature_names, columns)
+    data.index = data.index.tz_localize('UTC')
+    return data
+
+def _ordered_columns(feature_names, parts):
+    # files of overlapping exports hold the same rows, a row is kept once by its time
+    if parts.__len__() == 1:
+        return parts[0]
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in feature_names}
+    time = columns[feature_names[0]]
+    order = np.argsort(time, kind='stable')
+    keep = np.ones(time.size, dtype=bool)
+    keep[1:] = time[order][1:] != time[order][:-1]
+    return {name: values[order[keep]] for name, values in columns.items()}
+
+def _ordered_frame(data):
+    if not data.time.is_monotonic_increasing:
+        data = data.sort_values('time', kind='stable', ignore_index=True)
+    return data[~data.time.duplicated()]
+
+def build_dataset_chunks(source_directory, chunk_rows=mikrolab_dataset.CHUNK_ROWS, start=None, end=None):
+    # the same dataset as build_dataset, a bounded number of rows at a time
+    print("building dataset in chunks")
+    logging.info("building dataset in chunks")
+    return mikrolab_dataset.build_chunks(source_directory, chunk_rows, start, end)
+
+def build_dataset_from_export(source_file, merge_tolerance=None):
+    print("building dataset from export")
+    logging.info("building dataset from export")
+    with mikrolab_metrics.stage('build_dataset_from_export') as record:
+        location, feature_names, column_lengths, data = mikrolab.read_columns(
+            source_file, as_frame=True, merge_tolerance=merge_tolerance)
+        data.index = data.index.tz_localize('UTC')
+        data = _complete_data(data)
+        record.update(rows=data.__len__())
+    return data
+
+def _complete_data(data):
     data.replace(to_replace=0, value=np.nan, inplace=True)
-    data.fillna(method='ffill', inplace=True)
-    data.fillna(method='bfill', inplace=True)
+    data.ffill(inplace=True)
+    data.bfill(inplace=True)
     return data
 
-def hourly_resampling(data, charts_directory):
+def hourly_resampling(data, charts_directory, rollup_directory=None, location=None):
     print("resampling data")
     logging.info("resampling data")
-    hourly = data.resample('H').sum()
-    # hourly.plot(['ec', 'ph', 'rpi_t'], style=[':', '--', '-'])
-    hourly.plot(style=[':', '--', '-'])
     resampled_chart_file = os.path.join(charts_directory, 'eda_mikrolab_hourly_resampling.png')
-    plt.savefig(resampled_chart_file, dpi=600, format='png')
+    mikrolab_charts.hourly_resampling(data, resampled_chart_file, rollup_directory=rollup_directory, location=location)
 
 def desc_num_feature(dataframe, feature_name, directory, bins=30, edgecolor='k', **kwargs):
     print("plotting " + feature_name)
     logging.info("plotting " + feature_name)
-    fig, ax = plt.subplots(figsize=(8, 4))
-    dataframe[feature_name].hist(bins=bins, edgecolor=edgecolor, ax=ax, **kwargs)
-    ax.set_title(feature_name, size=15)
-    plt.figtext(1, 0.15, str(dataframe[feature_name].describe().round(2)), size=17)
     filename = os.path.join(directory, feature_name + '.png')
-    plt.savefig(filename, dpi=300, format='png')
+    mikrolab_charts.desc_num_feature(dataframe, feature_name, filename, bins=bins, edgecolor=edgecolor, **kwargs)
     return True
 
-def correlation_chart(dataframe, directory):
+def correlation_chart(dataframe, directory, mode='pairplot', sample_size=None):
     print("plotting correlations")
     logging.info("plotting correlations")
-    sns.pairplot(
-        data=dataframe[['co2_hum', 'co2_ppm', 'co2_tmp', 'rpi_t', 'rtd_t', 'tsl']],
-        plot_kws={"s": 2},
-        diag_kind='kde'
-    )
     filename = os.path.join(directory, 'eda_mikrolab_selective_kde.png')
-    plt.savefig(filename, dpi=300, format='png')
-
-
-# DONE - download and store data from S3
-# DONE - upload file to S3
-# DONE EDA and upload charts to AWS S3 bucket
+    mikrolab_charts.correlation_chart(dataframe, filename, mode=mode, sample_size=sample_size)
 
-if __name__ == '__main__':
+def chart_jobs(charts_directory, attributes):
+    # the hourly chart sums the completed data, the rollups only hold the sums of the measured values
+    jobs = [('hourly_resampling', os.path.join(charts_directory, 'eda_mikrolab_hourly_resampling.png'), {})]
+    for attribute in attributes:
+        jobs.append(('desc_num_feature', os.path.join(charts_directory, attribute + '.png'), {'feature_name': attribute}))
+    # the binned grid takes the same time for any number of rows, a full pairplot does not
+    jobs.append(('correlation_chart', os.path.join(charts_directory, 'eda_mikrolab_selective_kde.png'),
+                 {'mode': 'binned'}))
+    return jobs
 
-    source_file_name = 'influx-export.csv'
+def load_job_dataset(downloaded, source_file_path, target_directory, dataset_path=DATASET_PATH):
+    # read dataset straight from the export when it was downloaded, no need to parse the converted csv again
+    if downloaded:
+        dataset = build_dataset_from_export(source_file_path)
+    else:
+        # the converted history is cleaned chunk by chunk and memory mapped, it does not have to fit in memory
+        dataset = mikrolab_dataset.read_dataset(
+            mikrolab_dataset.write_dataset(build_dataset_chunks(target_directory), dataset_path))
+    print(dataset.corr())
+    logging.info(dataset.corr())
+    return dataset
 
-    source_bucket       = 'ie-mikrolab-raw-data'
-    converted_bucket    = 'ie-mikrolab-converted-data'
-    eda_bucket          = 'ie-mikrolab-eda'
+def run_job(source_bucket, source_file_name, converted_bucket, eda_bucket, data_directory, target_directory,
+            charts_directory, attributes, file_prefix=None, cache_directory=CACHE_DIRECTORY,
+            rollup_directory=None, dataset_path=DATASET_PATH, workers=None, queue_size=mikrolab_pipeline.QUEUE_SIZE):
+    # the stages overlap: the converted rows are uploaded while the export is parsed, the other files while the charts
+    # are rendered, every chart is uploaded as soon as it is rendered, and bounded queues hold back a stage that runs
+    # ahead of the uploads
+    source_file_path = os.path.join(data_directory, source_file_name)
+    # a cache_directory of None disables the cache, every stage runs and every file is uploaded
+    # no chart reads rollups, they sum the measured values and the charts the completed data, so a job builds them
+    # only when given a rollup_directory
+    # every stage is skipped when its inputs did not change since the last run
+    conversion_key = mikrolab_cache.cache_key(
+        'convert', source_bucket, source_file_name, source_etag(source_bucket, source_file_name), file_prefix)
 
-    target_directory = "./aws-converted"
-    target_file_prefix = None
-    data_directory = './aws-datasource'
-    charts_directory = './aws-diagrams'
-    # source_file = 'influx-export-short.csv'
-    source_file = 'influx-export.csv'
-    attributes = ['co2_hum', 'co2_ppm', 'co2_tmp', 'ec', 'ph', 'rpi_t', 'rtd_t', 'tsl']
+    def convert(job):
+        converted_file, transfer = convert_uploaded(
+            conversion_key, source_bucket, source_file_name, source_file_path, target_directory, converted_bucket,
+            file_prefix, cache_directory, rollup_directory)
+        if transfer is not None:
+            yield converted_bucket, transfer
+        for filename in mikrolab_dataset.converted_files(target_directory):
+            # the converted file went up while it was written, cache or no cache
+            if transfer is None or filename != transfer['key']:
+                yield converted_bucket, os.path.join(target_directory, filename)
+        # the charts wait for the conversion
+        yield None, transfer is not None
 
-    print("Downloading data from AWS S3")
-    logging.info("Downloading data from AWS S3")
-    get_data_from_s3(source_bucket, source_file_name, os.path.join(data_directory, source_file))
+    def render(item):
+        bucket, value = item
+        if bucket is not None:
+            yield item
+            return
+        jobs = chart_jobs(charts_directory, attributes)
+        load_dataset = functools.partial(load_job_dataset, value, source_file_path, target_directory,
+                                         dataset_path)
+        for filename, rendered in iter_charts_cached(conversion_key, charts_directory, jobs, load_dataset,
+                                                     cache_directory, workers):
+            yield eda_bucket, filename
 
-    source_file_path = os.path.join(data_directory, source_file)
-    source_data = mikrolab.read_raw_file(source_file_path)
+    def upload(item):
+        bucket, path = item
+        if isinstance(path, dict):
+            # uploaded while it was converted
+            yield path
+            return
+        transfer = upload_file(bucket, (path, os.path.basename(path)), cache_directory)
+        if transfer is not None:
+            yield transfer
 
-    for index in range(10):
-        print("{}".format(source_data[index]))
+    with mikrolab_metrics.stage('aws_job') as record:
+        transfers = mikrolab_pipeline.run_stages(
+            [source_file_name], [('convert', convert, 1), ('render', render, 1), ('upload', upload, MAX_TRANSFERS)],
+            queue_size)
+        record.update(files=transfers.__len__(), bytes=sum(transfer['bytes'] for transfer in transfers))
+    if cache_directory is not None:
+        mikrolab_cache.evict(cache_directory, CACHE_MAX_BYTES)
+    return transfers
 
-    sd_location, sd_feature_names, sd_column_lengths, sd_dataset = mikrolab.process_data(source_data)
 
-    print("Location: {}".format(sd_location))
-    print("Feature names: {}".format(",".join(sd_feature_names)))
-    print("Column lengths: {}".format(",".join(str(l) for l in sd_column_lengths)))
-    print("number of data points: {}".format(sd_dataset.__len__()))
-    print("last datapoint: {}".format(sd_dataset[-20:-1]))
+# DONE - download and store data from S3
+# DONE - upload file to S3
+# DONE EDA and upload charts to AWS S3 bucket
 
-    mikrolab.write_csv_file(target_directory, target_file_prefix, sd_location, sd_feature_names, sd_dataset)
-    upload_converted_data(converted_bucket, target_directory)
+if __name__ == '__main__':
 
-    # read dataset
-    dataset = build_dataset(target_directory)
-    # create charts
-    hourly_resampling(dataset, charts_directory)
-    for attribute in attributes:
-        desc_num_feature(dataset, attribute, charts_directory)
-    correlation_chart(dataset, charts_directory)
+    parser = argparse.ArgumentParser(description="convert the export in S3, chart it and upload both")
+    parser.add_argument('--dry-run', metavar='DIRECTORY',
+                        help="use a directory with one sub directory per bucket instead of S3")
+    parser.add_argument('--source-file', default='influx-export.csv')
+    parser.add_argument('--workers', type=int, help="processes rendering charts")
+    parser.add_argument('--queue-size', type=int, default=mikrolab_pipeline.QUEUE_SIZE)
+    arguments = parser.parse_args()
 
-    print(dataset.corr())
-    logging.info(dataset.corr())
+    logging.basicConfig(filename='./logs/aws-mikrolab', level=logging.INFO)
+    # timings of every stage go to ./logs/aws-mikrolab-metrics, MIKROLAB_METRICS_SUMMARY=1 prints them at exit
+    mikrolab_metrics.configure('./logs/aws-mikrolab-metrics')
+    if arguments.dry_run:
+        use_local_s3(arguments.dry_run)
 
-    # upload charts
-    upload_charts(eda_bucket, charts_directory)
+    run_job(source_file_name=arguments.source_file, workers=arguments.workers, queue_size=arguments.queue_size,
+            **JOB)
 
     sys.exit(0)
\ No newline at end of file
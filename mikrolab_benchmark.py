@@ -0,0 +1,166 @@
+import mikrolab_charts
+import mikrolab_cli
+import mikrolab_source_data as mikrolab
+import mikrolab_synthetic
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+
+def benchmark_workers(source_path, workers=(1, 2, 4, 8, 16), repeat=3):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for count in workers:
+            convert = _best_of(repeat, lambda: mikrolab.convert_file(source_path, directory, workers=count))
+            columns = _best_of(repeat, lambda: mikrolab.read_columns(source_path, workers=count))
+            results.append((count, convert, columns))
+    return results
+
+
+def print_speedup(results):
+    print("{:>8} {:>12} {:>8} {:>12} {:>8}".format('workers', 'convert [s]', 'speedup', 'columns [s]', 'speedup'))
+    for count, convert, columns in results:
+        print("{:>8} {:>12.3f} {:>8.2f} {:>12.3f} {:>8.2f}".format(
+            count, convert, results[0][1] / convert, columns, results[0][2] / columns))
+
+
+def benchmark_pipeline(source_path, repeat=3):
+    aws = mikrolab_cli.load_aws()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        raw_data = mikrolab.read_raw_file(source_path)
+        location, feature_names, column_lengths, data_points = mikrolab.process_data(raw_data)
+        converted = os.path.join(directory, 'converted')
+        os.mkdir(converted)
+        stages = [
+            ('read_raw_file', lambda: mikrolab.read_raw_file(source_path)),
+            ('process_data', lambda: mikrolab.process_data(raw_data)),
+            ('write_csv_file', lambda: mikrolab.write_csv_file(converted, None, location, feature_names, data_points)),
+            ('build_dataset', lambda: aws.build_dataset(converted)),
+        ]
+        for name, function in stages:
+            results[name] = _measure(repeat, function, data_points.__len__())
+
+        dataset = aws.build_dataset(converted)
+        charts = [
+            ('hourly_resampling', lambda: mikrolab_charts.hourly_resampling(
+                dataset, os.path.join(directory, 'hourly.png'))),
+            ('desc_num_feature', lambda: mikrolab_charts.desc_num_feature(
+                dataset, 'co2_hum', os.path.join(directory, 'co2_hum.png'))),
+            ('correlation_chart', lambda: mikrolab_charts.correlation_chart(
+                dataset, os.path.join(directory, 'correlation.png'), mode='binned')),
+        ]
+        for name, function in charts:
+            results[name] = _measure(repeat, function, dataset.__len__())
+    return results
+
+
+def write_report(path, source_path, results):
+    report = {
+        'source': os.path.basename(source_path),
+        'source_bytes': os.path.getsize(source_path),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(path, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    return report
+
+
+def compare_reports(baseline, current, tolerance=0.2):
+    # only the same input on the same kind of machine is comparable
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        for metric in ['seconds', 'peak_bytes']:
+            before, after = baseline['results'][name][metric], result[metric]
+            if after > before * (1 + tolerance):
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def print_results(results):
+    print("{:>20} {:>12} {:>14} {:>12}".format('stage', 'time [s]', 'rows/s', 'peak [MB]'))
+    for name, result in results.items():
+        print("{:>20} {:>12.3f} {:>14.0f} {:>12.1f}".format(
+            name, result['seconds'], result['rows_per_second'], result['peak_bytes'] / 2 ** 20))
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _measure(repeat, function, rows):
+    seconds = _best_of(repeat, function)
+    # a separate run, tracing allocations slows the timed runs down
+    tracemalloc.start()
+    try:
+        function()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': seconds, 'peak_bytes': peak_bytes, 'rows': rows, 'rows_per_second': rows / seconds}
+
+
+def _best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="mikrolab benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    workers_command = commands.add_parser('workers', help="speedup of the parallel converter")
+    workers_command.add_argument('source', nargs='?', default=os.path.join('./datasource', 'influx-export.csv'))
+    workers_command.add_argument('counts', nargs='*', type=int, default=[1, 2, 4, 8, 16])
+    pipeline_command = commands.add_parser('pipeline', help="time and peak memory of every pipeline stage")
+    pipeline_command.add_argument('--source', help="export to benchmark, a synthetic one is generated otherwise")
+    pipeline_command.add_argument('--rows', type=int, default=100000)
+    pipeline_command.add_argument('--repeat', type=int, default=3)
+    pipeline_command.add_argument('--output', default='benchmark.json')
+    pipeline_command.add_argument('--baseline', help="earlier report, regressions make the run fail")
+    pipeline_command.add_argument('--tolerance', type=float, default=0.2)
+    arguments = parser.parse_args()
+
+    if arguments.command == 'workers':
+        print_speedup(benchmark_workers(arguments.source, arguments.counts))
+        sys.exit(0)
+
+    mikrolab_charts.matplotlib.use('Agg')
+    with tempfile.TemporaryDirectory() as synthetic_directory:
+        source_file_path = arguments.source or mikrolab_synthetic.write_export(
+            os.path.join(synthetic_directory, 'influx-export.csv'), arguments.rows)
+        pipeline_results = benchmark_pipeline(source_file_path, arguments.repeat)
+        current_report = write_report(arguments.output, source_file_path, pipeline_results)
+    print_results(pipeline_results)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_fh:
+            found = compare_reports(json.load(baseline_fh), current_report, arguments.tolerance)
+        for stage, metric, before, after in found:
+            print("regression in {} {}: {:.3f} -> {:.3f}".format(stage, metric, before, after))
+        sys.exit(1 if found else 0)
+
+    sys.exit(0)
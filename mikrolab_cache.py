@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+
+# artifacts are stored by key, one directory per key holding the files with their original names
+
+def cache_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stamp(path):
+    # size and modification time stand in for the content, they cost a stat instead of a read of the whole file
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def fetch(cache_directory, key, target_directory):
+    entry = _entry_path(cache_directory, key)
+    if not os.path.isdir(entry):
+        return None
+    paths = []
+    for filename in sorted(os.listdir(entry)):
+        path = os.path.join(target_directory, filename)
+        # copies keep the modification time, so a fetched file has the stamp of the one stored
+        shutil.copy2(os.path.join(entry, filename), path)
+        paths.append(path)
+    # the modification time of an entry is its last use, see evict
+    os.utime(entry)
+    logging.info("cache hit {}".format(key))
+    return paths
+
+
+def store(cache_directory, key, paths):
+    entry = _entry_path(cache_directory, key)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    part_path = tempfile.mkdtemp(suffix='.part', dir=os.path.dirname(entry))
+    for path in paths:
+        shutil.copy2(path, os.path.join(part_path, os.path.basename(path)))
+    if os.path.isdir(entry):
+        shutil.rmtree(entry)
+    os.replace(part_path, entry)
+    return entry
+
+
+def store_value(cache_directory, key, value):
+    # a small record instead of files, e.g. which output a conversion left where
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, _VALUE)
+        with open(path, 'w') as fh:
+            json.dump(value, fh)
+        return store(cache_directory, key, [path])
+
+
+def fetch_value(cache_directory, key):
+    entry = _entry_path(cache_directory, key)
+    if not os.path.isfile(os.path.join(entry, _VALUE)):
+        return None
+    with open(os.path.join(entry, _VALUE)) as fh:
+        value = json.load(fh)
+    os.utime(entry)
+    logging.info("cache hit {}".format(key))
+    return value
+
+
+def is_marked(cache_directory, key):
+    return os.path.isdir(_entry_path(cache_directory, key))
+
+
+def mark(cache_directory, key):
+    return store(cache_directory, key, [])
+
+
+def evict(cache_directory, max_bytes):
+    entries = []
+    for prefix in os.listdir(cache_directory) if os.path.isdir(cache_directory) else []:
+        for key in os.listdir(os.path.join(cache_directory, prefix)):
+            entry = os.path.join(cache_directory, prefix, key)
+            size = sum(os.path.getsize(os.path.join(entry, filename)) for filename in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+
+    # least recently used first
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, entry in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry)
+        total -= size
+        evicted.append(entry)
+    if evicted:
+        logging.info("evicted {} cache entries, {} bytes left".format(evicted.__len__(), total))
+    return evicted
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+_VALUE = '.value.json'
+
+
+def _entry_path(cache_directory, key):
+    return os.path.join(cache_directory, key[:2], key)
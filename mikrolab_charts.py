@@ -0,0 +1,212 @@
+import mikrolab_metrics
+import mikrolab_rollup
+import mikrolab_source_data as mikrolab
+import mikrolab_stats
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+import concurrent.futures
+import logging
+import os
+import tempfile
+
+
+CORRELATION_FEATURES = ['co2_hum', 'co2_ppm', 'co2_tmp', 'rpi_t', 'rtd_t', 'tsl']
+
+
+def hourly_resampling(data, filename, dpi=600, rollup_directory=None, location=None):
+    with mikrolab_metrics.stage('hourly_resampling'):
+        hourly = hourly_sums(data, rollup_directory, location)
+        ax = hourly.plot(style=[':', '--', '-'])
+        _save(ax.figure, filename, dpi)
+    return filename
+
+
+def hourly_sums(data, rollup_directory=None, location=None):
+    # rollups hold the sums of the measured values, they answer the query only for rows that were not completed
+    with mikrolab_metrics.stage('resample') as record:
+        if rollup_directory is not None and mikrolab_rollup.choose_resolution(rollup_directory, location, 'h'):
+            hourly = mikrolab_rollup.resample(rollup_directory, location, 'h')
+            if data is not None and data.index.tz is not None:
+                hourly.index = hourly.index.tz_localize('UTC').tz_convert(data.index.tz)
+            record.update(source='rollup')
+        else:
+            hourly = data.resample('h').sum()
+            record.update(source='rows', rows=data.__len__())
+    return hourly
+
+
+def desc_num_feature(data, feature_name, filename, bins=30, edgecolor='k', dpi=300, stats=None, **kwargs):
+    # statistics collected while streaming replace the passes over the column
+    rows = data.__len__() if stats is None else stats[feature_name]['count']
+    with mikrolab_metrics.stage('desc_num_feature', feature=feature_name, rows=rows):
+        fig, ax = plt.subplots(figsize=(8, 4))
+        if stats is None:
+            data[feature_name].hist(bins=bins, edgecolor=edgecolor, ax=ax, **kwargs)
+            description = data[feature_name].describe()
+        else:
+            counts, edges = mikrolab_stats.histogram(stats[feature_name], bins)
+            ax.hist(edges[:-1], edges, weights=counts, edgecolor=edgecolor, **kwargs)
+            ax.grid(True)
+            description = mikrolab_stats.describe({feature_name: stats[feature_name]})[feature_name]
+        ax.set_title(feature_name, size=15)
+        fig.text(1, 0.15, str(description.round(2)), size=17)
+        _save(fig, filename, dpi)
+    return filename
+
+
+def correlation_chart(data, filename, features=CORRELATION_FEATURES, dpi=300, mode='pairplot', bins=64,
+                      sample_size=None):
+    if mode not in ('pairplot', 'binned'):
+        raise ValueError("Unknown mode: {}".format(mode))
+    with mikrolab_metrics.stage('correlation_chart', mode=mode, rows=data.__len__()):
+        if sample_size is not None:
+            data = stratified_sample(data, sample_size)
+        if mode == 'pairplot':
+            fig = sns.pairplot(data=data[features], plot_kws={"s": 2}, diag_kind='kde').figure
+        else:
+            fig = _binned_pairplot(data[features].to_numpy(dtype=np.float64), features, bins)
+        _save(fig, filename, dpi)
+    return filename
+
+
+# rows are drawn evenly from equal time intervals, so quiet and busy periods keep their share
+def stratified_sample(data, sample_size, strata=100, seed=0):
+    if data.__len__() <= sample_size:
+        return data
+    # the integers of the index, a tz-aware index would otherwise become an array of objects
+    time = data.index.asi8
+    width = max((time.max() - time.min()) // strata + 1, 1)
+    stratum = (time - time.min()) // width
+    counts = np.bincount(stratum, minlength=strata)
+    quota = np.round(counts * sample_size / data.__len__()).astype(np.int64)
+
+    # random order inside each stratum, the first quota rows of each stratum are kept
+    order = np.lexsort((np.random.default_rng(seed).random(time.__len__()), stratum))
+    rank = np.arange(order.__len__()) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = np.sort(order[rank < quota[stratum[order]]])
+    return data.iloc[keep]
+
+
+CHARTS = {
+    'hourly_resampling': hourly_resampling,
+    'desc_num_feature': desc_num_feature,
+    'correlation_chart': correlation_chart,
+}
+
+
+# jobs are (chart, filename, keyword arguments), filenames are yielded as soon as their chart is saved
+def render_charts(data, jobs, workers=None):
+    with tempfile.TemporaryDirectory() as directory:
+        # workers map the dataset from disk instead of receiving a pickled copy per chart
+        dataset_path = _write_dataset(data, os.path.join(directory, 'dataset.npz'))
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_render, dataset_path, chart, filename, kwargs) for chart, filename, kwargs in jobs]
+            for future in concurrent.futures.as_completed(futures):
+                filename = future.result()
+                logging.info("rendered " + filename)
+                yield filename
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _save(fig, filename, dpi):
+    try:
+        fig.savefig(filename, dpi=dpi, format='png')
+    finally:
+        plt.close(fig)
+
+
+def _binned_pairplot(values, features, bins, height=2.5):
+    size = features.__len__()
+    fig, axes = plt.subplots(size, size, figsize=(height * size, height * size), squeeze=False)
+    finite = np.isfinite(values)
+    ranges = [_value_range(values[finite[:, column], column]) for column in range(size)]
+
+    # bin every feature once, each pair is then a single bincount over the combined bin numbers
+    binned = np.full(values.shape, -1, dtype=np.int64)
+    for column, (low, high) in enumerate(ranges):
+        scaled = (values[finite[:, column], column] - low) * (bins / (high - low))
+        binned[finite[:, column], column] = np.clip(scaled.astype(np.int64), 0, bins - 1)
+    edges = [np.linspace(low, high, bins + 1) for low, high in ranges]
+
+    counts = {}
+    for row in range(size):
+        for column in range(row):
+            both = (binned[:, row] >= 0) & (binned[:, column] >= 0)
+            pair = np.bincount(binned[both, row] * bins + binned[both, column], minlength=bins * bins)
+            counts[row, column] = pair.reshape(bins, bins)
+            counts[column, row] = counts[row, column].T
+
+    for row in range(size):
+        for column in range(size):
+            ax = axes[row, column]
+            if row == column:
+                centers, density = _binned_density(values[finite[:, column], column], ranges[column], bins * 4)
+                ax.plot(centers, density, color='C0')
+                ax.fill_between(centers, density, alpha=0.25, color='C0')
+                ax.set_yticks([])
+            else:
+                ax.pcolormesh(edges[column], edges[row], np.ma.masked_equal(counts[row, column], 0), cmap='Blues',
+                              norm=matplotlib.colors.LogNorm())
+                ax.set_ylim(ranges[row])
+            ax.set_xlim(ranges[column])
+            ax.set_xlabel(features[column] if row == size - 1 else '')
+            ax.set_ylabel(features[row] if column == 0 else '')
+            if row != size - 1:
+                ax.set_xticklabels([])
+            if column != 0 and row != column:
+                ax.set_yticklabels([])
+    fig.tight_layout()
+    return fig
+
+
+def _value_range(values):
+    if not values.__len__():
+        return 0.0, 1.0
+    low, high = float(values.min()), float(values.max())
+    return (low - 0.5, high + 0.5) if low == high else (low, high)
+
+
+# gaussian kernel density on a fine histogram, the bandwidth follows Scott's rule like seaborn's kde
+def _binned_density(values, value_range, bins):
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+    centers = (edges[:-1] + edges[1:]) / 2
+    width = edges[1] - edges[0]
+    if values.__len__() < 2 or not values.std():
+        return centers, counts / max(values.__len__() * width, 1)
+    bandwidth = values.std(ddof=1) * values.__len__() ** (-1 / 5) / width
+    half = int(np.ceil(4 * bandwidth))
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) / bandwidth) ** 2)
+    # a kernel wider than the histogram, from a few values, would make mode='same' as long as the kernel
+    density = np.convolve(counts, kernel / kernel.sum())[half:half + bins]
+    return centers, density / (values.__len__() * width)
+
+
+def _write_dataset(data, path):
+    index = data.index.tz_localize(None) if getattr(data.index, 'tz', None) else data.index
+    columns = {data.index.name or 'time': index.to_numpy()}
+    columns.update((name, data[name].to_numpy()) for name in data.columns)
+    with open(path, 'wb') as fh:
+        np.savez(fh, **columns)
+    return path
+
+
+_datasets = {}
+
+
+def _init_worker():
+    matplotlib.use('Agg')
+
+
+def _render(dataset_path, chart, filename, kwargs):
+    # every worker maps the dataset once and keeps it for the following charts
+    if dataset_path not in _datasets:
+        feature_names, columns = mikrolab.read_npz_file(dataset_path, mmap_mode='r')
+        _datasets.clear()
+        _datasets[dataset_path] = mikrolab.to_frame(feature_names, columns)
+    return CHARTS[chart](_datasets[dataset_path], filename=filename, **kwargs)
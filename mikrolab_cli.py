@@ -0,0 +1,119 @@
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+
+import mikrolab_codec
+import mikrolab_metrics
+import mikrolab_pipeline
+
+
+# every command imports what it needs when it runs, converting starts without pandas, matplotlib or boto3
+LOG_FILES = {'convert': './logs/source_data_log', 'eda': './logs/eda_log', 'sync': './logs/aws-mikrolab'}
+METRICS_FILES = {'convert': './logs/source_data_metrics', 'eda': './logs/eda_metrics',
+                 'sync': './logs/aws-mikrolab-metrics'}
+
+
+def convert(arguments):
+    import mikrolab_source_data as mikrolab
+    # an export or a directory of exports, e.g. a year of daily exports to backfill
+    if os.path.isdir(arguments.source):
+        paths = mikrolab.convert_directory(arguments.source, arguments.target, arguments.prefix,
+                                           workers=arguments.workers, codec=arguments.codec)
+    else:
+        paths = [mikrolab.convert_file(arguments.source, arguments.target, arguments.prefix,
+                                       workers=arguments.workers or 1, codec=arguments.codec)]
+    for path in paths:
+        print("Converted file: {}".format(path))
+    return 0
+
+
+def eda(arguments):
+    import mikrolab_charts
+    import mikrolab_dataset
+    import mikrolab_stats
+    mikrolab_charts.matplotlib.use('Agg')
+
+    # one pass completes the data chunk by chunk and collects the statistics the charts reuse
+    stats = {}
+    chunks = mikrolab_dataset.build_chunks(arguments.source)
+    data = mikrolab_dataset.read_dataset(mikrolab_dataset.write_dataset(chunks, arguments.dataset, stats))
+    print("Shape of the dataset: {}".format(data.shape))
+    print("Descriptive statistics: {}".format(mikrolab_stats.describe(stats)))
+
+    attributes = arguments.attributes or list(data.columns)
+    jobs = [('desc_num_feature', os.path.join(arguments.charts_directory, attribute + '.png'),
+             {'feature_name': attribute, 'stats': stats}) for attribute in attributes]
+    jobs.append(('correlation_chart', os.path.join(arguments.charts_directory, 'eda_mikrolab_selective_kde.png'),
+                 {'mode': 'binned'}))
+    os.makedirs(arguments.charts_directory, exist_ok=True)
+    for filename in mikrolab_charts.render_charts(data, jobs, arguments.workers):
+        print("rendered " + filename)
+    return 0
+
+
+def sync(arguments):
+    aws = load_aws()
+    if arguments.dry_run:
+        aws.use_local_s3(arguments.dry_run)
+    job = dict(aws.JOB, attributes=arguments.attributes or aws.JOB['attributes'])
+    aws.run_job(source_file_name=arguments.source_file, workers=arguments.workers, queue_size=arguments.queue_size,
+                **job)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='mikrolab', description="convert, explore and sync mikrolab exports")
+    parser.add_argument('--log-file', help="defaults to the log of the command in ./logs")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_command = commands.add_parser('convert', help="convert an export or a directory of exports to csv")
+    convert_command.add_argument('source', nargs='?', default=os.path.join('./datasource', 'influx-export.csv'))
+    convert_command.add_argument('target', nargs='?', default='./target_directory')
+    convert_command.add_argument('--prefix', help="prefix of the converted file names")
+    convert_command.add_argument('--codec', choices=sorted(mikrolab_codec.CODECS), help="compress the csv files")
+    convert_command.add_argument('--workers', type=int, help="processes parsing an export")
+    convert_command.set_defaults(run=convert)
+
+    eda_command = commands.add_parser('eda', help="complete the converted data, describe and chart it")
+    eda_command.add_argument('source', nargs='?', default='./target_directory')
+    eda_command.add_argument('--dataset', default='./diagrams/.eda_dataset.npz')
+    eda_command.add_argument('--charts-directory', default='./diagrams')
+    eda_command.add_argument('--attributes', nargs='+', help="charted attributes, all of them by default")
+    eda_command.add_argument('--workers', type=int, help="processes rendering charts")
+    eda_command.set_defaults(run=eda)
+
+    sync_command = commands.add_parser('sync', help="convert the export in S3, chart it and upload both")
+    sync_command.add_argument('--dry-run', metavar='DIRECTORY',
+                              help="use a directory with one sub directory per bucket instead of S3")
+    sync_command.add_argument('--source-file', default='influx-export.csv')
+    sync_command.add_argument('--attributes', nargs='+', help="charted attributes")
+    sync_command.add_argument('--workers', type=int, help="processes rendering charts")
+    sync_command.add_argument('--queue-size', type=int, default=mikrolab_pipeline.QUEUE_SIZE)
+    sync_command.set_defaults(run=sync)
+    return parser
+
+
+def load_aws():
+    # mikrolab-aws.py is no importable module name, the CLI and the benchmarks load it from its path
+    spec = importlib.util.spec_from_file_location(
+        'mikrolab_aws', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mikrolab-aws.py'))
+    aws = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(aws)
+    return aws
+
+
+def main(argv=None):
+    arguments = build_parser().parse_args(argv)
+    # logging is set up once the command is known, importing a module of the project leaves it alone
+    log_file = arguments.log_file or LOG_FILES[arguments.command]
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+    logging.basicConfig(filename=log_file, level=getattr(logging, arguments.log_level))
+    mikrolab_metrics.configure(METRICS_FILES[arguments.command])
+    return arguments.run(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import gzip
+import io
+import lzma
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# extension, magic bytes and default level of every codec, None stands for plain text
+CODECS = {
+    'gzip': ('.gz', b'\x1f\x8b', 6),
+    'xz': ('.xz', b'\xfd7zXZ\x00', 6),
+    'zstd': ('.zst', b'\x28\xb5\x2f\xfd', 3),
+}
+
+
+def detect_codec(path):
+    # the extension decides, a file without a known extension is recognized by its first bytes
+    for codec, (extension, magic, level) in CODECS.items():
+        if path.endswith(extension):
+            return codec
+    with open(path, 'rb') as fh:
+        head = fh.read(6)
+    for codec, (extension, magic, level) in CODECS.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def codec_from_name(name):
+    for codec, (extension, magic, level) in CODECS.items():
+        if name.endswith(extension):
+            return codec
+    return None
+
+
+def extension(codec):
+    return CODECS[codec][0] if codec is not None else ''
+
+
+def strip_extension(name):
+    codec = codec_from_name(name)
+    return name[:-extension(codec).__len__()] if codec is not None else name
+
+
+def open_input(source, mode='rt', codec=None):
+    # source is a path or a binary file object, the data is decoded while it is read
+    if isinstance(source, (str, os.PathLike)):
+        codec = detect_codec(os.fspath(source))
+        if codec == 'gzip':
+            return gzip.open(source, mode)
+        if codec == 'xz':
+            return lzma.open(source, mode)
+        if codec == 'zstd':
+            stream = io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(open(source, 'rb')))
+            return io.TextIOWrapper(stream) if mode == 'rt' else stream
+        return open(source, 'rt' if mode == 'rt' else 'rb')
+    # a file object stays open, it belongs to the caller
+    if codec == 'gzip':
+        stream = gzip.GzipFile(fileobj=source, mode='rb')
+    elif codec == 'xz':
+        stream = lzma.LZMAFile(source, mode='rb')
+    elif codec == 'zstd':
+        stream = io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(source, closefd=False))
+    elif codec is None:
+        stream = source
+    else:
+        raise ValueError("Unknown codec: {}".format(codec))
+    return io.TextIOWrapper(stream) if mode == 'rt' else stream
+
+
+def open_output(target, mode='wt', codec=None, level=None, threads=-1):
+    # target is a path or a binary file object, threads=-1 compresses on every core where the codec can
+    level = CODECS[codec][2] if codec in CODECS and level is None else level
+    if isinstance(target, (str, os.PathLike)):
+        if codec == 'gzip':
+            return gzip.open(target, mode, compresslevel=level)
+        if codec == 'xz':
+            return lzma.open(target, mode, preset=level)
+        if codec == 'zstd':
+            return _zstandard().open(target, mode, cctx=_zstandard().ZstdCompressor(level=level, threads=threads))
+        if codec is None:
+            return open(target, 'wt' if mode == 'wt' else 'wb')
+        raise ValueError("Unknown codec: {}".format(codec))
+    # a file object stays open, it belongs to the caller
+    if codec == 'gzip':
+        stream = gzip.GzipFile(fileobj=target, mode='wb', compresslevel=level, mtime=0)
+    elif codec == 'xz':
+        stream = lzma.LZMAFile(target, mode='wb', preset=level)
+    elif codec == 'zstd':
+        stream = _zstandard().ZstdCompressor(level=level, threads=threads).stream_writer(target, closefd=False)
+    elif codec is None:
+        stream = target
+    else:
+        raise ValueError("Unknown codec: {}".format(codec))
+    return io.TextIOWrapper(stream) if mode == 'wt' else stream
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _zstandard():
+    if zstandard is None:
+        raise ImportError("zstd needs the zstandard package")
+    return zstandard
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+
+import mikrolab_codec
+import mikrolab_index
+import mikrolab_metrics
+import mikrolab_source_data as mikrolab
+import mikrolab_stats
+import mikrolab_time
+
+
+# converted data is read CHUNK_ROWS rows at a time, leading gaps are held back for at most LOOKAHEAD_ROWS rows
+CHUNK_ROWS = 1 << 18
+LOOKAHEAD_ROWS = 1 << 20
+
+
+def converted_files(directory):
+    # hidden files are converter checkpoints and indexes, not data
+    return [filename for filename in sorted(os.listdir(directory)) if not filename.startswith('.')
+            and (filename.endswith('.npz') or mikrolab_codec.strip_extension(filename).endswith('.csv'))]
+
+
+def read_chunks(directory, chunk_rows=CHUNK_ROWS, start=None, end=None):
+    # overlapping files are merged by time, a row is dropped only when an earlier one has the same time
+    files = converted_files(directory)
+    binary_files = [filename for filename in files if filename.endswith('.npz')]
+    read = _npz_chunks if binary_files else _csv_chunks
+    paths = [os.path.join(directory, filename) for filename in binary_files or files]
+    first_times = [(_first_time(path), path) for path in paths]
+    pending = sorted((first_time, path) for first_time, path in first_times if first_time is not None)
+    if end is not None:
+        pending = [(first_time, path) for first_time, path in pending if first_time < _bound(end, first_time)]
+    streams = []
+    while streams or pending:
+        # every row up to the last one buffered by each open file is known, files starting before it are opened
+        horizon = min(chunk.index[-1] for chunks, chunk in streams) if streams else None
+        while pending and (horizon is None or pending[0][0] <= horizon):
+            chunks = read(pending.pop(0)[1], chunk_rows, start, end)
+            chunk = _next_chunk(chunks)
+            if chunk is not None:
+                streams.append([chunks, chunk])
+                horizon = chunk.index[-1] if horizon is None else min(horizon, chunk.index[-1])
+        if not streams:
+            continue
+        parts = []
+        for stream in streams:
+            chunks, chunk = stream
+            parts.append(chunk[chunk.index <= horizon])
+            stream[1] = chunk[chunk.index > horizon]
+            if not stream[1].__len__():
+                stream[1] = _next_chunk(chunks)
+        streams = [stream for stream in streams if stream[1] is not None]
+        data = parts[0] if parts.__len__() == 1 else pd.concat(parts).sort_index(kind='stable')
+        data = data[~data.index.duplicated()]
+        for first in range(0, data.__len__(), chunk_rows):
+            yield data.iloc[first:first + chunk_rows]
+
+
+def complete_chunks(chunks, lookahead=LOOKAHEAD_ROWS):
+    # zeros are gaps, every gap takes the last value before it, gaps at the start the first value after them
+    last = None
+    pending, pending_rows = [], 0
+    for chunk in chunks:
+        chunk = chunk.replace(to_replace=0, value=np.nan).ffill()
+        if last is not None:
+            chunk = chunk.fillna(last)
+        last = chunk.iloc[-1]
+        if pending is None:
+            yield chunk
+            continue
+        pending.append(chunk)
+        pending_rows += chunk.__len__()
+        # the chunks before every column had its first value wait for it
+        if last.notna().all() or pending_rows >= lookahead:
+            if last.isna().any():
+                logging.warning("no values for {} in the first {} rows".format(list(last.index[last.isna()]),
+                                                                             pending_rows))
+            yield pd.concat(pending).bfill()
+            pending = None
+    if pending:
+        yield pd.concat(pending).bfill()
+
+
+def build_chunks(directory, chunk_rows=CHUNK_ROWS, start=None, end=None, lookahead=LOOKAHEAD_ROWS):
+    return complete_chunks(read_chunks(directory, chunk_rows, start, end), lookahead)
+
+
+def resample_chunks(chunks, rule='h', how='sum'):
+    # every chunk is reduced on its own, bins split between two chunks are combined afterwards
+    if how not in ('sum', 'mean'):
+        raise ValueError("Unknown aggregation: {}".format(how))
+    sums, counts = [], []
+    for chunk in chunks:
+        sums.append(chunk.resample(rule).sum())
+        counts.append(chunk.resample(rule).count())
+    if not sums:
+        return pd.DataFrame()
+    total = pd.concat(sums).groupby(level=0).sum().resample(rule).sum()
+    if how == 'sum':
+        return total
+    count = pd.concat(counts).groupby(level=0).sum().resample(rule).sum()
+    return total / count.where(count > 0)
+
+
+def write_dataset(chunks, path, stats=None):
+    # columns are spooled to disk and stored uncompressed, the dataset is memory mapped by read_dataset
+    directory = os.path.dirname(path) or '.'
+    with mikrolab_metrics.stage('write_dataset') as record, tempfile.TemporaryDirectory(dir=directory) as spool:
+        feature_names, dtypes, files, rows = None, {}, [], 0
+        try:
+            for chunk in chunks:
+                if feature_names is None:
+                    feature_names = [chunk.index.name or 'time'] + list(chunk.columns)
+                    files = [open(os.path.join(spool, name + '.npy'), 'wb') for name in feature_names]
+                index = chunk.index.tz_localize(None) if chunk.index.tz is not None else chunk.index
+                values = [index.to_numpy().astype('datetime64[ns]')] + \
+                    [chunk[name].to_numpy(dtype=np.float64) for name in feature_names[1:]]
+                for name, fh, column in zip(feature_names, files, values):
+                    dtypes[name] = column.dtype
+                    fh.write(np.ascontiguousarray(column).tobytes())
+                rows += chunk.__len__()
+                if stats is not None:
+                    mikrolab_stats.merge_stats(stats, mikrolab_stats.frame_stats(chunk))
+        finally:
+            for fh in files:
+                fh.close()
+        if feature_names is None:
+            raise mikrolab.NoDataPoints(None, "No data points to write")
+
+        fd, part_path = tempfile.mkstemp(suffix='.part', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as raw, zipfile.ZipFile(raw, 'w', zipfile.ZIP_STORED) as archive:
+                for name in feature_names:
+                    with archive.open(name + '.npy', 'w', force_zip64=True) as member, \
+                            open(os.path.join(spool, name + '.npy'), 'rb') as fh:
+                        header = {'descr': np.lib.format.dtype_to_descr(dtypes[name]), 'fortran_order': False,
+                                  'shape': (rows,)}
+                        np.lib.format.write_array_header_1_0(member, header)
+                        shutil.copyfileobj(fh, member, 1 << 22)
+            os.replace(part_path, path)
+        except OSError as E:
+            logging.error("Could not write dataset: {}".format(str(E)))
+            os.remove(part_path)
+            raise
+        except BaseException:
+            os.remove(part_path)
+            raise
+        record.update(rows=rows, bytes=os.path.getsize(path))
+    return path
+
+
+def read_dataset(path, mmap_mode='r'):
+    feature_names, columns = mikrolab.read_npz_file(path, mmap_mode=mmap_mode)
+    return mikrolab.to_frame(feature_names, columns)
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _first_time(path):
+    if path.endswith('.npz'):
+        feature_names, columns = mikrolab.read_npz_file(path, mmap_mode='r')
+        time = columns[feature_names[0]]
+        return pd.Timestamp(time[0], tz='UTC') if time.__len__() else None
+    first = pd.read_csv(path, nrows=1)
+    if 'time' not in first.columns:
+        logging.warning("skipping {}, it is no converted file".format(path))
+        return None
+    return pd.Timestamp(first.time[0]) if first.__len__() else None
+
+
+def _next_chunk(chunks):
+    for chunk in chunks:
+        if chunk.__len__():
+            return chunk
+    return None
+
+
+def _bound(value, like):
+    # a bound takes the zone of the data it is compared with, times without a zone are UTC
+    value = pd.Timestamp(value)
+    if like.tz is None:
+        return value.tz_convert('UTC').tz_localize(None) if value.tz is not None else value
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+
+
+def _csv_chunks(path, chunk_rows, start, end):
+    with pd.read_csv(path, chunksize=chunk_rows) as reader:
+        for data in reader:
+            data = data.drop(['ID'], axis=1)
+            data.time = mikrolab_time.to_datetime(data.time.to_numpy())
+            data = data.set_index('time')
+            if start is not None:
+                data = data[data.index >= _bound(start, data.index[0])]
+            if end is not None and data.__len__():
+                data = data[data.index < _bound(end, data.index[0])]
+            yield data
+
+
+def _npz_chunks(path, chunk_rows, start, end):
+    feature_names, columns = mikrolab.read_npz_file(path, mmap_mode='r')
+    if start is not None or end is not None:
+        columns = mikrolab_index.slice_columns(feature_names, columns, start, end)
+    for first in range(0, columns[feature_names[0]].__len__(), chunk_rows):
+        data = mikrolab.to_frame(feature_names, {name: values[first:first + chunk_rows]
+                                                 for name, values in columns.items()})
+        # the times are UTC, chunks of npz and csv files have the same index
+        data.index = data.index.tz_localize('UTC')
+        yield data
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
@@ -1,7 +1,7 @@
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import mikrolab_charts
+import mikrolab_dataset
+import mikrolab_metrics
+import mikrolab_stats
 
 import logging
 import os
@@ -10,52 +10,37 @@ import sys
 
 
 def desc_num_feature(dataframe, feature_name, bins=30, edgecolor='k', **kwargs):
-    fig, ax = plt.subplots(figsize=(8, 4))
-    dataframe[feature_name].hist(bins=bins, edgecolor=edgecolor, ax=ax, **kwargs)
-    ax.set_title(feature_name, size=15)
-    plt.figtext(1, 0.15, str(dataframe[feature_name].describe().round(2)), size=17)
-    plt.savefig('./diagrams/' + feature_name + '.png', dpi=300, format='png')
+    mikrolab_charts.desc_num_feature(dataframe, feature_name, './diagrams/' + feature_name + '.png',
+                                     bins=bins, edgecolor=edgecolor, **kwargs)
     return True
 
 
 if __name__ == "__main__":
     configuration = {
         'logfile': './logs/eda_log',
-        'source_file': 'target_directory/2018-09-22T04:30:36_office_2018-10-02T10:30:25.csv',
+        'metrics': './logs/eda_metrics',
+        'source_directory': 'target_directory',
+        'dataset': './diagrams/.eda_dataset.npz',
         'attributes': ['time', 'co2_hum', 'co2_ppm', 'co2_tmp', 'ec', 'ph', 'rpi_t', 'rtd_t', 'tsl']
     }
     logging.basicConfig(filename=configuration['logfile'], level=logging.INFO)
-    source_file = configuration['source_file']
-
-    data = pd.read_csv(source_file)
-
-    data['co2_hum'].fillna((data['co2_hum'].mean()), inplace=True)
-    data.fillna(method='ffill', inplace=True)
-
-    # data.where(
-    #     data.replace(to_replace=0, value=np.nan),
-    #     other=(data.fillna(method='ffill') + data.fillna(method='bfill')) / 2
-    # )
-
-    # completing data
-    data.replace(to_replace=0, value=np.nan, inplace=True)
-    data.fillna(method='ffill', inplace=True)
-    data.fillna(method='bfill', inplace=True)
-
+    mikrolab_metrics.configure(configuration['metrics'])
+    source_directory = configuration['source_directory']
+
+    # completing data chunk by chunk, gaps take the last value before them, leading gaps the first one after them
+    # one pass for the statistics of every attribute, the charts reuse them
+    stats = {}
+    chunks = mikrolab_dataset.build_chunks(source_directory)
+    data = mikrolab_dataset.read_dataset(mikrolab_dataset.write_dataset(chunks, configuration['dataset'], stats))
     print("Shape of the dataset: {}".format(data.shape))
-    print("Descriptive statistics: {}".format(data.describe()))
-
-    for attribute in configuration['attributes'][1:]:
-        desc_num_feature(data, attribute)
-
-    sns.pairplot(
-        data=data,
-        plot_kws={"s": 2},
-        diag_kind='kde'
-    )
-    plt.show()
-
-
+    print("Descriptive statistics: {}".format(mikrolab_stats.describe(stats)))
+
+    jobs = [('desc_num_feature', './diagrams/' + attribute + '.png', {'feature_name': attribute, 'stats': stats})
+            for attribute in configuration['attributes'][1:]]
+    # binned pairs of the correlated features instead of a scatter of every row
+    jobs.append(('correlation_chart', './diagrams/eda_mikrolab_selective_kde.png', {'mode': 'binned'}))
+    for filename in mikrolab_charts.render_charts(data, jobs):
+        print("rendered " + filename)
 
     sys.exit(0)
 
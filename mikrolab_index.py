@@ -0,0 +1,182 @@
+import numpy as np
+
+import io
+import logging
+import os
+
+import mikrolab_codec
+import mikrolab_time
+
+
+# every INDEX_STRIDE-th row of a converted csv, with its byte offset and time, in a hidden file next to it
+INDEX_STRIDE = 4096
+SCAN_CHUNK = 1 << 26
+
+
+def index_path(path):
+    return os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.index')
+
+
+def write_index(path, stride=INDEX_STRIDE, previous_path=None, previous_size=None):
+    # the index of the first previous_size bytes, before rows were appended, is extended instead of rebuilt
+    previous = read_index(previous_path) if previous_path is not None else None
+    with open(path, 'rb') as fh:
+        if previous is not None and previous['size'] == previous_size and previous['row'].size \
+                and previous['stride'] == stride:
+            rows, offsets = list(previous['row'][:-1]), list(previous['offset'][:-1])
+            row, position = int(previous['row'][-1]), int(previous['offset'][-1])
+        else:
+            rows, offsets = [], []
+            row, position = 0, fh.readline().__len__()
+        fh.seek(position)
+        size = position
+        for chunk in iter(lambda: fh.read(SCAN_CHUNK), b''):
+            # every newline ends a row, the next row starts right after it
+            newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10) + size
+            if newlines.size:
+                starts = np.concatenate(([position], newlines[:-1] + 1))
+                selected = np.flatnonzero((row + np.arange(starts.size)) % stride == 0)
+                rows.extend(row + selected)
+                offsets.extend(starts[selected])
+                row += starts.size
+                position = int(newlines[-1]) + 1
+            size += chunk.__len__()
+        times = [_row_time(fh, offset) for offset in offsets]
+        last_time = _last_time(fh, size) if row else 0
+    index = {
+        'stride': np.int64(stride),
+        'row': np.array(rows, dtype=np.int64),
+        'offset': np.array(offsets, dtype=np.int64),
+        'time': np.array(times, dtype=np.int64),
+        'rows': np.int64(row),
+        'size': np.int64(size),
+        'last_time': np.int64(last_time),
+    }
+    with open(index_path(path), 'wb') as fh:
+        np.savez(fh, **index)
+    if previous_path is not None and previous_path != path and os.path.exists(index_path(previous_path)):
+        os.remove(index_path(previous_path))
+    logging.info("indexed {} rows of {}".format(row, path))
+    return index
+
+
+def read_index(path):
+    if not os.path.exists(index_path(path)):
+        return None
+    with np.load(index_path(path)) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def remove_index(path):
+    if os.path.exists(index_path(path)):
+        os.remove(index_path(path))
+
+
+def read_window(path, start=None, end=None):
+    import pandas as pd
+    # only the byte range between the index entries around [start, end) is read
+    index = read_index(path)
+    if index is None or index['size'] != os.path.getsize(path):
+        index = write_index(path)
+    start, end = _timestamp(start), _timestamp(end)
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        # rows at start may sit before the first entry with that time, the entry before it is where to begin
+        first = max(np.searchsorted(index['time'], start.value, side='left') - 1, 0) if start is not None else 0
+        last = np.searchsorted(index['time'], end.value, side='left') if end is not None else index['time'].size
+        begin = int(index['offset'][first]) if index['offset'].size else header.__len__()
+        stop = int(index['offset'][last]) if last < index['offset'].size else int(index['size'])
+        fh.seek(begin)
+        body = fh.read(max(stop - begin, 0))
+    return _in_window(pd.read_csv(io.BytesIO(header + body)), start, end)
+
+
+def read_compressed_window(path, start=None, end=None, chunk_rows=1 << 18):
+    import pandas as pd
+    # byte offsets into a compressed file are of no use, it is decoded chunk by chunk and only the window kept
+    start, end = _timestamp(start), _timestamp(end)
+    frames = []
+    with mikrolab_codec.open_input(path, 'rb') as fh, pd.read_csv(fh, chunksize=chunk_rows) as reader:
+        for data in reader:
+            frames.append(_in_window(data, start, end))
+            # rows are sorted by time, the rest of the file is past the window
+            if end is not None and data.__len__() and data.time.iloc[-1] >= end:
+                break
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_directory_window(directory, start=None, end=None):
+    import pandas as pd
+    # converted files whose time range misses the window are not opened
+    frames = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.startswith('.') or not mikrolab_codec.strip_extension(filename).endswith('.csv'):
+            continue
+        if mikrolab_codec.codec_from_name(filename) is not None:
+            window = read_compressed_window(path, start, end)
+            if window.__len__():
+                frames.append(window)
+            continue
+        index = read_index(path)
+        if index is None or index['size'] != os.path.getsize(path):
+            index = write_index(path)
+        if not index['rows'] or not _overlaps(index, _timestamp(start), _timestamp(end)):
+            continue
+        frames.append(read_window(path, start, end))
+    if not frames:
+        raise FileNotFoundError("No converted data between {} and {} in {}".format(start, end, directory))
+    data = pd.concat(frames, ignore_index=True)
+    return data.sort_values('time', kind='stable', ignore_index=True)
+
+
+def slice_columns(feature_names, columns, start=None, end=None):
+    # typed columns are sorted by time already, a binary search finds the window
+    time = columns[feature_names[0]].astype('datetime64[ns]')
+    first = np.searchsorted(time, _timestamp(start).tz_localize(None).to_datetime64()) if start is not None else 0
+    last = np.searchsorted(time, _timestamp(end).tz_localize(None).to_datetime64()) if end is not None else time.size
+    return {name: values[first:last] for name, values in columns.items()}
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _timestamp(value):
+    import pandas as pd
+    # times without a zone are UTC like the export
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize('UTC') if timestamp.tz is None else timestamp.tz_convert('UTC')
+
+
+def _in_window(data, start, end):
+    data.time = mikrolab_time.to_datetime(data.time.to_numpy())
+    keep = np.ones(data.__len__(), dtype=bool)
+    if start is not None:
+        keep &= (data.time >= start).to_numpy()
+    if end is not None:
+        keep &= (data.time < end).to_numpy()
+    return data[keep]
+
+
+def _overlaps(index, start, end):
+    return (end is None or index['time'][0] < end.value) and (start is None or index['last_time'] >= start.value)
+
+
+def _row_time(fh, offset):
+    fh.seek(offset)
+    return _parse_time(fh.readline())
+
+
+def _last_time(fh, size):
+    fh.seek(max(size - 4096, 0))
+    return _parse_time(fh.read().rstrip(b'\r\n').rsplit(b'\n', 1)[-1])
+
+
+def _parse_time(line):
+    # ID,time,...
+    return mikrolab_time.decode_time(line.split(b',', 2)[1])
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
@@ -0,0 +1,121 @@
+import atexit
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# one JSON line per finished stage, appended to the configured file by every process of the pipeline
+
+_settings = {'path': None, 'run': uuid.uuid4().hex}
+_local = threading.local()
+_records = []
+
+
+def configure(path=None, summary=False):
+    # the environment overrides the path a script asks for
+    _settings['path'] = os.environ.get('MIKROLAB_METRICS') or path
+    if summary or os.environ.get('MIKROLAB_METRICS_SUMMARY'):
+        atexit.register(print_summary)
+    return _settings['path']
+
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    # the caller adds rows and bytes to the yielded record once it knows them
+    stack = _stack()
+    record = {'stage': name, 'parent': stack[-1] if stack else None}
+    record.update(fields)
+    stack.append(name)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    except BaseException:
+        record['failed'] = True
+        raise
+    finally:
+        stack.pop()
+        record['wall_seconds'] = time.perf_counter() - wall
+        record['cpu_seconds'] = time.process_time() - cpu
+        if record.get('rows') is not None and record['wall_seconds']:
+            record['rows_per_second'] = record['rows'] / record['wall_seconds']
+        record['peak_rss_bytes'] = peak_rss()
+        record['run'] = _settings['run']
+        record['pid'] = os.getpid()
+        record['time'] = time.time()
+        _emit(record)
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    # kilobytes on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def records():
+    # the configured file also holds the stages of worker processes, and those of earlier runs
+    if _settings['path'] is None or not os.path.exists(_settings['path']):
+        return list(_records)
+    with open(_settings['path']) as fh:
+        stage_records = [json.loads(line) for line in fh if line.strip()]
+    return [record for record in stage_records if record.get('run') == _settings['run']]
+
+
+def summarize(stage_records):
+    summary = {}
+    for record in stage_records:
+        entry = summary.setdefault(record['stage'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                      'rows': 0, 'bytes': 0, 'peak_rss_bytes': 0})
+        entry['calls'] += 1
+        entry['wall_seconds'] += record['wall_seconds']
+        entry['cpu_seconds'] += record['cpu_seconds']
+        entry['rows'] += record.get('rows') or 0
+        entry['bytes'] += record.get('bytes') or 0
+        entry['peak_rss_bytes'] = max(entry['peak_rss_bytes'], record.get('peak_rss_bytes') or 0)
+    for entry in summary.values():
+        entry['rows_per_second'] = entry['rows'] / entry['wall_seconds'] if entry['wall_seconds'] else 0.0
+    return summary
+
+
+def print_summary(stage_records=None):
+    summary = summarize(records() if stage_records is None else stage_records)
+    print("{:>24} {:>6} {:>10} {:>10} {:>12} {:>12} {:>10}".format(
+        'stage', 'calls', 'wall [s]', 'cpu [s]', 'rows/s', 'MB', 'peak [MB]'))
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]['wall_seconds']):
+        print("{:>24} {:>6} {:>10.3f} {:>10.3f} {:>12.0f} {:>12.1f} {:>10.1f}".format(
+            name, entry['calls'], entry['wall_seconds'], entry['cpu_seconds'], entry['rows_per_second'],
+            entry['bytes'] / 2 ** 20, entry['peak_rss_bytes'] / 2 ** 20))
+    return summary
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _emit(record):
+    _records.append(record)
+    line = json.dumps(record, default=str)
+    logging.debug(line)
+    if _settings['path'] is not None:
+        # one write per line, appends from several processes do not interleave
+        with open(_settings['path'], 'a') as fh:
+            fh.write(line + '\n')
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
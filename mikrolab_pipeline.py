@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+import mikrolab_metrics
+
+
+# stages are connected by queues of at most QUEUE_SIZE items, a stage that runs ahead waits for the one after it
+QUEUE_SIZE = 8
+POLL_SECONDS = 0.1
+
+
+def run_stages(items, stages, queue_size=QUEUE_SIZE):
+    # every stage is a name, a function and a number of worker threads; the function yields any number of items
+    # for the next stage from each item it gets, the items of the last stage are returned
+    stages = [('feed', lambda start: items, 1)] + list(stages)
+    queues = [queue.Queue(queue_size) for _ in range(stages.__len__() + 1)]
+    queues[0].put(None)
+    queues[0].put(_DONE)
+    state = {'remaining': [workers for name, function, workers in stages], 'failures': [],
+             'lock': threading.Lock(), 'stopped': threading.Event()}
+    threads = [threading.Thread(target=_work, args=(stages, queues, index, state), daemon=True)
+               for index, (name, function, workers) in enumerate(stages) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    results = []
+    try:
+        while True:
+            item = _get(queues[-1], state['stopped'])
+            if item is _DONE:
+                break
+            results.append(item)
+    finally:
+        # every stage is done by now, unless the caller was interrupted, then they stop as well
+        state['stopped'].set()
+        for thread in threads:
+            thread.join()
+    if state['failures']:
+        raise state['failures'][0]
+    return results
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+_DONE = object()
+
+
+def _work(stages, queues, index, state):
+    name, function, workers = stages[index]
+    stopped = state['stopped']
+    with mikrolab_metrics.stage('pipeline_' + name, workers=workers) as record:
+        count, busy = 0, 0.0
+        try:
+            while True:
+                item = _get(queues[index], stopped)
+                if item is _DONE or stopped.is_set():
+                    break
+                start = time.perf_counter()
+                for result in function(item):
+                    busy += time.perf_counter() - start
+                    # waiting for room in the next queue is no work of this stage
+                    if not _put(queues[index + 1], result, stopped):
+                        return
+                    start = time.perf_counter()
+                busy += time.perf_counter() - start
+                count += 1
+        except BaseException as E:
+            state['failures'].append(E)
+            stopped.set()
+        finally:
+            record.update(rows=count, busy_seconds=busy)
+            _finish(stages, queues, index, state)
+
+
+def _finish(stages, queues, index, state):
+    # the last worker of a stage tells every worker of the next stage that no more items come
+    with state['lock']:
+        state['remaining'][index] -= 1
+        last = state['remaining'][index] == 0
+    if last:
+        workers = stages[index + 1][2] if index + 1 < stages.__len__() else 1
+        for _ in range(workers):
+            _put(queues[index + 1], _DONE, state['stopped'])
+
+
+def _get(items, stopped):
+    while True:
+        try:
+            return items.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if stopped.is_set():
+                return _DONE
+
+
+def _put(items, item, stopped):
+    while not stopped.is_set():
+        try:
+            items.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
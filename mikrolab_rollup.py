@@ -0,0 +1,163 @@
+import numpy as np
+
+import io
+import logging
+import os
+import tempfile
+
+import mikrolab_time
+
+
+# count/sum/min/max per sensor and time bucket, the mean is sum / count
+RESOLUTIONS = {'1min': 60, '1h': 3600, '1d': 86400}
+
+
+def build_rollups(feature_names, columns, resolutions=RESOLUTIONS):
+    tables = {}
+    update_rollups(tables, feature_names, columns, resolutions)
+    return tables
+
+
+def update_rollups(tables, feature_names, columns, resolutions=RESOLUTIONS):
+    time = columns[feature_names[0]].astype('datetime64[ns]').astype(np.int64)
+    values = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in feature_names[1:]])
+    present = ~np.isnan(values)
+    for resolution, seconds in resolutions.items():
+        width = seconds * 10 ** 9
+        table = _combine(feature_names[1:], time // width * width, present.astype(np.int64),
+                         np.where(present, values, 0.0), values, values)
+        if resolution in tables:
+            if list(tables[resolution]['features']) != feature_names[1:]:
+                raise ValueError("Rollup {} has different features".format(resolution))
+            table = _merge(tables[resolution], table)
+        tables[resolution] = table
+    return tables
+
+
+def tee_rollups(data_points, feature_names, tables, resolutions=RESOLUTIONS, batch_size=1 << 16):
+    # data points pass through unchanged, every batch is folded into the rollups on the way
+    batch = []
+    for data_point in data_points:
+        batch.append(data_point)
+        if batch.__len__() >= batch_size:
+            update_rollups(tables, feature_names, batch_columns(feature_names, batch), resolutions)
+            batch = []
+        yield data_point
+    if batch:
+        update_rollups(tables, feature_names, batch_columns(feature_names, batch), resolutions)
+
+
+def load_rollups(directory, location, resolutions=RESOLUTIONS):
+    tables = {}
+    for resolution in resolutions:
+        path = _rollup_path(directory, location, resolution)
+        if os.path.exists(path):
+            with np.load(path) as archive:
+                tables[resolution] = {name: archive[name] for name in archive.files}
+    return tables
+
+
+def save_rollups(directory, location, tables, offset=-1):
+    # the offset ties the rollups to the converter checkpoint they were saved with
+    for resolution, table in tables.items():
+        table['offset'] = np.int64(offset)
+        path = _rollup_path(directory, location, resolution)
+        fd, part_path = tempfile.mkstemp(suffix='.part', dir=directory)
+        with os.fdopen(fd, 'wb') as fh:
+            np.savez(fh, **table)
+        os.replace(part_path, path)
+        logging.info("saved rollup {} with {} buckets".format(path, table['time'].__len__()))
+    return tables
+
+
+def rollups_current(tables, offset, resolutions=RESOLUTIONS):
+    return all(resolution in tables and int(tables[resolution]['offset']) == offset for resolution in resolutions)
+
+
+def read_rollup(directory, location, resolution):
+    return rollup_frame(load_rollups(directory, location, [resolution])[resolution])
+
+
+def rollup_frame(table):
+    import pandas as pd
+    columns = {}
+    for position, feature in enumerate(table['features']):
+        for statistic in ['count', 'sum', 'min', 'max']:
+            columns[feature + '_' + statistic] = table[statistic][:, position]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns[feature + '_mean'] = table['sum'][:, position] / table['count'][:, position]
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(table['time'], name='time'))
+
+
+def choose_resolution(directory, location, rule, resolutions=RESOLUTIONS):
+    import pandas as pd
+    # the coarsest stored resolution that fits evenly into the requested one
+    width = pd.Timedelta(pd.tseries.frequencies.to_offset(rule)).total_seconds()
+    candidates = [(seconds, resolution) for resolution, seconds in resolutions.items()
+                  if width % seconds == 0 and os.path.exists(_rollup_path(directory, location, resolution))]
+    return max(candidates)[1] if candidates else None
+
+
+def resample(directory, location, rule, how='sum', resolutions=RESOLUTIONS):
+    import pandas as pd
+    resolution = choose_resolution(directory, location, rule, resolutions)
+    if resolution is None:
+        raise FileNotFoundError("No rollup of {} answers {}".format(location, rule))
+    table = load_rollups(directory, location, [resolution])[resolution]
+    statistics = {}
+    for statistic, aggregate in [('count', 'sum'), ('sum', 'sum'), ('min', 'min'), ('max', 'max')]:
+        frame = pd.DataFrame(table[statistic], columns=list(table['features']),
+                             index=pd.DatetimeIndex(table['time'], name='time'))
+        statistics[statistic] = frame.resample(rule).agg(aggregate)
+    if how == 'mean':
+        return statistics['sum'] / statistics['count']
+    return statistics[how]
+
+
+def batch_columns(feature_names, batch, parse_time=True):
+    import pandas as pd
+    # the C parser of pandas reads the joined cells faster than numpy converts them one by one
+    frame = pd.read_csv(io.StringIO('\n'.join([','.join(data_point) for data_point in batch])), header=None,
+                        names=feature_names, dtype={name: np.float64 for name in feature_names[1:]},
+                        usecols=feature_names if parse_time else feature_names[1:], engine='c')
+    columns = {name: frame[name].to_numpy() for name in feature_names[1:]}
+    if parse_time:
+        times = mikrolab_time.decode_times(frame[feature_names[0]].to_numpy())
+        columns[feature_names[0]] = times.view('datetime64[ns]')
+    return columns
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _rollup_path(directory, location, resolution):
+    return os.path.join(directory, location + '_rollup_' + resolution + '.npz')
+
+
+def _combine(features, buckets, count, total, minimum, maximum):
+    order = np.argsort(buckets, kind='stable')
+    buckets = buckets[order]
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[:1] - 1))
+    minimum = np.where(np.isnan(minimum), np.inf, minimum)[order]
+    maximum = np.where(np.isnan(maximum), -np.inf, maximum)[order]
+    table = {
+        'features': np.array(features),
+        'time': buckets[starts].astype('datetime64[ns]'),
+        'count': np.add.reduceat(count[order], starts, axis=0),
+        'sum': np.add.reduceat(total[order], starts, axis=0),
+        'min': np.minimum.reduceat(minimum, starts, axis=0),
+        'max': np.maximum.reduceat(maximum, starts, axis=0),
+    }
+    # buckets without a value have no min and max
+    table['min'][table['count'] == 0] = np.nan
+    table['max'][table['count'] == 0] = np.nan
+    return table
+
+
+def _merge(table, other):
+    return _combine(list(table['features']),
+                    np.concatenate([table['time'], other['time']]).astype(np.int64),
+                    np.concatenate([table['count'], other['count']]),
+                    np.concatenate([table['sum'], other['sum']]),
+                    np.concatenate([table['min'], other['min']]),
+                    np.concatenate([table['max'], other['max']]))
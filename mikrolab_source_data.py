@@ -1,14 +1,28 @@
+# pandas is imported by the functions that build frames, converting an export starts without it
 import numpy as np
-import pandas as pd
-import matplotlib as plt
-import seaborn as sb
 
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
 import logging
+import mmap
 import os
 import re
+import shutil
+import struct
 import sys
+import tempfile
+import zipfile
+
+import mikrolab_codec
+import mikrolab_index
+import mikrolab_metrics
+import mikrolab_rollup
+import mikrolab_stats
+import mikrolab_time
 
-logging.basicConfig(filename='./logs/source_data_log', level=logging.DEBUG)
 
 # data example
 
@@ -35,86 +49,426 @@ logging.basicConfig(filename='./logs/source_data_log', level=logging.DEBUG)
 # DONE unit tests (process_data)
 # DONE write csv
 # TODO handle cannot write file exception and write test for it
-# TODO write function to read file and transform it into csv
-# TODO merge records with rpi_t with all other records
+# DONE write function to read file and transform it into csv
+# DONE stream data from read_raw_file to write_csv_file
+# DONE merge records with rpi_t with all other records
 
 
 def read_raw_file(path, minimal_length=4):
-    raw_data = []
+    with mikrolab_metrics.stage('read') as record:
+        raw_data = list(read_raw_stream(path, minimal_length))
+        record.update(rows=raw_data.__len__(), bytes=os.path.getsize(path))
+    return _add_trailing_spaces(raw_data)
+
+
+def read_raw_stream(path, minimal_length=4):
+    # compressed exports are decoded while they are read
     try:
-        fh = open(path, 'rt')
-        for line in fh.readlines():
-            raw_data.append(line.strip())
-        if raw_data.__len__() < minimal_length:
-            raise FileTooShort(minimal_length, "The file is too short to be processed")
+        fh = mikrolab_codec.open_input(path)
     except FileNotFoundError as e:
         logging.error(e)
         raise FileNotFoundError
-    if 'fh' in locals():
+    try:
+        head = _read_head(fh, minimal_length)
+    except FileTooShort:
         fh.close()
-    return _add_trailing_spaces(raw_data)
+        raise
+    return _stream_lines(fh, head)
+
+
+def read_raw_lines(lines, minimal_length=4):
+    lines = iter(lines)
+    head = _read_head(lines, minimal_length)
+    return itertools.chain(head, (line.strip() for line in lines))
+
+
+def process_data(raw_data, typed=False, dtype=np.float64, as_frame=False, merge_tolerance=None, stats=None):
+    with mikrolab_metrics.stage('parse') as record:
+        location, feature_names, column_lengths, data_points = process_stream(raw_data, stats)
+        if not (typed or as_frame or merge_tolerance is not None):
+            data_points = list(data_points)
+            record.update(rows=data_points.__len__())
+            return location, feature_names, column_lengths, data_points
+        columns = _columns_from_data_points(feature_names, data_points)
+        record.update(rows=columns[feature_names[0]].__len__())
+        columns = _typed_columns(feature_names, columns, dtype, as_frame, merge_tolerance)
+    return location, feature_names, column_lengths, columns
+
+
+def process_stream(raw_data, stats=None):
+    raw_data = iter(raw_data)
+    location, feature_names, column_lengths = _read_layout(list(itertools.islice(raw_data, 3)))
+
+    # data_points are split lazily, one line at a time, statistics are collected while they pass
+    data_points = _split_lines(raw_data, _column_indexes(column_lengths))
+    if stats is not None:
+        data_points = mikrolab_stats.tee_stats(data_points, feature_names, stats)
+    return location, feature_names, column_lengths, data_points
+
+
+def read_columns(path, engine='numpy', minimal_length=4, typed=False, dtype=np.float64, as_frame=False, workers=1,
+                 merge_tolerance=None):
+    if engine not in ('numpy', 'python'):
+        raise ValueError("Unknown engine: {}".format(engine))
+    with mikrolab_metrics.stage('read_columns', engine=engine, workers=workers) as record:
+        if mikrolab_codec.detect_codec(path) is not None:
+            # a compressed export can neither be memory mapped nor split by byte ranges, it is streamed
+            location, feature_names, column_lengths, data_points = process_stream(read_raw_stream(path, minimal_length))
+            columns = _columns_from_data_points(feature_names, data_points)
+        elif workers > 1:
+            location, feature_names, column_lengths, columns = _read_columns_parallel(
+                path, engine, minimal_length, workers)
+        elif engine == 'numpy':
+            location, feature_names, column_lengths, columns = _read_columns_numpy(path, minimal_length)
+        else:
+            location, feature_names, column_lengths, data_points = process_stream(read_raw_stream(path, minimal_length))
+            columns = _columns_from_data_points(feature_names, data_points)
+        record.update(rows=columns[feature_names[0]].__len__(), bytes=os.path.getsize(path))
+        if typed or as_frame or merge_tolerance is not None:
+            columns = _typed_columns(feature_names, columns, dtype, as_frame, merge_tolerance)
+    return location, feature_names, column_lengths, columns
+
+
+# rows carrying only the sparse features (rpi_t) are merged into the nearest full row within tolerance seconds
+def merge_sparse_rows(feature_names, columns, tolerance=30.0, sparse_features=('rpi_t',)):
+    time = columns[feature_names[0]].astype('datetime64[ns]').astype(np.int64)
+    sparse_names = [name for name in feature_names[1:] if name in sparse_features]
+    other_names = [name for name in feature_names[1:] if name not in sparse_features]
+    if not sparse_names or not time.__len__():
+        return columns
+    has_sparse = np.column_stack([~np.isnan(columns[name]) for name in sparse_names]).any(axis=1)
+    has_other = np.column_stack([~np.isnan(columns[name]) for name in other_names]).any(axis=1) \
+        if other_names else np.zeros(time.__len__(), dtype=bool)
+    full_rows = np.flatnonzero(has_other)
+    sparse_rows = np.flatnonzero(has_sparse & ~has_other)
+    if not full_rows.__len__() or not sparse_rows.__len__():
+        return columns
+
+    # nearest full row, from the neighbours on both sides in time
+    full_rows = full_rows[np.argsort(time[full_rows], kind='stable')]
+    full_time = time[full_rows]
+    right = np.clip(np.searchsorted(full_time, time[sparse_rows]), 1, full_time.__len__() - 1) \
+        if full_time.__len__() > 1 else np.zeros(sparse_rows.__len__(), dtype=np.int64)
+    left = np.maximum(right - 1, 0)
+    distance_left = np.abs(time[sparse_rows] - full_time[left])
+    distance_right = np.abs(time[sparse_rows] - full_time[right])
+    nearest = np.where(distance_right < distance_left, right, left)
+    distance = np.minimum(distance_left, distance_right)
+
+    # each full row takes its closest sparse row, the others are kept as they are
+    candidates = np.flatnonzero(distance <= tolerance * 1e9)
+    candidates = candidates[np.lexsort((distance[candidates], nearest[candidates]))]
+    targets, first = np.unique(nearest[candidates], return_index=True)
+    matched, targets = sparse_rows[candidates[first]], full_rows[targets]
+
+    # a sparse row merges only when the full row has room for every value of it, otherwise both rows are kept
+    fits = np.ones(matched.__len__(), dtype=bool)
+    for name in sparse_names:
+        fits &= np.isnan(columns[name][matched]) | np.isnan(columns[name][targets])
+    matched, targets = matched[fits], targets[fits]
+
+    merged = {name: values.copy() for name, values in columns.items()}
+    for name in sparse_names:
+        values = merged[name]
+        fill = np.isnan(values[targets])
+        values[targets[fill]] = values[matched[fill]]
+    keep = np.ones(time.__len__(), dtype=bool)
+    keep[matched] = False
+    return {name: values[keep] for name, values in merged.items()}
+
+
+def merge_sparse_frame(data, tolerance=30.0, sparse_features=('rpi_t',)):
+    feature_names = [data.index.name] + list(data.columns)
+    columns = {name: data[name].to_numpy() for name in data.columns}
+    columns[data.index.name] = data.index.tz_localize(None).to_numpy() if data.index.tz else data.index.to_numpy()
+    merged = to_frame(feature_names, merge_sparse_rows(feature_names, columns, tolerance, sparse_features))
+    if data.index.tz:
+        merged.index = merged.index.tz_localize(data.index.tz)
+    return merged
+
+
+def to_frame(feature_names, columns):
+    import pandas as pd
+    index = pd.DatetimeIndex(columns[feature_names[0]], name=feature_names[0])
+    return pd.DataFrame({name: columns[name] for name in feature_names[1:]}, index=index)
+
+
+def write_csv_file(directory, file_prefix, location, feature_names, dataset, codec=None, level=None):
+    return write_csv_stream(directory, file_prefix, location, feature_names, dataset, codec, level)
+
+
+def write_csv_stream(directory, file_prefix, location, feature_names, data_points, codec=None, level=None,
+                     mirror=None):
+    # streamed data points are parsed while they are written, the stage includes their parsing
+    with mikrolab_metrics.stage('write_csv', codec=codec) as record:
+        path, first_time, last_time, next_id = _write_csv_part(
+            directory, file_prefix, location, feature_names, data_points, codec, level, mirror)
+        record.update(rows=next_id - 1, bytes=os.path.getsize(path))
+    return path
 
 
-def process_data(raw_data):
-    location, \
-    feature_names, \
-    dataset, \
-    column_lengths, \
-    indexes \
-        = "", [], [], [], []
+def write_csv_rows(fh, feature_names, data_points, current_id=1, header=True):
+    first_time, last_time = "", ""
+    if header:
+        fh.write('ID,' + ','.join(feature_names) + '\n')
+    for data_point in data_points:
+        if not first_time:
+            first_time = data_point[0]
+        last_time = data_point[0]
+        fh.write(str(current_id) + ',' + ','.join(data_point) + '\n')
+        current_id = current_id + 1
+    return first_time, last_time, current_id
 
-    # validate header
-    if not _validate_header(raw_data[0:3]):
-        raise HeaderBroken(raw_data[0:3], "Header Broken, don't know what to do!")
 
-    # extract location
-    location = _read_location(raw_data[0])
+def target_filename(file_prefix, location, first_time, last_time, extension='.csv'):
+    # times are decoded, a malformed one names its row instead of ending up in the file name
+    first_time, last_time = mikrolab_time.format_seconds(mikrolab_time.decode_times([first_time, last_time]))
+    filename = "_".join([first_time, location, last_time]) + extension
+    if file_prefix is not None:
+        filename = file_prefix + "_" + filename
+    return filename
 
-    # extract column lengths and feature names from header
-    for token in _split_header(raw_data[1]):
-        feature_names.append(token[0])
-        column_lengths.append(''.join(token).__len__())
 
-    # get list of indexes
-    indexes = [sum(column_lengths[:i+1]) for i in range(len(column_lengths))]
-    indexes.insert(0, 0)
-    del indexes[-1]
+def parse_target_filename(filename, file_prefix=None):
+    stem = os.path.splitext(mikrolab_codec.strip_extension(os.path.basename(filename)))[0]
+    if file_prefix is not None:
+        stem = stem[file_prefix.__len__() + 1:]
+    # both times are 19 characters wide, the location is whatever sits between them
+    return stem[20:-20], stem[:19], stem[-19:]
+
+
+def write_npz_file(directory, file_prefix, location, feature_names, columns, compress=False):
+    if columns[feature_names[0]].dtype.kind != 'M':
+        columns = _typed_columns(feature_names, columns, np.float64, False)
+    time = columns[feature_names[0]]
+    if not time.__len__():
+        raise NoDataPoints(location, "No data points to write")
+    filename = target_filename(file_prefix, location, str(time[0]), str(time[-1]), '.npz')
+    path = os.path.join(directory, filename)
 
-    # process add data_points split by indexes, strip spaces, add to dataset
-    for line in (raw_data[3:]):
-        data_point = list(map(lambda x: line[slice(*x)], zip(indexes, indexes[1:] + [None])))
-        dataset.append([feature.strip(' ') for feature in data_point])
-    return location, feature_names, column_lengths, dataset
+    # write into a temporary file, members are stored uncompressed unless asked otherwise so they can be memory mapped
+    fd, part_path = tempfile.mkstemp(suffix='.part', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            save = np.savez_compressed if compress else np.savez
+            save(fh, **{name: columns[name] for name in feature_names})
+        os.replace(part_path, path)
+    except OSError as E:
+        logging.error("Could not write to npz file: {}".format(str(E)))
+        os.remove(part_path)
+        raise
+    except BaseException:
+        os.remove(part_path)
+        raise
+    return path
 
 
-def write_csv_file(directory, file_prefix, location, feature_names, dataset):
-    # create_filename
-    filename = "_".join([dataset[0][0][:19], location, dataset[-1][0][:19]]) + ".csv"
-    if file_prefix is not None:
-        filename = file_prefix + "_" + filename
-    path = os.path.join(directory, filename)
+def read_npz_file(path, mmap_mode='r'):
+    columns = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if mmap_mode and info.compress_type == zipfile.ZIP_STORED:
+                columns[info.filename[:-4]] = _memmap_member(path, info, mmap_mode)
+            else:
+                with archive.open(info) as fh:
+                    columns[info.filename[:-4]] = np.lib.format.read_array(fh)
+    return list(columns), columns
+
+
+def convert_file(source_path, directory, file_prefix=None, minimal_length=4, workers=1, stats=None, codec=None,
+                 level=None, mirror=None):
+    # a mirror gets a copy of the rows as they are written, e.g. an upload of the converted file
+    with mikrolab_metrics.stage('convert', workers=workers) as record:
+        # a compressed export can not be split by byte ranges, it is converted in one stream, as is a mirrored one
+        if workers > 1 and mikrolab_codec.detect_codec(source_path) is None and mirror is None:
+            path = _convert_parallel(source_path, directory, file_prefix, minimal_length, workers, stats, codec, level)
+        else:
+            location, feature_names, column_lengths, data_points = process_stream(
+                read_raw_stream(source_path, minimal_length), stats)
+            path = write_csv_stream(directory, file_prefix, location, feature_names, data_points, codec, level,
+                                    mirror)
+        record.update(bytes=os.path.getsize(source_path))
+    return path
 
-    # prepare_data
-    current_id = 1
-    final_dataset = ['ID,' + ','.join(feature_names) + '\n']
-    for data_point in dataset:
-        final_dataset.append(str(current_id) + ',' + ','.join(data_point) + '\n')
-        current_id = current_id + 1
 
-    # open file and write
-    try:
-        fh = open(path, 'w')
-        for line in final_dataset:
-            fh.write(line)
-    except Exception as E:
-        logging.error("Could not write to csv file: {}".format(str(E)))
-    if 'fh' in locals():
-        fh.close()
+def index_blocks(path):
+    blocks = []
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if not size:
+            return blocks
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for match in re.finditer(rb'(?m)^name:[ \t]+\S+', buffer):
+                header_start = match.start()
+                header = []
+                position = header_start
+                for _ in range(3):
+                    end = buffer.find(b'\n', position)
+                    end = size if end < 0 else end + 1
+                    header.append(buffer[position:end].decode().strip())
+                    position = end
+                # every name line starts a block, a broken header ends the previous block all the same
+                if not _validate_header(header):
+                    raise HeaderBroken(header, "Header Broken, don't know what to do!")
+                blocks.append([_read_location(header[0]), header_start, position, size])
+    # every block runs up to the next one
+    for block, following in zip(blocks, blocks[1:]):
+        block[3] = following[1]
+    return [tuple(block) for block in blocks]
+
+
+def convert_blocks(source_path, directory, file_prefix=None, workers=1):
+    blocks = index_blocks(source_path)
+    if not blocks:
+        raise HeaderBroken([], "No header found, don't know what to do!")
+    locations = {}
+    for block in blocks:
+        locations.setdefault(block[0], []).append(block)
+    # every block is parsed on its own, the blocks of a location are then written one after the other
+    arguments = [(source_path, header_start, body_start, body_end)
+                 for location_blocks in locations.values() for location, header_start, body_start, body_end in
+                 location_blocks]
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(min(workers, blocks.__len__())) as pool:
+            return _write_locations(directory, file_prefix, locations,
+                                    _ordered_results(pool, _parse_block, arguments, workers * 2))
+    return _write_locations(directory, file_prefix, locations, itertools.starmap(_parse_block, arguments))
+
+
+def convert_incremental(source_path, directory, file_prefix=None, minimal_length=4, rollup_directory=None,
+                        mirror=None):
+    with mikrolab_metrics.stage('convert_incremental') as record:
+        path = _convert_incremental(source_path, directory, file_prefix, minimal_length, rollup_directory, mirror)
+        record.update(bytes=os.path.getsize(source_path))
     return path
 
+
+def convert_directory(source_directory, directory, file_prefix=None, minimal_length=4, workers=None, codec=None,
+                      level=None):
+    # every export is converted in a process of its own, exports unchanged since their last conversion are skipped
+    manifest_path = os.path.join(directory, '.manifest')
+    manifest = _read_checkpoint(manifest_path) or {}
+    exports = [filename for filename in sorted(os.listdir(source_directory))
+               if not filename.startswith('.') and os.path.isfile(os.path.join(source_directory, filename))]
+    settings = {'file_prefix': file_prefix, 'codec': codec}
+    pending = [filename for filename in exports
+               if not _converted(manifest.get(filename), os.path.join(source_directory, filename), directory, settings)]
+    if pending.__len__() < exports.__len__():
+        logging.info("skipping {} converted exports".format(exports.__len__() - pending.__len__()))
+
+    with mikrolab_metrics.stage('convert_directory', files=pending.__len__()) as record:
+        paths = [os.path.join(source_directory, filename) for filename in pending]
+        arguments = (paths, itertools.repeat(directory), itertools.repeat(file_prefix),
+                     itertools.repeat(minimal_length), itertools.repeat(1), itertools.repeat(None),
+                     itertools.repeat(codec), itertools.repeat(level))
+        workers = min(workers or os.cpu_count(), pending.__len__())
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(_convert_export, *argument) for argument in zip(*arguments)]
+                results = [future.result() for future in futures]
+        else:
+            results = list(map(_convert_export, *arguments))
+        record.update(bytes=sum(os.path.getsize(path) for path in paths))
+
+    for filename, path, (output, error) in zip(pending, paths, results):
+        if error is not None:
+            # one broken export does not stop the others, it is tried again next time
+            logging.error("could not convert {}: {}".format(path, error))
+            manifest.pop(filename, None)
+            continue
+        previous = manifest.get(filename)
+        manifest[filename] = dict(settings, size=os.path.getsize(path), mtime=os.stat(path).st_mtime_ns,
+                                  output=os.path.basename(output))
+        # the output of the export before it changed goes, unless another export converts to the same file
+        if previous is not None and all(entry['output'] != previous['output'] for entry in manifest.values()):
+            _remove_output(os.path.join(directory, previous['output']))
+    _write_checkpoint(manifest_path, manifest)
+    return [os.path.join(directory, manifest[filename]['output']) for filename in exports if filename in manifest]
+
 # - helper functions ---------------------------------------------------------------------------------------------------
 
 
+def _convert_export(source_path, directory, file_prefix, minimal_length, workers, stats, codec, level):
+    try:
+        return convert_file(source_path, directory, file_prefix, minimal_length, workers, stats, codec, level), None
+    except Error as e:
+        return None, e.message
+    except (ValueError, UnicodeError) as e:
+        # malformed times or bytes that are no text break only this export
+        return None, str(e)
+
+
+def _converted(entry, path, directory, settings):
+    if entry is None or any(entry[name] != value for name, value in settings.items()):
+        return False
+    stat = os.stat(path)
+    return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns and \
+        os.path.exists(os.path.join(directory, entry['output']))
+
+
+def _remove_output(path):
+    if os.path.exists(path):
+        os.remove(path)
+    mikrolab_index.remove_index(path)
+
+
+def _convert_incremental(source_path, directory, file_prefix, minimal_length, rollup_directory, mirror=None):
+    checkpoint_path = os.path.join(directory, '.' + os.path.basename(source_path) + '.checkpoint')
+    checkpoint = _read_checkpoint(checkpoint_path)
+    try:
+        fh = mikrolab_codec.open_input(source_path, 'rb')
+    except FileNotFoundError as e:
+        logging.error(e)
+        raise FileNotFoundError
+    with fh:
+        header = [fh.readline() for _ in range(3)]
+        fingerprint = hashlib.sha1(b''.join(header)).hexdigest()
+        # offsets into a compressed export can only be reached by decoding it from the start, it is converted again
+        valid = mikrolab_codec.detect_codec(source_path) is None and \
+            _checkpoint_valid(checkpoint, fh, directory, file_prefix, fingerprint)
+        if valid and rollup_directory is not None:
+            tables = mikrolab_rollup.load_rollups(rollup_directory, checkpoint['location'])
+            # rollups out of step with the checkpoint would count rows twice or miss them
+            valid = mikrolab_rollup.rollups_current(tables, checkpoint['offset'])
+        if not valid:
+            logging.info("converting {} from the beginning".format(source_path))
+            return _convert_full(fh, header, directory, file_prefix, minimal_length, checkpoint, checkpoint_path,
+                                 rollup_directory, mirror)
+
+        logging.info("converting {} from offset {}".format(source_path, checkpoint['offset']))
+        position = [checkpoint['offset']]
+        fh.seek(position[0])
+        indexes = _column_indexes(checkpoint['column_lengths'])
+        data_points = _split_lines(_complete_lines(fh, position), indexes)
+        if rollup_directory is not None:
+            data_points = mikrolab_rollup.tee_rollups(data_points, checkpoint['feature_names'], tables)
+
+        # drop anything appended after the last checkpoint was written
+        path = os.path.join(directory, checkpoint['output'])
+        with open(path, 'r+') as out:
+            out.truncate(checkpoint['output_size'])
+            if mirror is not None:
+                # the mirror gets the whole file, the rows converted before first
+                shutil.copyfileobj(out, mirror, 1 << 22)
+            out.seek(checkpoint['output_size'])
+            first_time, last_time, next_id = write_csv_rows(
+                _tee(out, mirror), checkpoint['feature_names'], data_points, checkpoint['next_id'], header=False)
+            output_size = out.tell()
+        if not first_time:
+            return path
+
+    target = os.path.join(directory, target_filename(file_prefix, checkpoint['location'],
+                                                      checkpoint['first_time'], last_time))
+    os.replace(path, target)
+    mikrolab_index.write_index(target, previous_path=path, previous_size=checkpoint['output_size'])
+    if rollup_directory is not None:
+        mikrolab_rollup.save_rollups(rollup_directory, checkpoint['location'], tables, position[0])
+    checkpoint.update(offset=position[0], last_time=last_time, next_id=next_id,
+                      output=os.path.basename(target), output_size=output_size)
+    _write_checkpoint(checkpoint_path, checkpoint)
+    return target
+
+
 # header validation functions
 def _detect_location(line, search=re.compile('name:\s+(\S+)').search):
     return bool(search(line))
@@ -147,6 +501,457 @@ def _validate_header(header_data):
     return result
 
 
+# extract data points
+def _read_layout(header):
+    # validate header
+    with mikrolab_metrics.stage('validate_header'):
+        if not _validate_header(header):
+            raise HeaderBroken(header, "Header Broken, don't know what to do!")
+
+    # extract location
+    location = _read_location(header[0])
+
+    # extract column lengths and feature names from header
+    feature_names, column_lengths = _read_header(header[1])
+    return location, feature_names, column_lengths
+
+
+def _read_header(header_line):
+    feature_names, column_lengths = [], []
+    # the last column is only matched when followed by whitespace
+    if not header_line[-1:].isspace():
+        header_line = header_line + ' '
+    for token in _split_header(header_line):
+        feature_names.append(token[0])
+        column_lengths.append(''.join(token).__len__())
+    return feature_names, column_lengths
+
+
+def _column_indexes(column_lengths):
+    indexes = [sum(column_lengths[:i+1]) for i in range(len(column_lengths))]
+    indexes.insert(0, 0)
+    del indexes[-1]
+    return indexes
+
+
+def _split_lines(raw_data, indexes):
+    bounds = [slice(*x) for x in zip(indexes, indexes[1:] + [None])]
+    for line in raw_data:
+        if line and not line.isspace():
+            yield [line[bound].strip(' ') for bound in bounds]
+
+
+def _columns_from_data_points(feature_names, data_points):
+    values = [[] for _ in feature_names]
+    for data_point in data_points:
+        for column, value in zip(values, data_point):
+            column.append(value)
+    columns = {feature_names[0]: np.array(values[0], dtype=bytes)}
+    for name, column in zip(feature_names[1:], values[1:]):
+        columns[name] = np.array([float(value) if value else np.nan for value in column], dtype=np.float64)
+    return columns
+
+
+# time as datetime64[ns], sensors as floats of the requested precision
+def _typed_columns(feature_names, columns, dtype, as_frame, merge_tolerance=None):
+    typed = {feature_names[0]: mikrolab_time.decode_times(columns[feature_names[0]]).view('datetime64[ns]')}
+    for name in feature_names[1:]:
+        typed[name] = columns[name].astype(dtype, copy=False)
+    if merge_tolerance is not None:
+        typed = merge_sparse_rows(feature_names, typed, merge_tolerance)
+    if as_frame:
+        return to_frame(feature_names, typed)
+    return typed
+
+
+# numpy engine, the export is memory mapped and sliced into columns a block of lines at a time
+def _read_columns_numpy(path, minimal_length):
+    buffer = _map_file(path)
+    starts, ends = _line_bounds(buffer)
+    if starts.__len__() < minimal_length:
+        raise FileTooShort(minimal_length, "The file is too short to be processed")
+
+    header = [buffer[starts[i]:ends[i]].tobytes().decode().strip() for i in range(3)]
+    location, feature_names, column_lengths = _read_layout(header)
+    columns = _columns_from_lines(buffer, starts[3:], ends[3:], feature_names, _column_indexes(column_lengths))
+    return location, feature_names, column_lengths, columns
+
+
+def _map_file(path):
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError as e:
+        logging.error(e)
+        raise FileNotFoundError
+    with fh:
+        if not os.fstat(fh.fileno()).st_size:
+            return np.zeros(0, dtype=np.uint8)
+        return np.frombuffer(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ), dtype=np.uint8)
+
+
+def _columns_from_lines(buffer, starts, ends, feature_names, indexes, block_size=1 << 14):
+    blocks = []
+    for block in range(0, starts.__len__(), block_size):
+        matrix = _line_matrix(buffer, starts[block:block + block_size], ends[block:block + block_size])
+        blocks.append(_split_matrix(matrix, indexes))
+    return _concatenate_columns(feature_names, [dict(zip(feature_names, block)) for block in blocks])
+
+
+def _concatenate_columns(feature_names, parts):
+    columns = {}
+    for position, name in enumerate(feature_names):
+        values = [part[name] for part in parts]
+        columns[name] = np.concatenate(values) if values else np.zeros(0, dtype=bytes if position == 0 else np.float64)
+    return columns
+
+
+def _line_bounds(buffer):
+    ends = np.flatnonzero(buffer == 10)
+    if buffer.size and buffer[-1] != 10:
+        ends = np.append(ends, buffer.size)
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+    # drop the carriage return of windows line endings
+    if ends.size:
+        ends = ends - (buffer[np.maximum(ends - 1, 0)] == 13)
+    return starts, ends
+
+
+def _line_matrix(buffer, starts, ends):
+    lengths = ends - starts
+    width = int(lengths.max())
+    segment = buffer[starts[0]:max(ends[-1], starts[0] + 1)]
+    offsets = np.arange(width, dtype=np.int32)
+    positions = (starts - starts[0]).astype(np.int32)[:, None] + offsets
+    np.minimum(positions, segment.size - 1, out=positions)
+    matrix = segment[positions]
+    matrix[offsets >= lengths[:, None]] = 32
+    # skip empty lines
+    return matrix[(matrix != 32).any(axis=1)]
+
+
+def _split_matrix(matrix, indexes):
+    fields = []
+    width = matrix.shape[1]
+    for position, (start, end) in enumerate(zip(indexes, indexes[1:] + [max(width, indexes[-1] + 1)])):
+        field = matrix[:, min(start, width):min(end, width)]
+        if field.shape[1] < end - start:
+            field = np.pad(field, ((0, 0), (0, end - start - field.shape[1])), constant_values=32)
+        if position == 0:
+            fields.append(np.char.strip(np.ascontiguousarray(field).view('S{}'.format(end - start)).ravel()))
+        else:
+            fields.append(_to_float(field))
+    return fields
+
+
+def _to_float(field):
+    values = np.ascontiguousarray(field).view('S{}'.format(field.shape[1])).ravel()
+    blank = (field == 32).all(axis=1)
+    return np.where(blank, b'nan', values).astype(np.float64)
+
+
+# an uncompressed npz member is a plain npy file inside the zip archive
+def _memmap_member(path, info, mmap_mode):
+    with open(path, 'rb') as fh:
+        fh.seek(info.header_offset)
+        local_header = struct.unpack('<4s5H3L2H', fh.read(30))
+        fh.seek(info.header_offset + 30 + local_header[-2] + local_header[-1])
+        if np.lib.format.read_magic(fh) == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fh)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fh)
+        offset = fh.tell()
+    if not np.prod(shape, dtype=np.int64):
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def _read_head(lines, minimal_length):
+    head = [line.strip() for line in itertools.islice(lines, minimal_length)]
+    if head.__len__() < minimal_length:
+        raise FileTooShort(minimal_length, "The file is too short to be processed")
+    return head
+
+
+def _stream_lines(fh, head):
+    with fh:
+        yield from head
+        for line in fh:
+            yield line.strip()
+
+
+# write data points
+def _write_csv_part(directory, file_prefix, location, feature_names, data_points, codec=None, level=None,
+                    mirror=None):
+    return _write_part(directory, file_prefix, location,
+                       lambda fh: write_csv_rows(_tee(fh, mirror), feature_names, data_points), codec, level)
+
+
+def _tee(fh, mirror):
+    return fh if mirror is None else _Tee(fh, mirror)
+
+
+class _Tee:
+    # every write goes to the file and to its mirror
+    def __init__(self, fh, mirror):
+        self.fh = fh
+        self.mirror = mirror
+
+    def write(self, data):
+        self.mirror.write(data)
+        return self.fh.write(data)
+
+
+def _write_part(directory, file_prefix, location, write, codec=None, level=None):
+    # write into a temporary file, the name depends on the last data point
+    fd, part_path = tempfile.mkstemp(suffix='.part', dir=directory)
+    first_time, last_time, next_id = "", "", 1
+    try:
+        with os.fdopen(fd, 'wb') as raw, mikrolab_codec.open_output(raw, codec=codec, level=level) as fh:
+            first_time, last_time, next_id = write(fh)
+        if not first_time:
+            raise NoDataPoints(location, "No data points to write")
+        extension = '.csv' + mikrolab_codec.extension(codec)
+        path = os.path.join(directory, target_filename(file_prefix, location, first_time, last_time, extension))
+        os.replace(part_path, path)
+    except OSError as E:
+        logging.error("Could not write to csv file: {}".format(str(E)))
+        os.remove(part_path)
+        raise
+    except BaseException:
+        # a failing generator, a malformed time or an interrupt leave no temporary file behind either
+        os.remove(part_path)
+        raise
+    # byte offsets of a compressed file are of no use for partial reads
+    if codec is None:
+        mikrolab_index.write_index(path)
+    return path, first_time, last_time, next_id
+
+
+# parallel conversion, the header is read once and the body is split into ranges aligned to newlines
+def _split_export(path, minimal_length, chunks, minimal_chunk=1 << 18, maximal_chunk=1 << 26):
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError as e:
+        logging.error(e)
+        raise FileNotFoundError
+    with fh:
+        head = [line for line in (fh.readline() for _ in range(minimal_length)) if line]
+        if head.__len__() < minimal_length:
+            raise FileTooShort(minimal_length, "The file is too short to be processed")
+        location, feature_names, column_lengths = _read_layout([line.decode().strip() for line in head[:3]])
+
+        start = sum(line.__len__() for line in head[:3])
+        size = os.fstat(fh.fileno()).st_size
+        # more chunks for a bigger export, a chunk in flight holds at most maximal_chunk bytes of it
+        chunks = max(1, min(max(chunks, -(-(size - start) // maximal_chunk)), (size - start) // minimal_chunk))
+        bounds = [start]
+        for chunk in range(1, chunks):
+            fh.seek(start + chunk * (size - start) // chunks)
+            fh.readline()
+            if bounds[-1] < fh.tell() < size:
+                bounds.append(fh.tell())
+        bounds.append(size)
+    return location, feature_names, column_lengths, list(zip(bounds, bounds[1:]))
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        return fh.read(end - start).decode().splitlines()
+
+
+def _convert_chunk(path, start, end, indexes, feature_names=None):
+    # rows without their ID, the parent numbers them once it knows the rows of the chunks before
+    lines = (line.strip() for line in _read_range(path, start, end))
+    data_points, stats = _split_lines(lines, indexes), None
+    # statistics of every chunk are merged in the parent
+    if feature_names is not None:
+        stats = {}
+        data_points = mikrolab_stats.tee_stats(data_points, feature_names, stats)
+    rows = [data_point[0] + ',' + ','.join(data_point[1:]) for data_point in data_points]
+    first_time = rows[0][:rows[0].find(',')] if rows else ""
+    last_time = rows[-1][:rows[-1].find(',')] if rows else ""
+    return rows, first_time, last_time, stats
+
+
+def _read_chunk(path, start, end, engine, feature_names, indexes):
+    if engine == 'numpy':
+        buffer = _map_file(path)[start:end]
+        starts, ends = _line_bounds(buffer)
+        return _columns_from_lines(buffer, starts, ends, feature_names, indexes)
+    lines = (line.strip() for line in _read_range(path, start, end))
+    return _columns_from_data_points(feature_names, _split_lines(lines, indexes))
+
+
+def _convert_parallel(source_path, directory, file_prefix, minimal_length, workers, stats=None, codec=None,
+                      level=None):
+    location, feature_names, column_lengths, ranges = _split_export(source_path, minimal_length, workers * 4)
+    indexes = _column_indexes(column_lengths)
+    arguments = [(source_path, start, end, indexes, feature_names if stats is not None else None)
+                 for start, end in ranges]
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        def write(fh):
+            first_time, last_time, next_id = "", "", 1
+            fh.write('ID,' + ','.join(feature_names) + '\n')
+            # chunks are written in order, two per worker in flight so converted rows do not pile up in memory
+            for rows, chunk_first_time, chunk_last_time, chunk_stats in _ordered_results(
+                    pool, _convert_chunk, arguments, workers * 2):
+                if chunk_stats is not None:
+                    mikrolab_stats.merge_stats(stats, chunk_stats)
+                next_id = _write_rows(fh, rows, next_id)
+                first_time = first_time or chunk_first_time
+                last_time = chunk_last_time or last_time
+            return first_time, last_time, next_id
+
+        return _write_part(directory, file_prefix, location, write, codec, level)[0]
+
+
+def _ordered_results(pool, function, arguments, window):
+    # results in the order of the arguments, at most window calls are submitted ahead of the one consumed
+    pending = collections.deque()
+    for argument in arguments:
+        pending.append(pool.submit(function, *argument))
+        if pending.__len__() >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _read_columns_parallel(path, engine, minimal_length, workers):
+    location, feature_names, column_lengths, ranges = _split_export(path, minimal_length, workers * 4)
+    indexes = _column_indexes(column_lengths)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        parts = list(pool.map(_read_chunk, itertools.repeat(path), [start for start, end in ranges],
+                              [end for start, end in ranges], itertools.repeat(engine),
+                              itertools.repeat(feature_names), itertools.repeat(indexes)))
+    return location, feature_names, column_lengths, _concatenate_columns(feature_names, parts)
+
+
+# multiple blocks, all blocks of a location go into one file
+def _parse_block(path, header_start, body_start, body_end):
+    header = list(_range_lines(path, header_start, body_start))
+    location, feature_names, column_lengths = _read_layout(header)
+    return (header, feature_names) + _convert_chunk(path, body_start, body_end, _column_indexes(column_lengths))
+
+
+def _write_locations(directory, file_prefix, locations, parsed_blocks):
+    # parsed blocks come in the order of the locations and of their blocks within a location
+    paths = []
+    for location, blocks in locations.items():
+        def write(fh):
+            feature_names, first_time, last_time, next_id = None, "", "", 1
+            for header, block_feature_names, rows, block_first_time, block_last_time, stats in \
+                    itertools.islice(parsed_blocks, blocks.__len__()):
+                if feature_names is None:
+                    feature_names = block_feature_names
+                    fh.write('ID,' + ','.join(feature_names) + '\n')
+                elif block_feature_names != feature_names:
+                    raise HeaderBroken(header, "Blocks of {} have different columns".format(location))
+                next_id = _write_rows(fh, rows, next_id)
+                first_time = first_time or block_first_time
+                last_time = block_last_time or last_time
+            return first_time, last_time, next_id
+
+        paths.append(_write_part(directory, file_prefix, location, write)[0])
+    return paths
+
+
+def _write_rows(fh, rows, next_id):
+    fh.write(''.join([str(row_id) + ',' + row + '\n' for row_id, row in enumerate(rows, next_id)]))
+    return next_id + rows.__len__()
+
+
+def _range_lines(path, start, end):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        position = start
+        while position < end:
+            line = fh.readline(end - position)
+            if not line:
+                break
+            position += line.__len__()
+            yield line.decode().strip()
+
+
+# incremental conversion
+def _complete_lines(fh, position):
+    # a line without a newline may still be being written, it is picked up by the next run
+    for line in fh:
+        if not line.endswith(b'\n'):
+            break
+        position[0] += line.__len__()
+        yield line.decode().strip()
+
+
+def _convert_full(fh, header, directory, file_prefix, minimal_length, checkpoint, checkpoint_path,
+                  rollup_directory=None, mirror=None):
+    position = [sum(line.__len__() for line in header)]
+    fh.seek(position[0])
+    lines = itertools.chain([line.decode().strip() for line in header], _complete_lines(fh, position))
+    head = list(itertools.islice(lines, minimal_length))
+    if head.__len__() < minimal_length:
+        raise FileTooShort(minimal_length, "The file is too short to be processed")
+    location, feature_names, column_lengths, data_points = process_stream(itertools.chain(head, lines))
+    tables = {}
+    if rollup_directory is not None:
+        data_points = mikrolab_rollup.tee_rollups(data_points, feature_names, tables)
+    path, first_time, last_time, next_id = _write_csv_part(directory, file_prefix, location, feature_names, data_points,
+                                                           mirror=mirror)
+    if rollup_directory is not None:
+        mikrolab_rollup.save_rollups(rollup_directory, location, tables, position[0])
+
+    # the previous output is replaced, not kept next to the new one
+    if checkpoint is not None:
+        previous = os.path.join(directory, checkpoint['output'])
+        if previous != path and os.path.exists(previous):
+            os.remove(previous)
+            mikrolab_index.remove_index(previous)
+    _write_checkpoint(checkpoint_path, {
+        'header': hashlib.sha1(b''.join(header)).hexdigest(),
+        'file_prefix': file_prefix,
+        'location': location,
+        'feature_names': feature_names,
+        'column_lengths': column_lengths,
+        'offset': position[0],
+        'first_time': first_time,
+        'last_time': last_time,
+        'next_id': next_id,
+        'output': os.path.basename(path),
+        'output_size': os.path.getsize(path),
+    })
+    return path
+
+
+def _checkpoint_valid(checkpoint, fh, directory, file_prefix, fingerprint):
+    if checkpoint is None or checkpoint['header'] != fingerprint or checkpoint['file_prefix'] != file_prefix:
+        return False
+    path = os.path.join(directory, checkpoint['output'])
+    if not os.path.exists(path) or os.path.getsize(path) < checkpoint['output_size']:
+        return False
+    if os.fstat(fh.fileno()).st_size < checkpoint['offset']:
+        return False
+    # the last converted line must still be where it was, otherwise the export was rewritten
+    start = max(0, checkpoint['offset'] - 4096)
+    fh.seek(start)
+    tail = [line for line in fh.read(checkpoint['offset'] - start).splitlines() if line.strip()]
+    return bool(tail) and tail[-1].decode().startswith(checkpoint['last_time'])
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, checkpoint):
+    with open(path + '.part', 'w') as fh:
+        json.dump(checkpoint, fh)
+    os.replace(path + '.part', path)
+
+
 # ammend original data
 def _add_trailing_spaces(raw_data):
     max_line_lenght = max(raw_data, key=len).__len__()
@@ -162,22 +967,20 @@ if __name__ == "__main__":
     data_directory = './datasource'
     source_file = 'influx-export.csv'
     source_file_path = os.path.join(data_directory, source_file)
+    logging.basicConfig(filename='./logs/source_data_log', level=logging.DEBUG)
+    mikrolab_metrics.configure('./logs/source_data_metrics')
 
-    source_data = read_raw_file(source_file_path)
-
-    for index in range(10):
-        print("{}".format(source_data[index]))
-
-    sd_location, sd_feature_names, sd_column_lengths, sd_dataset = process_data(source_data)
-
-    print("Location: {}".format(sd_location))
-    print("Feature names: {}".format(",".join(sd_feature_names)))
-    print("Column lengths: {}".format(",".join(str(l) for l in sd_column_lengths)))
-    print("number of data points: {}".format(sd_dataset.__len__()))
-    print("last datapoint: {}".format(sd_dataset[-20:-1]))
+    # an export or a directory of exports, e.g. a year of daily exports to backfill
+    source_path = sys.argv[1] if sys.argv.__len__() > 1 else source_file_path
+    target_directory = sys.argv[2] if sys.argv.__len__() > 2 else target_directory
 
+    if os.path.isdir(source_path):
+        paths = convert_directory(source_path, target_directory, target_file_prefix)
+    else:
+        paths = [convert_file(source_path, target_directory, target_file_prefix)]
 
-    write_csv_file(target_directory, target_file_prefix, sd_location, sd_feature_names, sd_dataset)
+    for path in paths:
+        print("Converted file: {}".format(path))
 
     sys.exit(0)
 
@@ -198,3 +1001,9 @@ class HeaderBroken(Error):
     def __init__(self, header, message):
         self.header = header
         self.message = message
+
+
+class NoDataPoints(Error):
+    def __init__(self, location, message):
+        self.location = location
+        self.message = message
@@ -0,0 +1,160 @@
+import numpy as np
+
+import collections
+import math
+
+import mikrolab_rollup
+import mikrolab_source_data as mikrolab
+
+
+# bins are 2 ** exponent wide, so histograms of different widths merge exactly by coarsening the finer one
+MAX_BINS = 2048
+
+
+def new_stats(feature_names):
+    return {name: {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': math.inf, 'max': -math.inf,
+                   'exponent': None, 'first_bin': 0, 'bins': np.zeros(0, dtype=np.int64)}
+            for name in feature_names}
+
+
+def update_stats(stats, feature_names, columns):
+    # feature_names[0] is the time column, it is not needed, every other column is a sensor
+    for name in feature_names[1:]:
+        values = np.asarray(columns[name], dtype=np.float64)
+        _update_entry(stats.setdefault(name, new_stats([name])[name]), values[~np.isnan(values)])
+    return stats
+
+
+def merge_stats(stats, other):
+    for name, entry in other.items():
+        if name not in stats:
+            stats[name] = new_stats([name])[name]
+        _merge_entry(stats[name], entry)
+    return stats
+
+
+def tee_stats(data_points, feature_names, stats, batch_size=1 << 16):
+    # data points pass through unchanged, every batch is added to the statistics on the way
+    batch = []
+    for data_point in data_points:
+        batch.append(data_point)
+        if batch.__len__() >= batch_size:
+            update_stats(stats, feature_names, mikrolab_rollup.batch_columns(feature_names, batch, parse_time=False))
+            batch = []
+        yield data_point
+    if batch:
+        update_stats(stats, feature_names, mikrolab_rollup.batch_columns(feature_names, batch, parse_time=False))
+
+
+def stats_from_export(path, minimal_length=4):
+    # one streaming pass, the export never has to fit in memory
+    stats = {}
+    location, feature_names, column_lengths, data_points = mikrolab.process_stream(
+        mikrolab.read_raw_stream(path, minimal_length), stats=stats)
+    collections.deque(data_points, maxlen=0)
+    return stats
+
+
+def frame_stats(data):
+    return update_stats({}, [data.index.name] + list(data.columns), {name: data[name] for name in data.columns})
+
+
+def quantile(entry, q):
+    if not entry['count']:
+        return math.nan
+    # linear inside the bin holding the q-th value, exact to one bin width
+    cumulative = np.cumsum(entry['bins'])
+    target = q * entry['count']
+    position = min(int(np.searchsorted(cumulative, target, side='left')), cumulative.size - 1)
+    below = cumulative[position - 1] if position else 0
+    fraction = (target - below) / entry['bins'][position] if entry['bins'][position] else 0.0
+    width = 2.0 ** entry['exponent']
+    value = (entry['first_bin'] + position + fraction) * width
+    return float(min(max(value, entry['min']), entry['max']))
+
+
+def describe(stats, percentiles=(0.25, 0.5, 0.75)):
+    import pandas as pd
+    # the same rows as DataFrame.describe, the standard deviation is the sample one
+    rows = ['count', 'mean', 'std', 'min'] + ['{:g}%'.format(100 * q) for q in percentiles] + ['max']
+    description = {}
+    for name, entry in stats.items():
+        count = entry['count']
+        std = math.sqrt(entry['m2'] / (count - 1)) if count > 1 else math.nan
+        mean, minimum, maximum = (entry['mean'], entry['min'], entry['max']) if count else (math.nan,) * 3
+        description[name] = [count, mean, std, minimum] + [quantile(entry, q) for q in percentiles] + [maximum]
+    return pd.DataFrame(description, index=rows)
+
+
+def histogram(entry, bins=30):
+    # the fine bins are regrouped into equal bins between min and max
+    if not entry['count']:
+        return np.zeros(bins, dtype=np.int64), np.linspace(0.0, 1.0, bins + 1)
+    width = 2.0 ** entry['exponent']
+    centers = (entry['first_bin'] + np.arange(entry['bins'].size) + 0.5) * width
+    centers = np.clip(centers, entry['min'], entry['max'])
+    counts, edges = np.histogram(centers, bins, range=(entry['min'], entry['max']), weights=entry['bins'])
+    return counts.astype(np.int64), edges
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _update_entry(entry, values):
+    if not values.size:
+        return entry
+    minimum, maximum = values.min(), values.max()
+    # the bin width of the batch keeps its histogram within MAX_BINS
+    span = max(maximum - minimum, np.abs(values).max() * 2.0 ** -10, 2.0 ** -20)
+    exponent = math.ceil(math.log2(span / MAX_BINS))
+    if entry['exponent'] is not None:
+        exponent = max(exponent, entry['exponent'])
+    indexes = np.floor(values / 2.0 ** exponent).astype(np.int64)
+    first_bin = int(indexes.min())
+    mean = values.mean()
+    batch = {'count': values.size, 'mean': mean, 'm2': float(((values - mean) ** 2).sum()), 'min': minimum,
+             'max': maximum, 'exponent': exponent, 'first_bin': first_bin,
+             'bins': np.bincount(indexes - first_bin).astype(np.int64)}
+    return _merge_entry(entry, batch)
+
+
+def _merge_entry(entry, other):
+    if not other['count']:
+        return entry
+    # mean and sum of squared deviations of two parts, Chan et al.
+    count = entry['count'] + other['count']
+    delta = other['mean'] - entry['mean']
+    entry['m2'] = entry['m2'] + other['m2'] + delta ** 2 * entry['count'] * other['count'] / count
+    entry['mean'] = entry['mean'] + delta * other['count'] / count
+    entry['count'] = count
+    entry['min'] = float(min(entry['min'], other['min']))
+    entry['max'] = float(max(entry['max'], other['max']))
+
+    if entry['exponent'] is None:
+        entry.update(exponent=other['exponent'], first_bin=other['first_bin'], bins=other['bins'].copy())
+        return entry
+    exponent = max(entry['exponent'], other['exponent'])
+    first, bins = _coarsen(entry['first_bin'], entry['bins'], exponent - entry['exponent'])
+    other_first, other_bins = _coarsen(other['first_bin'], other['bins'], exponent - other['exponent'])
+    low, high = min(first, other_first), max(first + bins.size, other_first + other_bins.size) - 1
+    steps = 0
+    while (high >> steps) - (low >> steps) + 1 > MAX_BINS:
+        steps += 1
+    first, bins = _coarsen(first, bins, steps)
+    other_first, other_bins = _coarsen(other_first, other_bins, steps)
+    low = min(first, other_first)
+    merged = np.zeros(max(first + bins.size, other_first + other_bins.size) - low, dtype=np.int64)
+    merged[first - low:first - low + bins.size] += bins
+    merged[other_first - low:other_first - low + other_bins.size] += other_bins
+    entry.update(exponent=exponent + steps, first_bin=low, bins=merged)
+    return entry
+
+
+def _coarsen(first_bin, bins, steps):
+    if not steps:
+        return first_bin, bins
+    indexes = (np.arange(bins.size, dtype=np.int64) + first_bin) >> steps
+    return first_bin >> steps, np.bincount(indexes - (first_bin >> steps), weights=bins).astype(np.int64)
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
@@ -0,0 +1,93 @@
+import numpy as np
+
+import itertools
+import os
+import sys
+
+
+# layout of a real export, column widths include the padding, the last column is not padded
+LAYOUT = [('time', 31), ('co2_hum', 18), ('co2_ppm', 19), ('co2_tmp', 19), ('ec', 19), ('ph', 6), ('rpi_t', 6),
+          ('rtd_t', 7), ('tsl', 3)]
+
+# base, daily amplitude, noise and decimals of every sensor, values are quantized so they fit their column
+SENSORS = {
+    'co2_hum': (70.0, 10.0, 2.0, 12),
+    'co2_ppm': (400.0, 40.0, 8.0, 14),
+    'co2_tmp': (15.0, 4.0, 0.5, 14),
+    'ec': (0.66, 0.02, 0.002, 4),
+    'ph': (6.4, 0.1, 0.02, 3),
+    'rpi_t': (47.0, 3.0, 0.5, 2),
+    'rtd_t': (12.8, 2.0, 0.05, 3),
+    'tsl': (400.0, 400.0, 20.0, 0),
+}
+
+
+def generate_lines(rows, location='office', start='2018-09-22T04:30:36', interval=15.0, sparse_every=4,
+                   blank_probability=0.0, seed=0, chunk_size=1 << 16):
+    # the header, then every (sparse_every + 1)-th data line only holds rpi_t like the real export
+    header = ''.join(name.ljust(width) for name, width in LAYOUT).rstrip()
+    separator = ''.join(('-' * name.__len__()).ljust(width) for name, width in LAYOUT).rstrip()
+    yield from ["name: " + location, header, separator]
+    random = np.random.default_rng(seed)
+    start = np.datetime64(start, 'ns')
+    for first in range(0, rows, chunk_size):
+        yield from _chunk_lines(random, start, np.arange(first, min(rows, first + chunk_size)), interval,
+                                sparse_every, blank_probability)
+
+
+def write_export(path, rows, newline='\r\n', **kwargs):
+    with open(path, 'w', newline='') as fh:
+        for lines in _batched(generate_lines(rows, **kwargs), 1 << 16):
+            fh.write(newline.join(lines) + newline)
+    return path
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _chunk_lines(random, start, index, interval, sparse_every, blank_probability):
+    seconds = index * interval + random.uniform(0, interval / 2, index.size)
+    time = start + (seconds * 1e9).astype('timedelta64[ns]')
+    day = np.sin(2 * np.pi * seconds / 86400)
+    cells = {'time': np.char.add(np.datetime_as_string(time, unit='ns'), 'Z')}
+    for name, (base, amplitude, noise, decimals) in SENSORS.items():
+        values = np.abs(base + amplitude * day + random.normal(0, noise, index.size))
+        if decimals > 4:
+            # sensor readings are binary fractions, printed with all their digits
+            cells[name] = (np.round(values * 2 ** decimals) / 2 ** decimals).astype(str)
+        elif decimals:
+            cells[name] = np.round(values, decimals).astype(str)
+        else:
+            cells[name] = np.round(values).astype(np.int64).astype(str)
+        cells[name][random.random(index.size) < blank_probability] = ''
+
+    sparse = index % (sparse_every + 1) == sparse_every if sparse_every else np.zeros(index.size, dtype=bool)
+    cells['rpi_t'][~sparse] = ''
+    for name, width in LAYOUT[1:]:
+        if name != 'rpi_t':
+            cells[name][sparse] = ''
+    lines, offset = cells['time'], 0
+    for (name, width), (next_name, next_width) in zip(LAYOUT, LAYOUT[1:]):
+        offset += width
+        lines = np.char.add(np.char.ljust(lines, offset), cells[next_name])
+    return np.char.rstrip(lines).tolist()
+
+
+def _batched(lines, size):
+    while True:
+        batch = list(itertools.islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    target_path = sys.argv[1] if sys.argv.__len__() > 1 else os.path.join('./datasource', 'influx-export.csv')
+    number_of_rows = int(sys.argv[2]) if sys.argv.__len__() > 2 else 69931
+
+    write_export(target_path, number_of_rows)
+
+    sys.exit(0)
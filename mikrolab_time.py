@@ -0,0 +1,143 @@
+import numpy as np
+
+import logging
+
+
+# times of the export are RFC 3339 in UTC, YYYY-MM-DDTHH:MM:SS, up to nine fraction digits with trailing zeros
+# trimmed, then Z; the Z is optional so numpy's own str() of a datetime64 decodes as well
+LAYOUT = b'0000-00-00T00:00:00'
+NAT = np.iinfo(np.int64).min
+BLOCK_SIZE = 1 << 16
+
+
+def decode_times(values, errors='raise'):
+    # epoch nanoseconds of every time, malformed rows raise MalformedTimestamps or become NaT with errors='coerce'
+    if errors not in ('raise', 'coerce'):
+        raise ValueError("Unknown errors: {}".format(errors))
+    matrix = _byte_matrix(values)
+    nanoseconds, valid = _decode(matrix)
+    if not valid.all():
+        rows = np.flatnonzero(~valid)
+        message = "{} malformed times, first in rows {}: {}".format(
+            rows.size, rows[:5].tolist(), [bytes(matrix[row]).rstrip(b'\x00').decode(errors='replace')
+                                           for row in rows[:5]])
+        if errors == 'raise':
+            raise MalformedTimestamps(rows, message)
+        logging.warning(message)
+    return nanoseconds
+
+
+def decode_time(value):
+    return int(decode_times([value])[0])
+
+
+def malformed_rows(values):
+    return np.flatnonzero(~_decode(_byte_matrix(values))[1])
+
+
+def to_datetime(values, errors='raise'):
+    import pandas as pd
+    # the same times as pd.to_datetime of the strings, UTC aware
+    return pd.DatetimeIndex(decode_times(values, errors).view('datetime64[ns]'), tz='UTC')
+
+
+def format_seconds(nanoseconds):
+    # YYYY-MM-DDTHH:MM:SS, the time part of converted file names
+    return np.datetime_as_string(np.asarray(nanoseconds, dtype=np.int64).view('datetime64[ns]'), unit='s')
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+def _byte_matrix(values):
+    # one row of at least _WIDTH bytes per time, shorter times are padded with zero bytes
+    values = np.asarray(values)
+    if values.dtype.kind != 'S':
+        try:
+            values = values.astype('S')
+        except UnicodeEncodeError:
+            values = np.array([str(value).encode('ascii', errors='replace') for value in values.ravel()], dtype='S')
+    values = np.ascontiguousarray(values.ravel())
+    if values.dtype.itemsize < _WIDTH:
+        values = values.astype('S{}'.format(_WIDTH))
+    return values.view(np.uint8).reshape(values.size, values.dtype.itemsize)
+
+
+def _decode(matrix):
+    # blocks keep the intermediate matrices small
+    nanoseconds = np.empty(matrix.shape[0], dtype=np.int64)
+    valid = np.empty(matrix.shape[0], dtype=bool)
+    lengths = np.char.str_len(matrix.view('S{}'.format(matrix.shape[1])).ravel())
+    for first in range(0, matrix.shape[0], BLOCK_SIZE):
+        block = slice(first, first + BLOCK_SIZE)
+        nanoseconds[block], valid[block] = _decode_block(matrix[block], lengths[block])
+    return nanoseconds, valid
+
+
+def _decode_block(matrix, length):
+    rows = matrix.shape[0]
+    # bytes minus the layout wrap around below zero, a digit is below 10 after it, a separator below 1,
+    # the checks of a row are read as three words at once
+    head = matrix[:, :_BASE.size] - _BASE
+    words = (head < _LIMIT).view(np.uint64)
+    valid = (words[:, 0] & words[:, 1] & words[:, 2]) == _ALL_SET
+    fields = (head[:, :LAYOUT.__len__()] @ _FIELDS).astype(np.int64)
+    year, month, day, hour, minute, second, time_of_day = fields.T
+    months = np.clip(year * 12 + month - 1, 0, _MONTH_START.size - 1)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= _MONTH_DAYS[months])
+    valid &= (hour < 24) & (minute < 60) & (second < 60)
+
+    # a dot and one to nine digits, then an optional Z; every byte after the length is padding
+    has_z = matrix[np.arange(rows), np.maximum(length - 1, 0)] == ord('Z')
+    count = length - has_z - LAYOUT.__len__() - 1
+    digits = matrix[:, LAYOUT.__len__() + 1:LAYOUT.__len__() + 10] - np.uint8(48)
+    is_digit = digits < 10
+    has_fraction = (matrix[:, LAYOUT.__len__()] == ord('.')) & (count >= 1) & (count <= 9) & \
+        (is_digit @ _ONES == count)
+    valid &= (count == -1) | has_fraction
+    fraction = (np.where(is_digit, digits, 0) @ _FRACTION).astype(np.int64)
+
+    days = _MONTH_START[months] + day - 1
+    return np.where(valid, (days * 86400 + time_of_day) * 1000000000 + fraction, NAT), valid
+
+
+def _days_from_civil(year, month, day):
+    # days since 1970-01-01 of the proleptic gregorian calendar, H. Hinnant
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+# the layout as matrices, one product with the digits gives every field at once
+_WIDTH = 32
+_BASE = np.zeros(24, dtype=np.uint8)
+_BASE[:LAYOUT.__len__()] = [48 if byte == ord('0') else byte for byte in LAYOUT]
+_LIMIT = np.full(24, 255, dtype=np.uint8)
+_LIMIT[:LAYOUT.__len__()] = [10 if byte == ord('0') else 1 for byte in LAYOUT]
+_ALL_SET = np.uint64(0x0101010101010101)
+_FIELDS = np.zeros((LAYOUT.__len__(), 7), dtype=np.float32)
+for _field, (_first, _last) in enumerate([(0, 4), (5, 7), (8, 10), (11, 13), (14, 16), (17, 19)]):
+    _FIELDS[_first:_last, _field] = 10.0 ** np.arange(_last - _first - 1, -1, -1)
+_FIELDS[:, 6] = _FIELDS[:, 3] * 3600 + _FIELDS[:, 4] * 60 + _FIELDS[:, 5]
+_FRACTION = 10.0 ** np.arange(8, -1, -1)
+_ONES = np.ones(9, dtype=np.float32)
+
+# first day and number of days of every month of the years 0 to 9999
+_MONTH_START = _days_from_civil(np.repeat(np.arange(10000), 12), np.tile(np.arange(1, 13), 10000), 1)
+_MONTH_DAYS = np.diff(_MONTH_START, append=_days_from_civil(10000, 1, 1))
+
+
+# - helper functions ---------------------------------------------------------------------------------------------------
+
+
+# - exceptions ---------------------------------------------------------------------------------------------------------
+
+
+class MalformedTimestamps(ValueError):
+    def __init__(self, rows, message):
+        super().__init__(message)
+        self.rows = rows
+        self.message = message
@@ -0,0 +1,423 @@
+import mikrolab_rollup
+
+import gzip
+import importlib.util
+import os
+
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+spec = importlib.util.spec_from_file_location('mikrolab_aws', os.path.join(os.path.dirname(__file__), 'mikrolab-aws.py'))
+aws = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(aws)
+
+
+# test building the dataset
+
+def test_build_dataset_from_export_same_as_build_dataset(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    converted_directory = tmp_path / 'converted'
+    converted_directory.mkdir()
+    aws.mikrolab.convert_file(path, str(converted_directory))
+
+    expected = aws.build_dataset(str(converted_directory))
+    dataset = aws.build_dataset_from_export(path)
+    pd.testing.assert_frame_equal(dataset, expected)
+
+def test_build_dataset_prefers_npz(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    location, feature_names, column_lengths, columns = aws.mikrolab.read_columns(path, typed=True)
+    aws.mikrolab.write_npz_file(str(tmp_path), None, location, feature_names, columns)
+
+    dataset = aws.build_dataset(str(tmp_path))
+    pd.testing.assert_frame_equal(dataset, aws.build_dataset_from_export(path))
+    (tmp_path / 'converted').mkdir()
+    aws.mikrolab.convert_file(path, str(tmp_path / 'converted'))
+    # the same index whatever the files are stored in
+    pd.testing.assert_frame_equal(dataset, aws.build_dataset(str(tmp_path / 'converted')))
+    assert str(dataset.index.tz) == 'UTC'
+
+def _convert_overlapping_exports(tmp_path):
+    first = source_data._write_export(tmp_path / 'first.csv', source_data.export_lines[:6])
+    second = source_data._write_export(tmp_path / 'second.csv',
+                                       source_data.export_lines[:3] + source_data.export_lines[4:])
+    converted_directory = tmp_path / 'converted'
+    converted_directory.mkdir()
+    for path in [second, first]:
+        aws.mikrolab.convert_file(path, str(converted_directory))
+    return str(converted_directory)
+
+def test_build_dataset_assembles_every_file(tmp_path):
+    converted_directory = _convert_overlapping_exports(tmp_path)
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    (tmp_path / 'expected').mkdir()
+    aws.mikrolab.convert_file(path, str(tmp_path / 'expected'))
+
+    dataset = aws.build_dataset(converted_directory)
+    pd.testing.assert_frame_equal(dataset, aws.build_dataset(str(tmp_path / 'expected')))
+    assert dataset.index.is_monotonic_increasing
+    assert dataset.__len__() == 4
+
+def test_build_dataset_chunks_same_as_build_dataset(tmp_path):
+    converted_directory = _convert_overlapping_exports(tmp_path)
+    chunks = list(aws.build_dataset_chunks(converted_directory, chunk_rows=1))
+    pd.testing.assert_frame_equal(pd.concat(chunks), aws.build_dataset(converted_directory))
+
+def test_build_dataset_chunks_same_as_build_dataset_interleaved(tmp_path):
+    converted_directory = tmp_path / 'converted'
+    converted_directory.mkdir()
+    lines = source_data.export_lines
+    # rows of the two exports alternate in time, one row is in both
+    for name, part in [('first', lines[3::2]), ('second', lines[4::2] + lines[5:6])]:
+        path = source_data._write_export(tmp_path / (name + '.csv'), lines[:3] + sorted(part, key=lines.index))
+        aws.mikrolab.convert_file(path, str(converted_directory), name)
+    chunks = list(aws.build_dataset_chunks(str(converted_directory), chunk_rows=1))
+    dataset = aws.build_dataset(str(converted_directory))
+    pd.testing.assert_frame_equal(pd.concat(chunks), dataset)
+    (tmp_path / 'expected').mkdir()
+    aws.mikrolab.convert_file(source_data._write_export(tmp_path / 'export.csv', lines), str(tmp_path / 'expected'))
+    pd.testing.assert_frame_equal(dataset, aws.build_dataset(str(tmp_path / 'expected')))
+
+def test_build_dataset_assembles_every_npz_file(tmp_path):
+    for lines, directory in [(source_data.export_lines[:6], 'first'),
+                             (source_data.export_lines[:3] + source_data.export_lines[4:], 'second')]:
+        path = source_data._write_export(tmp_path / (directory + '.csv'), lines)
+        location, feature_names, column_lengths, columns = aws.mikrolab.read_columns(path, typed=True)
+        aws.mikrolab.write_npz_file(str(tmp_path), directory, location, feature_names, columns)
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+
+    dataset = aws.build_dataset(str(tmp_path))
+    pd.testing.assert_frame_equal(dataset, aws.build_dataset_from_export(path))
+
+def test_build_dataset_window(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    converted_directory = tmp_path / 'converted'
+    converted_directory.mkdir()
+    aws.mikrolab.convert_file(path, str(converted_directory))
+
+    dataset = aws.build_dataset(str(converted_directory), start='2018-09-22T04:30:40', end='2018-09-22T04:31:05')
+    assert dataset.index.strftime('%H:%M:%S').tolist() == ['04:30:52', '04:31:03']
+    assert dataset['co2_hum'].tolist() == [78.36761474609375, 78.36761474609375]
+
+def test_build_dataset_compressed_window(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    converted_directory = tmp_path / 'converted'
+    converted_directory.mkdir()
+    aws.mikrolab.convert_file(path, str(converted_directory), codec='gzip')
+
+    dataset = aws.build_dataset(str(converted_directory), start='2018-09-22T04:30:40', end='2018-09-22T04:31:05')
+    assert dataset.index.strftime('%H:%M:%S').tolist() == ['04:30:52', '04:31:03']
+    chunks = aws.build_dataset_chunks(str(converted_directory), start='2018-09-22T04:30:40', end='2018-09-22T04:31:05')
+    pd.testing.assert_frame_equal(dataset, pd.concat(chunks))
+
+def test_build_dataset_npz_window(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    location, feature_names, column_lengths, columns = aws.mikrolab.read_columns(path, typed=True)
+    aws.mikrolab.write_npz_file(str(tmp_path), None, location, feature_names, columns)
+
+    dataset = aws.build_dataset(str(tmp_path), start='2018-09-22T04:31:00')
+    assert dataset.index.strftime('%H:%M:%S').tolist() == ['04:31:03', '04:31:07']
+
+def test_build_dataset_merge_tolerance(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    converted_directory = tmp_path / 'converted'
+    converted_directory.mkdir()
+    aws.mikrolab.convert_file(path, str(converted_directory))
+
+    expected = aws.build_dataset(str(converted_directory), merge_tolerance=30)
+    dataset = aws.build_dataset_from_export(path, merge_tolerance=30)
+    assert dataset.shape == (3, 8)
+    pd.testing.assert_frame_equal(dataset, expected)
+
+
+# test transfers against moto
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip('moto')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        aws._s3_client.cache_clear()
+        client = aws._s3_client()
+        for bucket in ['raw', 'converted', 'eda']:
+            client.create_bucket(Bucket=bucket)
+        yield client
+    aws._s3_client.cache_clear()
+
+def test_upload_charts(s3, tmp_path):
+    for index in range(12):
+        (tmp_path / 'chart{}.png'.format(index)).write_bytes(b'png' * index)
+    transfers = aws.upload_charts('eda', str(tmp_path))
+    assert sorted(transfer['key'] for transfer in transfers) == sorted(os.listdir(str(tmp_path)))
+    assert transfers[0]['throughput'] >= 0
+    keys = [item['Key'] for item in s3.list_objects_v2(Bucket='eda')['Contents']]
+    assert sorted(keys) == sorted(os.listdir(str(tmp_path)))
+    assert s3.get_object(Bucket='eda', Key='chart5.png')['Body'].read() == b'png' * 5
+
+def test_get_data_from_s3(s3, tmp_path):
+    s3.put_object(Bucket='raw', Key='influx-export.csv', Body=b'name: office\n')
+    target = tmp_path / 'influx-export.csv'
+    assert aws.get_data_from_s3('raw', 'influx-export.csv', str(target))
+    assert target.read_bytes() == b'name: office\n'
+
+def test_get_data_from_s3_missing_object(s3, tmp_path):
+    assert aws.get_data_from_s3('raw', 'missing.csv', str(tmp_path / 'missing.csv'))
+
+def test_download_files(s3, tmp_path):
+    for index in range(3):
+        s3.put_object(Bucket='raw', Key='export{}.csv'.format(index), Body=b'x' * index)
+    files = [('export{}.csv'.format(index), str(tmp_path / 'export{}.csv'.format(index))) for index in range(3)]
+    transfers = aws.download_files('raw', files)
+    assert [transfer['bytes'] for transfer in transfers] == [0, 1, 2]
+
+def test_large_upload_is_multipart(s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(aws, 'TRANSFER_CONFIG', aws.TransferConfig(multipart_threshold=5 * aws.MB,
+                                                                   multipart_chunksize=5 * aws.MB))
+    source = tmp_path / 'large.csv'
+    source.write_bytes(b'0123456789' * aws.MB)
+    aws.upload_files('converted', [(str(source), 'large.csv')])
+    assert s3.head_object(Bucket='converted', Key='large.csv')['ETag'].endswith('-2"')
+
+def test_convert_from_s3_same_as_convert_file(s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    with open(path, 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv', Body=fh.read())
+    key = aws.convert_from_s3('raw', 'influx-export.csv', 'converted')
+
+    expected = aws.mikrolab.convert_file(path, str(tmp_path))
+    assert key == os.path.basename(expected)
+    with open(expected, 'rb') as fh:
+        assert s3.get_object(Bucket='converted', Key=key)['Body'].read() == fh.read()
+    assert [item['Key'] for item in s3.list_objects_v2(Bucket='converted')['Contents']] == [key]
+
+def test_upload_converted_data_uploads_every_file(s3, tmp_path):
+    converted_directory = _convert_overlapping_exports(tmp_path)
+    aws.upload_converted_data('converted', converted_directory)
+    keys = [item['Key'] for item in s3.list_objects_v2(Bucket='converted')['Contents']]
+    assert keys == sorted(filename for filename in os.listdir(converted_directory) if not filename.startswith('.'))
+    assert keys.__len__() == 2
+
+def test_convert_from_s3_compressed(s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    with open(path, 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv.gz', Body=gzip.compress(fh.read()))
+    key = aws.convert_from_s3('raw', 'influx-export.csv.gz', 'converted', codec='gzip')
+
+    expected = aws.mikrolab.convert_file(path, str(tmp_path))
+    assert key == os.path.basename(expected) + '.gz'
+    with open(expected, 'rb') as fh:
+        assert gzip.decompress(s3.get_object(Bucket='converted', Key=key)['Body'].read()) == fh.read()
+
+def test_convert_from_s3_header_only(s3):
+    with open('./datasource/influx-export_testfile_header_only.csv', 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv', Body=fh.read())
+    with pytest.raises(aws.mikrolab.FileTooShort):
+        aws.convert_from_s3('raw', 'influx-export.csv', 'converted')
+
+def test_s3_multipart_writer_parts(s3):
+    with aws.S3MultipartWriter(s3, 'converted', 'large.csv', part_size=5 * aws.MB, max_pending=2) as writer:
+        for _ in range(12):
+            writer.write('x' * aws.MB)
+    assert writer.size == 12 * aws.MB
+    head = s3.head_object(Bucket='converted', Key='large.csv')
+    assert head['ContentLength'] == 12 * aws.MB
+    assert head['ETag'].endswith('-3"')
+
+def test_s3_multipart_writer_aborts_on_error(s3):
+    with pytest.raises(ValueError):
+        with aws.S3MultipartWriter(s3, 'converted', 'broken.csv') as writer:
+            writer.write('ID,time\n')
+            raise ValueError
+    assert 'Contents' not in s3.list_objects_v2(Bucket='converted')
+    assert 'Uploads' not in s3.list_multipart_uploads(Bucket='converted')
+
+
+# test cached stages
+
+def test_upload_files_skips_unchanged(s3, tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    source = tmp_path / 'chart.png'
+    source.write_bytes(b'png')
+    assert aws.upload_files('eda', [(str(source), 'chart.png')], cache_directory=cache_directory).__len__() == 1
+    s3.delete_object(Bucket='eda', Key='chart.png')
+    assert aws.upload_files('eda', [(str(source), 'chart.png')], cache_directory=cache_directory) == []
+    assert 'Contents' not in s3.list_objects_v2(Bucket='eda')
+
+    source.write_bytes(b'new png')
+    assert aws.upload_files('eda', [(str(source), 'chart.png')], cache_directory=cache_directory).__len__() == 1
+
+def test_convert_cached(s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    with open(path, 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv', Body=fh.read())
+    cache_directory = str(tmp_path / 'cache')
+    key = aws.mikrolab_cache.cache_key('convert', aws.source_etag('raw', 'influx-export.csv'))
+    (tmp_path / 'converted').mkdir()
+    arguments = (key, 'raw', 'influx-export.csv', str(tmp_path / 'download.csv'), str(tmp_path / 'converted'))
+    first, downloaded = aws.convert_cached(*arguments, cache_directory=cache_directory)
+    assert downloaded
+    os.remove(tmp_path / 'download.csv')
+    second, downloaded = aws.convert_cached(*arguments, cache_directory=cache_directory)
+    assert not downloaded
+    assert second == first
+    assert not (tmp_path / 'download.csv').exists()
+    # the cache holds a record of the output, no copy of it
+    assert sum(os.path.getsize(os.path.join(root, name)) for root, directories, names in os.walk(cache_directory)
+               for name in names) < 200
+
+def test_convert_cached_converts_again_when_output_changed(s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    with open(path, 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv', Body=fh.read())
+    (tmp_path / 'converted').mkdir()
+    arguments = ('key', 'raw', 'influx-export.csv', str(tmp_path / 'download.csv'), str(tmp_path / 'converted'))
+    first, downloaded = aws.convert_cached(*arguments, cache_directory=str(tmp_path / 'cache'))
+    os.remove(first)
+    second, downloaded = aws.convert_cached(*arguments, cache_directory=str(tmp_path / 'cache'))
+    assert downloaded
+    assert os.path.isfile(second)
+
+def test_convert_uploaded(s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    with open(path, 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv', Body=fh.read())
+    cache_directory = str(tmp_path / 'cache')
+    (tmp_path / 'converted').mkdir()
+    arguments = ('key', 'raw', 'influx-export.csv', str(tmp_path / 'download.csv'), str(tmp_path / 'converted'),
+                 'converted')
+    converted, transfer = aws.convert_uploaded(*arguments, cache_directory=cache_directory,
+                                               rollup_directory=str(tmp_path / 'rollups'))
+    key = os.path.basename(converted)
+    assert transfer['key'] == key
+    assert [item['Key'] for item in s3.list_objects_v2(Bucket='converted')['Contents']] == [key]
+    with open(converted, 'rb') as fh:
+        assert s3.get_object(Bucket='converted', Key=key)['Body'].read() == fh.read()
+    # the upload stage does not send it again, nor does a second run convert it again
+    assert aws.upload_file('converted', (converted, key), cache_directory) is None
+    assert aws.convert_uploaded(*arguments, cache_directory=cache_directory) == (converted, None)
+
+def test_convert_cached_updates_rollups(s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    with open(path, 'rb') as fh:
+        s3.put_object(Bucket='raw', Key='influx-export.csv', Body=fh.read())
+    rollups = str(tmp_path / 'rollups')
+    converted, downloaded = aws.convert_cached('key', 'raw', 'influx-export.csv', str(tmp_path / 'download.csv'),
+                                               str(tmp_path), cache_directory=str(tmp_path / 'cache'),
+                                               rollup_directory=rollups)
+    location = aws.mikrolab.parse_target_filename(converted)[0]
+    assert mikrolab_rollup.choose_resolution(rollups, location, 'h') == '1h'
+    # the hourly chart of the completed data is not answered by the rollups of the measured values
+    assert aws.chart_jobs('charts', ['co2_hum'])[0][2] == {}
+
+def test_render_charts_cached(tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    location, feature_names, column_lengths, dataset = aws.mikrolab.process_data(source_data.export_lines, as_frame=True)
+    jobs = [('desc_num_feature', str(tmp_path / 'co2_hum.png'), {'feature_name': 'co2_hum', 'dpi': 50})]
+
+    rendered = aws.render_charts_cached('key', str(tmp_path), jobs, lambda: dataset, cache_directory, workers=1)
+    assert rendered == [str(tmp_path / 'co2_hum.png')]
+    content = (tmp_path / 'co2_hum.png').read_bytes()
+    (tmp_path / 'co2_hum.png').unlink()
+    assert aws.render_charts_cached('key', str(tmp_path), jobs, lambda: 1 / 0, cache_directory) == []
+    assert (tmp_path / 'co2_hum.png').read_bytes() == content
+
+def test_chart_jobs():
+    jobs = aws.chart_jobs('charts', ['co2_hum', 'ph'])
+    assert [os.path.basename(filename) for chart, filename, kwargs in jobs] == \
+        ['eda_mikrolab_hourly_resampling.png', 'co2_hum.png', 'ph.png', 'eda_mikrolab_selective_kde.png']
+
+
+# test dry runs against a local directory
+
+@pytest.fixture
+def local_s3(tmp_path):
+    directory = tmp_path / 's3'
+    aws.use_local_s3(str(directory))
+    yield directory
+    aws.use_local_s3(None)
+
+def _put_export(local_s3, tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    (local_s3 / 'raw').mkdir(parents=True)
+    os.replace(path, local_s3 / 'raw' / 'influx-export.csv')
+
+def test_local_s3_transfers(local_s3, tmp_path):
+    (tmp_path / 'chart.png').write_bytes(b'png')
+    aws.upload_files('eda', [(str(tmp_path / 'chart.png'), 'charts/chart.png')])
+    assert (local_s3 / 'eda' / 'charts' / 'chart.png').read_bytes() == b'png'
+    aws.download_files('eda', [('charts/chart.png', str(tmp_path / 'download.png'))])
+    assert (tmp_path / 'download.png').read_bytes() == b'png'
+    assert aws.source_etag('eda', 'charts/chart.png') == aws.mikrolab_cache.file_digest(str(tmp_path / 'chart.png'))
+    assert aws.get_data_from_s3('eda', 'missing.png', str(tmp_path / 'missing.png'))
+    assert not (tmp_path / 'missing.png').exists()
+
+def test_convert_from_s3_local_s3(local_s3, tmp_path):
+    _put_export(local_s3, tmp_path)
+    target_file = aws.convert_from_s3('raw', 'influx-export.csv', 'converted')
+    expected = aws.mikrolab.convert_file(str(local_s3 / 'raw' / 'influx-export.csv'), str(tmp_path))
+    assert target_file == os.path.basename(expected)
+    assert (local_s3 / 'converted' / target_file).read_bytes() == open(expected, 'rb').read()
+    assert os.listdir(local_s3 / 'converted') == [target_file]
+    assert os.listdir(local_s3 / '.uploads') == []
+
+def test_s3_multipart_writer_local_s3_aborts_on_error(local_s3):
+    with pytest.raises(ValueError):
+        with aws.S3MultipartWriter(aws._s3_client(), 'converted', 'file.csv') as writer:
+            writer.write('ID,time\n')
+            raise ValueError
+    assert not (local_s3 / 'converted').exists()
+    assert os.listdir(local_s3 / '.uploads') == []
+
+def test_upload_file_skips_unchanged(local_s3, tmp_path):
+    (tmp_path / 'chart.png').write_bytes(b'png')
+    file = (str(tmp_path / 'chart.png'), 'chart.png')
+    assert aws.upload_file('eda', file, str(tmp_path / 'cache'))['key'] == 'chart.png'
+    assert aws.upload_file('eda', file, str(tmp_path / 'cache')) is None
+
+def test_iter_charts_cached_yields_cached_charts_first(tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    location, feature_names, column_lengths, dataset = aws.mikrolab.process_data(source_data.export_lines, as_frame=True)
+    jobs = [('desc_num_feature', str(tmp_path / (name + '.png')), {'feature_name': name, 'dpi': 50})
+            for name in ['co2_hum', 'ph']]
+    aws.render_charts_cached('key', str(tmp_path), jobs[1:], lambda: dataset, cache_directory, workers=1)
+    charts = list(aws.iter_charts_cached('key', str(tmp_path), jobs, lambda: dataset, cache_directory, workers=1))
+    assert charts == [(str(tmp_path / 'ph.png'), False), (str(tmp_path / 'co2_hum.png'), True)]
+
+def test_run_job_dry_run(local_s3, tmp_path):
+    _put_export(local_s3, tmp_path)
+    directories = [str(tmp_path / name) for name in ['data', 'converted', 'charts']]
+    for directory in directories:
+        os.mkdir(directory)
+    arguments = ('raw', 'influx-export.csv', 'converted', 'eda') + tuple(directories) + (['co2_hum'],)
+    settings = {'cache_directory': str(tmp_path / 'cache'), 'dataset_path': str(tmp_path / 'dataset.npz'), 'workers': 1}
+
+    transfers = aws.run_job(*arguments, **settings)
+    # no rollups unless asked for, the export is converted in one pass
+    assert not [name for name in os.listdir(directories[1]) if name.endswith('.checkpoint')]
+    charts = sorted(os.listdir(directories[2]))
+    assert charts == ['co2_hum.png', 'eda_mikrolab_hourly_resampling.png', 'eda_mikrolab_selective_kde.png']
+    assert sorted(os.listdir(local_s3 / 'eda')) == charts
+    assert os.listdir(local_s3 / 'converted') == aws.mikrolab_dataset.converted_files(directories[1])
+    assert sorted(transfer['key'] for transfer in transfers) == sorted(charts + os.listdir(local_s3 / 'converted'))
+    # nothing changed, nothing is converted, rendered or uploaded again
+    assert aws.run_job(*arguments, **settings) == []
+
+def test_run_job_without_cache(local_s3, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _put_export(local_s3, tmp_path)
+    directories = [str(tmp_path / name) for name in ['data', 'converted', 'charts']]
+    for directory in directories:
+        os.mkdir(directory)
+    arguments = ('raw', 'influx-export.csv', 'converted', 'eda') + tuple(directories) + (['co2_hum'],)
+    settings = {'cache_directory': None, 'dataset_path': str(tmp_path / 'dataset.npz'), 'workers': 1}
+    first = aws.run_job(*arguments, **settings)
+    # every stage runs again, every file is uploaded again
+    second = aws.run_job(*arguments, **settings)
+    assert sorted(transfer['key'] for transfer in second) == sorted(transfer['key'] for transfer in first)
+    assert first.__len__() == 4
+    assert not os.path.exists(aws.CACHE_DIRECTORY)
@@ -0,0 +1,21 @@
+import mikrolab_benchmark as benchmark
+
+
+def _report(seconds, peak_bytes):
+    return {'results': {'process_data': {'seconds': seconds, 'peak_bytes': peak_bytes}}}
+
+
+# test reports
+
+def test_compare_reports():
+    assert benchmark.compare_reports(_report(1.0, 100), _report(1.1, 100)) == []
+    assert benchmark.compare_reports(_report(1.0, 100), _report(1.5, 200)) == \
+        [('process_data', 'seconds', 1.0, 1.5), ('process_data', 'peak_bytes', 100, 200)]
+
+def test_compare_reports_new_stage():
+    assert benchmark.compare_reports({'results': {}}, _report(1.0, 100)) == []
+
+def test_measure():
+    result = benchmark._measure(2, lambda: bytearray(1 << 20), 10)
+    assert result['peak_bytes'] >= 1 << 20
+    assert result['rows_per_second'] == 10 / result['seconds']
@@ -0,0 +1,79 @@
+import mikrolab_cache as cache
+
+import os
+
+
+def _write(path, content):
+    with open(path, 'w') as fh:
+        fh.write(content)
+    return str(path)
+
+
+# test keys
+
+def test_cache_key_depends_on_all_parts():
+    assert cache.cache_key('convert', 'etag', {'prefix': None}) == cache.cache_key('convert', 'etag', {'prefix': None})
+    assert cache.cache_key('convert', 'etag', {'prefix': None}) != cache.cache_key('convert', 'etag', {'prefix': 'a'})
+    assert cache.cache_key('convert', 'etag') != cache.cache_key('convert', 'other')
+
+def test_file_digest(tmp_path):
+    assert cache.file_digest(_write(tmp_path / 'a', 'abc')) == cache.file_digest(_write(tmp_path / 'b', 'abc'))
+    assert cache.file_digest(_write(tmp_path / 'a', 'abc')) != cache.file_digest(_write(tmp_path / 'b', 'abd'))
+
+def test_file_stamp(tmp_path):
+    path = _write(tmp_path / 'a', 'abc')
+    os.utime(path, ns=(1, 1))
+    assert cache.file_stamp(path) == [3, 1]
+    assert cache.file_stamp(_write(path, 'abcd')) != [3, 1]
+
+
+# test store and fetch
+
+def test_fetch_missing(tmp_path):
+    assert cache.fetch(str(tmp_path / 'cache'), cache.cache_key('nothing'), str(tmp_path)) is None
+
+def test_store_and_fetch(tmp_path):
+    source = _write(tmp_path / 'chart.png', 'png')
+    target = tmp_path / 'target'
+    target.mkdir()
+    key = cache.cache_key('chart', 'etag')
+    cache.store(str(tmp_path / 'cache'), key, [source])
+    paths = cache.fetch(str(tmp_path / 'cache'), key, str(target))
+    assert paths == [str(target / 'chart.png')]
+    assert (target / 'chart.png').read_text() == 'png'
+
+def test_fetch_keeps_modification_time(tmp_path):
+    source = _write(tmp_path / 'chart.png', 'png')
+    os.utime(source, ns=(1000, 1000))
+    target = tmp_path / 'target'
+    target.mkdir()
+    cache.store(str(tmp_path / 'cache'), 'key', [source])
+    cache.fetch(str(tmp_path / 'cache'), 'key', str(target))
+    assert cache.file_stamp(str(target / 'chart.png')) == cache.file_stamp(source)
+
+def test_store_and_fetch_value(tmp_path):
+    assert cache.fetch_value(str(tmp_path / 'cache'), 'key') is None
+    cache.store_value(str(tmp_path / 'cache'), 'key', {'output': 'a.csv', 'stamp': [3, 1]})
+    assert cache.fetch_value(str(tmp_path / 'cache'), 'key') == {'output': 'a.csv', 'stamp': [3, 1]}
+
+def test_mark(tmp_path):
+    key = cache.cache_key('upload', 'bucket', 'digest')
+    assert not cache.is_marked(str(tmp_path), key)
+    cache.mark(str(tmp_path), key)
+    assert cache.is_marked(str(tmp_path), key)
+
+
+# test eviction
+
+def test_evict_least_recently_used(tmp_path):
+    directory = str(tmp_path / 'cache')
+    keys = [cache.cache_key(index) for index in range(3)]
+    for index, key in enumerate(keys):
+        entry = cache.store(directory, key, [_write(tmp_path / 'file', 'x' * 100)])
+        os.utime(entry, (index, index))
+    cache.fetch(directory, keys[0], str(tmp_path))
+
+    evicted = cache.evict(directory, 200)
+    assert evicted == [os.path.join(directory, keys[1][:2], keys[1])]
+    assert cache.is_marked(directory, keys[0])
+    assert cache.is_marked(directory, keys[2])
@@ -0,0 +1,111 @@
+import mikrolab_charts as charts
+import mikrolab_source_data as mk
+
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+def _dataset():
+    location, feature_names, column_lengths, data = mk.process_data(source_data.export_lines, as_frame=True)
+    return data.ffill().bfill()
+
+
+# test chart functions
+
+def test_desc_num_feature_closes_figure(tmp_path):
+    figures = plt.get_fignums()
+    filename = charts.desc_num_feature(_dataset(), 'co2_hum', str(tmp_path / 'co2_hum.png'), dpi=50)
+    assert os.path.getsize(filename) > 0
+    assert plt.get_fignums() == figures
+
+def test_hourly_resampling(tmp_path):
+    filename = charts.hourly_resampling(_dataset(), str(tmp_path / 'hourly.png'), dpi=50)
+    assert os.path.getsize(filename) > 0
+
+def test_hourly_resampling_from_rollups(tmp_path):
+    source = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    mk.convert_incremental(source, str(tmp_path), rollup_directory=str(tmp_path))
+    filename = charts.hourly_resampling(None, str(tmp_path / 'hourly.png'), dpi=50,
+                                        rollup_directory=str(tmp_path), location='office')
+    assert os.path.getsize(filename) > 0
+
+def test_hourly_sums_rollups_match_rows(tmp_path):
+    source = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    mk.convert_incremental(source, str(tmp_path), rollup_directory=str(tmp_path))
+    location, feature_names, column_lengths, data = mk.process_data(source_data.export_lines, as_frame=True)
+    data = data.tz_localize('UTC')
+    rows = charts.hourly_sums(data)
+    rollups = charts.hourly_sums(data, rollup_directory=str(tmp_path), location='office')
+    assert str(rollups.index.tz) == 'UTC'
+    pd.testing.assert_frame_equal(rollups, rows[list(rollups.columns)], check_names=False, check_freq=False)
+
+
+# test parallel rendering
+
+def test_render_charts(tmp_path):
+    jobs = [('desc_num_feature', str(tmp_path / (name + '.png')), {'feature_name': name, 'dpi': 50})
+            for name in ['co2_hum', 'co2_ppm', 'rpi_t']]
+    jobs.append(('correlation_chart', str(tmp_path / 'correlation.png'), {'dpi': 50}))
+    rendered = list(charts.render_charts(_dataset(), jobs, workers=2))
+    assert sorted(rendered) == sorted(filename for chart, filename, kwargs in jobs)
+    for filename in rendered:
+        assert os.path.getsize(filename) > 0
+
+def test_render_charts_timezone_index(tmp_path):
+    data = _dataset()
+    data.index = data.index.tz_localize('UTC')
+    jobs = [('hourly_resampling', str(tmp_path / 'hourly.png'), {'dpi': 50})]
+    assert list(charts.render_charts(data, jobs, workers=1)) == [str(tmp_path / 'hourly.png')]
+
+
+# test the binned correlation chart
+
+def _large_dataset(rows=200000):
+    rng = np.random.default_rng(1)
+    index = pd.date_range('2018-09-22', periods=rows, freq='15s', name='time')
+    data = pd.DataFrame({name: rng.normal(size=rows) for name in charts.CORRELATION_FEATURES}, index=index)
+    data['co2_ppm'] = data['co2_hum'] * 2 + rng.normal(scale=0.1, size=rows)
+    data.iloc[::7, 3] = np.nan
+    return data
+
+def test_correlation_chart_binned(tmp_path):
+    filename = charts.correlation_chart(_large_dataset(), str(tmp_path / 'kde.png'), dpi=50, mode='binned')
+    assert os.path.getsize(filename) > 0
+    assert plt.get_fignums() == []
+
+def test_correlation_chart_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        charts.correlation_chart(_dataset(), str(tmp_path / 'kde.png'), mode='nonsense')
+
+def test_binned_density_integrates_to_one():
+    values = np.random.default_rng(2).normal(size=10000)
+    centers, density = charts._binned_density(values, (-6.0, 6.0), 256)
+    assert abs(density.sum() * (centers[1] - centers[0]) - 1) < 0.01
+
+def test_binned_density_few_values():
+    centers, density = charts._binned_density(np.array([0.0, 0.1, 5.0]), (-0.5, 5.5), 256)
+    assert centers.shape == density.shape == (256,)
+
+def test_stratified_sample_covers_time_range():
+    data = _large_dataset()
+    sample = charts.stratified_sample(data, 1000)
+    assert abs(sample.__len__() - 1000) <= 100
+    assert sample.index.is_monotonic_increasing
+    assert sample.index.min() - data.index.min() < pd.Timedelta('1D')
+    assert data.index.max() - sample.index.max() < pd.Timedelta('1D')
+
+def test_stratified_sample_tz_aware_index():
+    data = _large_dataset()
+    sample = charts.stratified_sample(data.tz_localize('Europe/Berlin'), 1000)
+    assert str(sample.index.tz) == 'Europe/Berlin'
+    assert (sample.index.tz_localize(None) == charts.stratified_sample(data, 1000).index).all()
+
+def test_stratified_sample_small_dataset():
+    data = _dataset()
+    assert charts.stratified_sample(data, 1000) is data
@@ -0,0 +1,87 @@
+import mikrolab_cli as cli
+import mikrolab_metrics
+import mikrolab_synthetic
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ['pandas', 'matplotlib', 'seaborn', 'boto3']
+
+
+def _python(code, **kwargs):
+    result = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True,
+                            **kwargs)
+    return result.stdout.strip().splitlines()
+
+def _visible(directory):
+    return [filename for filename in sorted(os.listdir(directory)) if not filename.startswith('.')]
+
+def _import_seconds(module, repeat=3):
+    code = "import time\nstart = time.perf_counter()\nimport {}\nprint(time.perf_counter() - start)".format(module)
+    return min(float(_python(code)[-1]) for _ in range(repeat))
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    # main configures the metrics of the whole process, they go back to the path they had after the test
+    monkeypatch.setitem(mikrolab_metrics._settings, 'path', mikrolab_metrics._settings['path'])
+    monkeypatch.setenv('MIKROLAB_METRICS', str(tmp_path / 'metrics'))
+    return str(tmp_path / 'metrics')
+
+
+# test startup
+
+@pytest.mark.parametrize('module', ['mikrolab_cli', 'mikrolab_source_data'])
+def test_import_leaves_heavy_modules_out(module):
+    code = "import sys\nimport {}\nprint([name for name in {} if name in sys.modules])".format(module, HEAVY_MODULES)
+    assert _python(code) == ['[]']
+
+def test_import_time_below_pandas():
+    # pandas alone took most of the second the converter used to spend on imports
+    assert _import_seconds('mikrolab_source_data') < _import_seconds('pandas')
+
+def test_import_leaves_logging_alone():
+    code = "import logging\nimport mikrolab_source_data\nimport mikrolab_cli\nprint(logging.getLogger().handlers)"
+    assert _python(code) == ['[]']
+
+
+# test commands
+
+def test_convert_command(tmp_path):
+    export = mikrolab_synthetic.write_export(str(tmp_path / 'export.csv'), 1000)
+    (tmp_path / 'converted').mkdir()
+    arguments = ['--log-file', str(tmp_path / 'logs' / 'log'), 'convert', export, str(tmp_path / 'converted')]
+    code = "import sys\nimport mikrolab_cli\nmikrolab_cli.main({})\nprint([name for name in {} if name in sys.modules])"
+    output = _python(code.format(arguments, HEAVY_MODULES), env=dict(os.environ, MIKROLAB_METRICS=str(tmp_path / 'm')))
+    assert output[-1] == '[]'
+    assert output[0] == "Converted file: {}".format(str(tmp_path / 'converted' / _visible(tmp_path / 'converted')[0]))
+    assert (tmp_path / 'logs' / 'log').exists()
+
+def test_eda_command(tmp_path, metrics, capsys):
+    converted = tmp_path / 'converted'
+    converted.mkdir()
+    cli.main(['convert', mikrolab_synthetic.write_export(str(tmp_path / 'export.csv'), 1000), str(converted)])
+    charts = tmp_path / 'charts'
+    assert cli.main(['--log-file', str(tmp_path / 'log'), 'eda', str(converted), '--dataset',
+                     str(tmp_path / 'dataset.npz'), '--charts-directory', str(charts), '--attributes', 'co2_hum',
+                     '--workers', '1']) == 0
+    assert sorted(os.listdir(charts)) == ['co2_hum.png', 'eda_mikrolab_selective_kde.png']
+    assert "Shape of the dataset: (1000, 8)" in capsys.readouterr().out
+
+def test_sync_command_dry_run(tmp_path, metrics, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for directory in ['aws-datasource', 'aws-converted', 'aws-diagrams', 's3/ie-mikrolab-raw-data']:
+        os.makedirs(directory)
+    mikrolab_synthetic.write_export('s3/ie-mikrolab-raw-data/influx-export.csv', 1000)
+    assert cli.main(['--log-file', 'log', 'sync', '--dry-run', 's3', '--attributes', 'ph', '--workers', '1']) == 0
+    assert sorted(os.listdir('s3/ie-mikrolab-eda')) == \
+        ['eda_mikrolab_hourly_resampling.png', 'eda_mikrolab_selective_kde.png', 'ph.png']
+    assert os.listdir('s3/ie-mikrolab-converted-data') == _visible('aws-converted')
+
+def test_unknown_command():
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(['upload'])
@@ -0,0 +1,105 @@
+import mikrolab_codec as codec
+import mikrolab_source_data as mk
+
+import gzip
+import lzma
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+# test codec detection
+
+def test_detect_codec_by_extension(tmp_path):
+    path = tmp_path / 'export.csv.xz'
+    path.write_bytes(b'')
+    assert codec.detect_codec(str(path)) == 'xz'
+
+def test_detect_codec_by_magic_bytes(tmp_path):
+    path = tmp_path / 'export.csv'
+    path.write_bytes(gzip.compress(b'name: office\n'))
+    assert codec.detect_codec(str(path)) == 'gzip'
+
+def test_detect_codec_plain(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    assert codec.detect_codec(path) is None
+
+def test_strip_extension():
+    assert codec.strip_extension('test_office.csv.gz') == 'test_office.csv'
+    assert codec.strip_extension('test_office.csv') == 'test_office.csv'
+
+def test_open_output_unknown_codec(tmp_path):
+    with pytest.raises(ValueError):
+        codec.open_output(str(tmp_path / 'file'), codec='rar')
+
+
+# test round trips
+
+@pytest.mark.parametrize('name', ['gzip', 'xz'])
+def test_round_trip_path(tmp_path, name):
+    path = str(tmp_path / ('file.csv' + codec.extension(name)))
+    with codec.open_output(path, codec=name) as fh:
+        fh.write('ID,time\n1,2018-09-22T04:30:36Z\n')
+    with codec.open_input(path) as fh:
+        assert fh.read() == 'ID,time\n1,2018-09-22T04:30:36Z\n'
+
+@pytest.mark.parametrize('name', ['gzip', 'xz'])
+def test_round_trip_file_object(tmp_path, name):
+    path = tmp_path / 'file'
+    with open(path, 'wb') as raw:
+        out = codec.open_output(raw, codec=name, level=1)
+        out.write('ID,time\n')
+        out.close()
+        assert not raw.closed
+    with open(path, 'rb') as raw:
+        assert codec.open_input(raw, codec=name).read() == 'ID,time\n'
+
+def test_round_trip_zstd(tmp_path):
+    pytest.importorskip('zstandard')
+    path = str(tmp_path / 'file.csv.zst')
+    with codec.open_output(path, codec='zstd') as fh:
+        fh.write('ID,time\n')
+    assert codec.detect_codec(path) == 'zstd'
+    with codec.open_input(path) as fh:
+        assert fh.read() == 'ID,time\n'
+
+
+# test compressed exports and csv files
+
+def _write_compressed_export(path, compress):
+    with open(path, 'wb') as fh:
+        fh.write(compress(''.join(line + '\n' for line in source_data.export_lines).encode()))
+    return str(path)
+
+def test_read_raw_file_gzip_same_as_plain(tmp_path):
+    plain = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    path = _write_compressed_export(tmp_path / 'export.csv.gz', gzip.compress)
+    assert mk.read_raw_file(path) == mk.read_raw_file(plain)
+
+def test_read_columns_xz_same_as_plain(tmp_path):
+    plain = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    path = _write_compressed_export(tmp_path / 'export.csv.xz', lzma.compress)
+    columns = mk.read_columns(path, engine='numpy')[3]
+    expected = mk.read_columns(plain, engine='numpy')[3]
+    for name in expected:
+        np.testing.assert_array_equal(columns[name], expected[name])
+
+def test_convert_file_gzip_output(tmp_path):
+    path = _write_compressed_export(tmp_path / 'export.csv.gz', gzip.compress)
+    plain = mk.convert_file(path, str(tmp_path), 'plain')
+    file = mk.convert_file(path, str(tmp_path), 'test', codec='gzip')
+    assert file.endswith('.csv.gz')
+    assert mk.parse_target_filename(file, 'test')[0] == 'office'
+    pd.testing.assert_frame_equal(pd.read_csv(file), pd.read_csv(plain))
+
+def test_convert_file_gzip_output_is_deterministic(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    (tmp_path / 'first').mkdir()
+    (tmp_path / 'second').mkdir()
+    first = mk.convert_file(path, str(tmp_path / 'first'), codec='gzip')
+    second = mk.convert_file(path, str(tmp_path / 'second'), codec='gzip')
+    with open(first, 'rb') as fh, open(second, 'rb') as other:
+        assert fh.read() == other.read()
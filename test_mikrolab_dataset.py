@@ -0,0 +1,175 @@
+import mikrolab_dataset as dataset
+import mikrolab_source_data as mk
+import mikrolab_stats
+import mikrolab_synthetic
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+def _complete(data):
+    return data.replace(to_replace=0, value=np.nan).ffill().bfill()
+
+def _frame(rows=1000, seed=0):
+    random = np.random.default_rng(seed)
+    values = random.normal(10.0, 1.0, (rows, 3))
+    values[random.random((rows, 3)) < 0.3] = np.nan
+    values[random.random((rows, 3)) < 0.1] = 0.0
+    # long gaps at the start, the last one spans several chunks
+    values[:5, 0] = np.nan
+    values[:300, 2] = np.nan
+    index = pd.date_range('2018-09-22', periods=rows, freq='15s', name='time').as_unit('ns')
+    return pd.DataFrame(values, index=index, columns=['a', 'b', 'c'])
+
+def _chunks(data, size):
+    return (data.iloc[first:first + size] for first in range(0, data.__len__(), size))
+
+def _convert(directory, lines, file_prefix=None):
+    path = source_data._write_export(directory.parent / (directory.name + '.csv'), lines)
+    return mk.convert_file(path, str(directory), file_prefix)
+
+def _converted_directory(tmp_path, rows=5000):
+    directory = tmp_path / 'converted'
+    directory.mkdir()
+    lines = list(mikrolab_synthetic.generate_lines(rows, blank_probability=0.2))
+    # two exports overlapping by a thousand rows
+    _convert(directory, lines[:3 + rows // 2 + 1000], 'first')
+    _convert(directory, lines[:3] + lines[3 + rows // 2:], 'second')
+    whole = tmp_path / 'whole'
+    whole.mkdir()
+    _convert(whole, lines)
+    return str(directory), str(whole)
+
+def _read_whole(directory):
+    data = pd.concat([pd.read_csv(os.path.join(directory, filename))
+                      for filename in dataset.converted_files(directory)])
+    data = data.drop(['ID'], axis=1)
+    data.time = pd.to_datetime(data.time)
+    return data.set_index('time')
+
+
+# test streaming gap filling
+
+@pytest.mark.parametrize('size', [1, 7, 100, 1000])
+def test_complete_chunks_same_as_whole_frame(size):
+    data = _frame()
+    completed = pd.concat(dataset.complete_chunks(_chunks(data, size)))
+    pd.testing.assert_frame_equal(completed, _complete(data))
+
+def test_complete_chunks_holds_back_only_leading_gaps():
+    data = _frame()
+    sizes = [chunk.__len__() for chunk in dataset.complete_chunks(_chunks(data, 100))]
+    assert sizes == [400] + [100] * 6
+
+def test_complete_chunks_lookahead_is_bounded():
+    data = _frame()
+    data['c'] = np.nan
+    chunks = list(dataset.complete_chunks(_chunks(data, 100), lookahead=200))
+    assert chunks[0].__len__() == 200
+    completed = pd.concat(chunks)
+    pd.testing.assert_frame_equal(completed, _complete(data))
+    assert completed['c'].isna().all()
+
+def test_complete_chunks_empty():
+    assert list(dataset.complete_chunks(iter([]))) == []
+
+
+# test reading converted files
+
+def test_read_chunks_drops_overlap(tmp_path):
+    directory, whole = _converted_directory(tmp_path)
+    chunks = list(dataset.read_chunks(directory, chunk_rows=999))
+    assert max(chunk.__len__() for chunk in chunks) <= 999
+    pd.testing.assert_frame_equal(pd.concat(chunks), _read_whole(whole))
+
+def _interleaved_directory(tmp_path, rows=3000):
+    directory = tmp_path / 'converted'
+    directory.mkdir()
+    lines = list(mikrolab_synthetic.generate_lines(rows, blank_probability=0.2))
+    # every other row in each export, a few rows in both of them
+    _convert(directory, lines[:3] + lines[3::2], 'first')
+    _convert(directory, lines[:3] + sorted(lines[4::2] + lines[103:113:2], key=lines.index), 'second')
+    whole = tmp_path / 'whole'
+    whole.mkdir()
+    _convert(whole, lines)
+    return str(directory), str(whole)
+
+def test_read_chunks_keeps_interleaved_rows(tmp_path):
+    directory, whole = _interleaved_directory(tmp_path)
+    chunks = list(dataset.read_chunks(directory, chunk_rows=256))
+    assert max(chunk.__len__() for chunk in chunks) <= 256
+    pd.testing.assert_frame_equal(pd.concat(chunks), _read_whole(whole))
+
+def test_build_chunks_same_as_whole_frame(tmp_path):
+    directory, whole = _converted_directory(tmp_path)
+    completed = pd.concat(dataset.build_chunks(directory, chunk_rows=512))
+    pd.testing.assert_frame_equal(completed, _complete(_read_whole(whole)))
+
+def test_read_chunks_window(tmp_path):
+    directory, whole = _converted_directory(tmp_path)
+    data = _read_whole(whole)
+    start, end = data.index[1200], data.index[3700]
+    chunks = dataset.read_chunks(directory, chunk_rows=256, start=str(start.tz_localize(None)), end=end)
+    pd.testing.assert_frame_equal(pd.concat(chunks), data.iloc[1200:3700])
+
+def test_read_chunks_npz(tmp_path):
+    lines = list(mikrolab_synthetic.generate_lines(3000, blank_probability=0.2))
+    for file_prefix, part in [('first', lines[:2003]), ('second', lines[:3] + lines[1003:])]:
+        location, feature_names, column_lengths, columns = mk.process_data(part, typed=True)
+        mk.write_npz_file(str(tmp_path), file_prefix, location, feature_names, columns)
+    location, feature_names, column_lengths, expected = mk.process_data(lines, as_frame=True)
+    chunks = list(dataset.read_chunks(str(tmp_path), chunk_rows=700))
+    assert max(chunk.__len__() for chunk in chunks) <= 700
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected.tz_localize('UTC'))
+
+def test_read_chunks_skips_files_without_time(tmp_path):
+    directory, whole = _converted_directory(tmp_path)
+    with open(os.path.join(directory, 'minimal.csv'), 'w') as fh:
+        fh.write('co2_hum,co2_ppm\n78.4,385.9\n')
+    pd.testing.assert_frame_equal(pd.concat(dataset.read_chunks(directory)), _read_whole(whole))
+
+
+# test persisting and resampling
+
+def test_write_dataset_round_trip(tmp_path):
+    data = _complete(_frame())
+    stats = {}
+    path = dataset.write_dataset(_chunks(data, 300), str(tmp_path / 'dataset.npz'), stats)
+    written = dataset.read_dataset(path)
+    pd.testing.assert_frame_equal(written, data, check_freq=False)
+    expected = mikrolab_stats.frame_stats(data)
+    for name in data.columns:
+        assert stats[name]['count'] == expected[name]['count']
+        assert stats[name]['mean'] == pytest.approx(expected[name]['mean'])
+
+def test_write_dataset_timezone(tmp_path):
+    data = _complete(_frame()).tz_localize('UTC')
+    written = dataset.read_dataset(dataset.write_dataset(_chunks(data, 300), str(tmp_path / 'dataset.npz')))
+    pd.testing.assert_frame_equal(written, data.tz_localize(None), check_freq=False)
+
+def test_write_dataset_no_data_points(tmp_path):
+    with pytest.raises(mk.NoDataPoints):
+        dataset.write_dataset(iter([]), str(tmp_path / 'dataset.npz'))
+    assert list(tmp_path.iterdir()) == []
+
+def test_write_dataset_error_leaves_no_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset.shutil, 'copyfileobj', lambda *arguments: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        dataset.write_dataset(_chunks(_complete(_frame()), 300), str(tmp_path / 'dataset.npz'))
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.parametrize('how', ['sum', 'mean'])
+def test_resample_chunks_same_as_whole_frame(how):
+    data = _frame(5000)
+    data = data.drop(data.index[1000:2000])
+    resampled = dataset.resample_chunks(_chunks(data, 333), 'h', how)
+    pd.testing.assert_frame_equal(resampled, getattr(data.resample('h'), how)(), check_freq=False)
+
+def test_resample_chunks_unknown_aggregation():
+    with pytest.raises(ValueError):
+        dataset.resample_chunks(iter([]), 'h', 'median')
@@ -0,0 +1,124 @@
+import mikrolab_index as index
+import mikrolab_source_data as mk
+import mikrolab_synthetic as synthetic
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+def _convert(tmp_path, rows, **kwargs):
+    source = synthetic.write_export(str(tmp_path / 'export.csv'), rows, **kwargs)
+    return mk.convert_file(source, str(tmp_path))
+
+def _read(path):
+    data = pd.read_csv(path)
+    data.time = pd.to_datetime(data.time)
+    return data
+
+
+# test the index
+
+def test_write_index_offsets(tmp_path, monkeypatch):
+    path = _convert(tmp_path, 1000)
+    monkeypatch.setattr(index, 'SCAN_CHUNK', 1000)
+    written = index.write_index(path, stride=64)
+    assert written['rows'] == 1000 and written['size'] == os.path.getsize(path)
+    assert written['row'].tolist() == list(range(0, 1000, 64))
+    with open(path, 'rb') as fh:
+        for row, offset, time in zip(written['row'], written['offset'], written['time']):
+            fh.seek(offset)
+            line = fh.readline().split(b',')
+            assert int(line[0]) == row + 1
+            assert np.datetime64(line[1].decode().rstrip('Z'), 'ns').astype(np.int64) == time
+
+def test_writer_emits_index(tmp_path):
+    path = _convert(tmp_path, 100)
+    assert index.read_index(path)['rows'] == 100
+
+def test_convert_incremental_extends_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(index, 'INDEX_STRIDE', 2)
+    source = tmp_path / 'export.csv'
+    source_data._write_export(source, source_data.export_lines[:5])
+    first = mk.convert_incremental(str(source), str(tmp_path))
+    with open(str(source), 'a') as fh:
+        fh.write('\n'.join(source_data.export_lines[5:]) + '\n')
+    second = mk.convert_incremental(str(source), str(tmp_path))
+    extended = index.read_index(second)
+    rebuilt = index.write_index(second, stride=extended['stride'])
+    for name in ['row', 'offset', 'time', 'rows', 'size', 'last_time']:
+        assert np.array_equal(extended[name], rebuilt[name])
+    assert not os.path.exists(index.index_path(first))
+
+
+# test window loads
+
+@pytest.mark.parametrize('start, end', [
+    ('2018-09-22T12:00', '2018-09-22T13:00'),
+    (None, '2018-09-22T06:00'),
+    ('2018-09-22T20:00', None),
+    ('2018-09-22T06:00+02:00', '2018-09-22T07:00+02:00'),
+    ('2019-01-01', None),
+])
+def test_read_window(tmp_path, start, end):
+    path = _convert(tmp_path, 5000)
+    index.write_index(path, stride=100)
+    window = index.read_window(path, start, end)
+    full = _read(path)
+    keep = np.ones(full.__len__(), dtype=bool)
+    if start is not None:
+        keep &= full.time >= index._timestamp(start)
+    if end is not None:
+        keep &= full.time < index._timestamp(end)
+    assert window.ID.tolist() == full.ID[keep].tolist()
+
+def test_read_window_rows_sharing_start_time(tmp_path):
+    path = str(tmp_path / 'converted.csv')
+    times = ['04:30:00', '04:30:01', '04:30:02', '04:30:02', '04:30:02', '04:30:03']
+    with open(path, 'w') as fh:
+        fh.write('ID,time,ph\n')
+        for row, time in enumerate(times, 1):
+            fh.write('{},2018-09-22T{}.000000000Z,{}\n'.format(row, time, row))
+    index.write_index(path, stride=2)
+    assert index.read_window(path, '2018-09-22T04:30:02').ID.tolist() == [3, 4, 5, 6]
+
+def test_read_directory_window_across_files(tmp_path):
+    source = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines[:5])
+    later = source_data._write_export(tmp_path / 'later.csv', source_data.export_lines[:3] + source_data.export_lines[5:])
+    converted = tmp_path / 'converted'
+    converted.mkdir()
+    mk.convert_file(source, str(converted))
+    mk.convert_file(later, str(converted))
+    window = index.read_directory_window(str(converted), '2018-09-22T04:30:40', '2018-09-22T04:31:05')
+    assert window.time.dt.strftime('%H:%M:%S').tolist() == ['04:30:52', '04:31:03']
+    with pytest.raises(FileNotFoundError):
+        index.read_directory_window(str(converted), '2019-01-01')
+
+@pytest.mark.parametrize('codec', ['gzip', 'xz'])
+def test_read_directory_window_compressed(tmp_path, codec):
+    source = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    for directory, file_codec in [('plain', None), ('compressed', codec)]:
+        (tmp_path / directory).mkdir()
+        mk.convert_file(source, str(tmp_path / directory), codec=file_codec)
+    for start, end in [('2018-09-22T04:30:40', '2018-09-22T04:31:05'), (None, '2018-09-22T04:30:40'),
+                       ('2018-09-22T04:31:00', None)]:
+        window = index.read_directory_window(str(tmp_path / 'compressed'), start, end)
+        pd.testing.assert_frame_equal(window, index.read_directory_window(str(tmp_path / 'plain'), start, end))
+    with pytest.raises(FileNotFoundError):
+        index.read_directory_window(str(tmp_path / 'compressed'), '2019-01-01')
+
+def test_read_window_rebuilds_stale_index(tmp_path):
+    path = _convert(tmp_path, 100)
+    with open(path, 'a') as fh:
+        fh.write('101,2018-09-23T00:00:00.000000000Z,1,2,3,4,5,,6,7\n')
+    assert index.read_window(path, '2018-09-23').ID.tolist() == [101]
+
+def test_slice_columns():
+    location, feature_names, column_lengths, columns = mk.process_data(source_data.export_lines, typed=True)
+    window = index.slice_columns(feature_names, columns, '2018-09-22T04:30:40', '2018-09-22T04:31:07')
+    assert window['co2_ppm'].__len__() == 2 and window['co2_ppm'][0] == 383.2767333984375
+    assert window['rpi_t'][1] == 47.24
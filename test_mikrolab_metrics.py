@@ -0,0 +1,67 @@
+import mikrolab_metrics as metrics
+import mikrolab_source_data as mk
+
+import json
+
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKROLAB_METRICS', raising=False)
+    monkeypatch.setitem(metrics._settings, 'path', None)
+    path = metrics.configure(str(tmp_path / 'metrics'))
+    yield path
+
+
+# test stages
+
+def test_stage_records_timings(metrics_file):
+    with metrics.stage('parse', source='test') as record:
+        record.update(rows=10, bytes=100)
+    with open(metrics_file) as fh:
+        written = json.loads(fh.readline())
+    assert written['stage'] == 'parse' and written['source'] == 'test' and written['parent'] is None
+    assert written['rows'] == 10 and written['bytes'] == 100
+    assert written['wall_seconds'] >= 0 and written['cpu_seconds'] >= 0
+    assert written['rows_per_second'] == pytest.approx(10 / written['wall_seconds'])
+    assert written['peak_rss_bytes'] > 0
+
+def test_stage_nesting_and_failure(metrics_file):
+    with pytest.raises(ValueError):
+        with metrics.stage('outer'):
+            with metrics.stage('inner'):
+                raise ValueError
+    inner, outer = metrics.records()
+    assert inner['parent'] == 'outer' and inner['failed'] and outer['failed']
+
+def test_environment_overrides_path(tmp_path, monkeypatch):
+    monkeypatch.setitem(metrics._settings, 'path', None)
+    monkeypatch.setenv('MIKROLAB_METRICS', str(tmp_path / 'environment'))
+    assert metrics.configure(str(tmp_path / 'script')) == str(tmp_path / 'environment')
+
+
+# test pipeline stages
+
+def test_convert_file_stages(metrics_file, tmp_path):
+    source = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    mk.convert_file(source, str(tmp_path))
+    stages = {record['stage']: record for record in metrics.records()}
+    assert stages['write_csv']['parent'] == 'convert'
+    assert stages['write_csv']['rows'] == 4
+    assert stages['validate_header']['parent'] == 'convert'
+
+def test_summarize():
+    summary = metrics.summarize([
+        {'stage': 'parse', 'wall_seconds': 1.0, 'cpu_seconds': 0.5, 'rows': 10, 'peak_rss_bytes': 5},
+        {'stage': 'parse', 'wall_seconds': 1.0, 'cpu_seconds': 0.5, 'rows': 30, 'peak_rss_bytes': 7},
+    ])
+    assert summary['parse']['calls'] == 2
+    assert summary['parse']['rows_per_second'] == 20.0
+    assert summary['parse']['peak_rss_bytes'] == 7
+
+def test_print_summary(capsys):
+    metrics.print_summary([{'stage': 'read', 'wall_seconds': 2.0, 'cpu_seconds': 1.0, 'rows': 4, 'bytes': 2 ** 20}])
+    assert 'read' in capsys.readouterr().out
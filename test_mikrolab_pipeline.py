@@ -0,0 +1,91 @@
+import mikrolab_pipeline as pipeline
+
+import itertools
+import threading
+import time
+
+import pytest
+
+
+def _twice(item):
+    yield item
+    yield item
+
+
+# test results
+
+def test_run_stages_keeps_order_with_one_worker():
+    results = pipeline.run_stages(range(20), [('twice', _twice, 1), ('square', lambda item: [item * item], 1)])
+    assert results == [item * item for item in range(20) for _ in range(2)]
+
+def test_run_stages_workers():
+    results = pipeline.run_stages(range(100), [('add', lambda item: [item + 1], 4), ('twice', _twice, 3)],
+                                  queue_size=2)
+    assert sorted(results) == sorted(list(range(1, 101)) * 2)
+
+def test_run_stages_filters():
+    assert pipeline.run_stages(range(10), [('even', lambda item: [item] if item % 2 == 0 else [], 2)]).__len__() == 5
+
+def test_run_stages_without_stages():
+    assert pipeline.run_stages([1, 2], []) == [1, 2]
+
+def test_run_stages_empty():
+    assert pipeline.run_stages([], [('twice', _twice, 2)]) == []
+
+
+# test overlap and backpressure
+
+def test_run_stages_overlap():
+    # the first stage waits for the second one to have the first item
+    started = threading.Event()
+
+    def first(item):
+        if item == 1:
+            assert started.wait(5)
+        yield item
+
+    def second(item):
+        started.set()
+        yield item
+
+    assert pipeline.run_stages(range(3), [('first', first, 1), ('second', second, 1)]) == [0, 1, 2]
+
+def test_run_stages_backpressure():
+    counts = {'produced': 0, 'consumed': 0, 'ahead': 0}
+
+    def produce():
+        for item in range(50):
+            counts['produced'] += 1
+            yield item
+
+    def consume(item):
+        time.sleep(0.002)
+        counts['consumed'] += 1
+        counts['ahead'] = max(counts['ahead'], counts['produced'] - counts['consumed'])
+        yield item
+
+    assert pipeline.run_stages(produce(), [('consume', consume, 1)], queue_size=3).__len__() == 50
+    # the queue, the item the feeder holds and the one being consumed
+    assert counts['ahead'] <= 3 + 2
+
+
+# test errors
+
+def test_run_stages_error_stops_every_stage():
+    def fail(item):
+        if item == 3:
+            raise ValueError(item)
+        yield item
+
+    threads = threading.active_count()
+    with pytest.raises(ValueError):
+        pipeline.run_stages(itertools.count(), [('fail', fail, 2), ('twice', _twice, 1)], queue_size=2)
+    assert threading.active_count() == threads
+
+def test_run_stages_error_in_items():
+    def items():
+        yield 1
+        raise KeyError('broken')
+
+    with pytest.raises(KeyError):
+        pipeline.run_stages(items(), [('twice', _twice, 1)])
@@ -0,0 +1,87 @@
+import mikrolab_rollup as rollup
+import mikrolab_source_data as mk
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+def _columns(lines=source_data.export_lines):
+    location, feature_names, column_lengths, columns = mk.process_data(lines, typed=True)
+    return feature_names, columns
+
+
+# test aggregation
+
+def test_build_rollups_minute_buckets():
+    feature_names, columns = _columns()
+    frame = rollup.rollup_frame(rollup.build_rollups(feature_names, columns)['1min'])
+    assert list(frame.index) == [pd.Timestamp('2018-09-22T04:30'), pd.Timestamp('2018-09-22T04:31')]
+    assert list(frame['co2_hum_count']) == [2, 1]
+    assert frame['ec_max'].iloc[0] == pytest.approx(0.6604)
+    assert frame['ec_min'].iloc[0] == pytest.approx(0.6602)
+    assert frame['co2_hum_mean'].iloc[0] == pytest.approx((78.3966064453125 + 78.36761474609375) / 2)
+    assert list(frame['rpi_t_count']) == [0, 1]
+    assert np.isnan(frame['rpi_t_min'].iloc[0]) and frame['rpi_t_max'].iloc[1] == 47.24
+
+def test_update_rollups_same_as_build_rollups():
+    feature_names, columns = _columns()
+    tables = {}
+    for start, stop in [(0, 1), (1, 3), (3, 4)]:
+        rollup.update_rollups(tables, feature_names, {name: columns[name][start:stop] for name in feature_names})
+    expected = rollup.build_rollups(feature_names, columns)
+    for resolution in rollup.RESOLUTIONS:
+        pd.testing.assert_frame_equal(rollup.rollup_frame(tables[resolution]),
+                                      rollup.rollup_frame(expected[resolution]))
+
+def test_tee_rollups_passes_data_points_through():
+    location, feature_names, column_lengths, data_points = mk.process_data(source_data.export_lines)
+    tables = {}
+    assert list(rollup.tee_rollups(iter(data_points), feature_names, tables, batch_size=3)) == data_points
+    assert tables['1h']['count'][0].tolist() == [3, 3, 3, 3, 3, 1, 3, 3]
+
+
+# test persisted rollups
+
+def test_convert_incremental_updates_rollups(tmp_path):
+    source = tmp_path / 'export.csv'
+    rollups = tmp_path / 'rollups'
+    rollups.mkdir()
+    source_data._write_export(source, source_data.export_lines[:5])
+    mk.convert_incremental(str(source), str(tmp_path), rollup_directory=str(rollups))
+    assert rollup.read_rollup(str(rollups), 'office', '1min')['co2_hum_count'].tolist() == [2]
+
+    with open(str(source), 'a') as fh:
+        fh.write('\n'.join(source_data.export_lines[5:]) + '\n')
+    mk.convert_incremental(str(source), str(tmp_path), rollup_directory=str(rollups))
+    feature_names, columns = _columns()
+    pd.testing.assert_frame_equal(rollup.read_rollup(str(rollups), 'office', '1min'),
+                                  rollup.rollup_frame(rollup.build_rollups(feature_names, columns)['1min']))
+
+def test_convert_incremental_rebuilds_stale_rollups(tmp_path):
+    source = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    rollups = str(tmp_path / 'rollups')
+    os.mkdir(rollups)
+    mk.convert_incremental(source, str(tmp_path))
+    # rollups missing for a valid checkpoint, the export is converted again
+    mk.convert_incremental(source, str(tmp_path), rollup_directory=rollups)
+    assert rollup.read_rollup(rollups, 'office', '1d')['tsl_count'].tolist() == [3]
+
+def test_resample_uses_coarsest_rollup(tmp_path):
+    feature_names, columns = _columns()
+    rollup.save_rollups(str(tmp_path), 'office', rollup.build_rollups(feature_names, columns))
+    assert rollup.choose_resolution(str(tmp_path), 'office', 'h') == '1h'
+    assert rollup.choose_resolution(str(tmp_path), 'office', '2min') == '1min'
+    assert rollup.choose_resolution(str(tmp_path), 'office', '30s') is None
+    hourly = rollup.resample(str(tmp_path), 'office', 'h')
+    frame = mk.to_frame(feature_names, columns)
+    pd.testing.assert_frame_equal(hourly, frame.resample('h').sum(), check_names=False, check_freq=False)
+    assert rollup.resample(str(tmp_path), 'office', '2min', how='max')['ec'].iloc[0] == pytest.approx(0.6604)
+
+def test_resample_without_rollups(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        rollup.resample(str(tmp_path), 'office', 'h')
@@ -1,6 +1,9 @@
 import mikrolab_source_data as mk
 
+import numpy as np
 import pytest
+import concurrent.futures
+import io
 import os
 
 
@@ -185,6 +188,549 @@ def test_write_csv_file_happy():
     file = mk.write_csv_file(target_directory, file_prefix, sd_location, sd_feature_names, sd_dataset)
     assert file == './target_directory/test_2018-10-02T10:25:03_office_2018-10-02T10:30:03.csv'
     os.remove(file)
+    mk.mikrolab_index.remove_index(file)
 
 
 
+
+# streaming
+
+def _write_export(path, lines):
+    with open(path, 'w') as fh:
+        for line in lines:
+            fh.write(line + '\n')
+    return str(path)
+
+export_lines = [
+    "name: office",
+    "time                           co2_hum           co2_ppm            co2_tmp            ec                 ph    rpi_t rtd_t  tsl",
+    "----                           -------           -------            -------            --                 --    ----- -----  ---",
+    "2018-09-22T04:30:36.258478152Z 78.3966064453125  385.881591796875   12.946136474609375 0.6602             6.429       12.843 0",
+    "2018-09-22T04:30:52.140187073Z 78.36761474609375 383.2767333984375  12.946136474609375 0.6604             6.43        12.842 0",
+    "2018-09-22T04:31:03.339845297Z                                                                                  47.24",
+    "2018-09-22T04:31:07.972184149Z 78.387451171875   380.22943115234375 12.903411865234375 0.6602             6.43        12.841 0",
+    "",
+]
+
+def test_read_raw_stream_same_lines_as_read_raw_file(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    streamed = list(mk.read_raw_stream(path))
+    assert [line.strip() for line in mk.read_raw_file(path)] == streamed
+
+def test_read_raw_stream_FileTooShort():
+    path = './datasource/influx-export_testfile_header_only.csv'
+    with pytest.raises(mk.FileTooShort):
+        mk.read_raw_stream(path, minimal_length=4)
+
+def test_read_raw_lines():
+    lines = mk.read_raw_lines(line + '\r\n' for line in export_lines)
+    assert list(lines) == [line.strip() for line in export_lines]
+
+def test_read_raw_lines_FileTooShort():
+    with pytest.raises(mk.FileTooShort):
+        mk.read_raw_lines(export_lines[:3], minimal_length=4)
+
+def test_process_stream_same_data_points_as_process_data(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    location, feature_names, column_lengths, data_points = mk.process_stream(mk.read_raw_stream(path))
+    expected = mk.process_data(mk.read_raw_file(path))
+    assert location == expected[0]
+    assert feature_names == expected[1]
+    assert list(data_points) == expected[3]
+
+def test_process_stream_is_lazy():
+    location, feature_names, column_lengths, data_points = mk.process_stream(iter(export_lines))
+    assert next(data_points)[0] == '2018-09-22T04:30:36.258478152Z'
+    assert next(data_points)[1] == '78.36761474609375'
+    assert next(data_points)[6] == '47.24'
+
+def test_process_stream_last_column_without_padding():
+    location, feature_names, column_lengths, data_points = mk.process_stream(export_lines)
+    assert feature_names[-1] == 'tsl'
+    assert next(data_points)[-1] == '0'
+
+def test_convert_file(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    file = mk.convert_file(path, str(tmp_path), 'test')
+    assert os.path.basename(file) == 'test_2018-09-22T04:30:36_office_2018-09-22T04:31:07.csv'
+    with open(file) as fh:
+        lines = fh.read().splitlines()
+    assert lines[0] == 'ID,time,co2_hum,co2_ppm,co2_tmp,ec,ph,rpi_t,rtd_t,tsl'
+    assert lines[3] == '3,2018-09-22T04:31:03.339845297Z,,,,,,47.24,,'
+    assert lines.__len__() == 5
+    assert [f for f in os.listdir(str(tmp_path)) if f.endswith('.part')] == []
+
+def test_write_csv_stream_no_data_points(tmp_path):
+    with pytest.raises(mk.NoDataPoints):
+        mk.write_csv_stream(str(tmp_path), None, 'office', ['time'], iter([]))
+    assert os.listdir(str(tmp_path)) == []
+
+# the last time has 67 seconds, the file name cannot be built from it
+malformed_export_lines = export_lines[:6] + [export_lines[6].replace('04:31:07', '04:31:67')] + export_lines[7:]
+
+def test_convert_file_malformed_time_leaves_no_part(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', malformed_export_lines)
+    with pytest.raises(mk.mikrolab_time.MalformedTimestamps):
+        mk.convert_file(path, str(tmp_path))
+    assert os.listdir(str(tmp_path)) == ['export.csv']
+
+def test_write_csv_stream_failing_data_points_leave_no_part(tmp_path):
+    def data_points():
+        yield ['2018-09-22T04:30:36.258478152Z', '78.4']
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        mk.write_csv_stream(str(tmp_path), None, 'office', ['time', 'co2_hum'], data_points())
+    assert os.listdir(str(tmp_path)) == []
+
+def test_write_npz_file_error_leaves_no_part(tmp_path, monkeypatch):
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, typed=True)
+    monkeypatch.setattr(mk.np, 'savez', lambda fh, **columns: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        mk.write_npz_file(str(tmp_path), None, location, feature_names, columns)
+    assert os.listdir(str(tmp_path)) == []
+
+# numpy engine
+
+def test_read_columns_engines_are_equal(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    location, feature_names, column_lengths, columns = mk.read_columns(path, engine='numpy')
+    expected = mk.read_columns(path, engine='python')
+    assert location == expected[0]
+    assert feature_names == expected[1]
+    for name in feature_names:
+        np.testing.assert_array_equal(columns[name], expected[3][name])
+
+def test_read_columns_numpy_values(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    location, feature_names, column_lengths, columns = mk.read_columns(path, engine='numpy')
+    assert columns['time'][2] == b'2018-09-22T04:31:03.339845297Z'
+    assert columns['co2_hum'].dtype == np.float64
+    assert columns['co2_hum'][0] == 78.3966064453125
+    assert np.isnan(columns['co2_hum'][2])
+    assert columns['rpi_t'][2] == 47.24
+    assert columns['tsl'][[0, 1, 3]].tolist() == [0, 0, 0]
+
+def test_read_columns_numpy_windows_line_endings(tmp_path):
+    path = tmp_path / 'export.csv'
+    path.write_bytes('\r\n'.join(export_lines).encode())
+    columns = mk.read_columns(str(path), engine='numpy')[3]
+    assert columns['time'].__len__() == 4
+    assert columns['tsl'][[0, 1, 3]].tolist() == [0, 0, 0]
+
+def test_read_columns_numpy_FileTooShort():
+    path = './datasource/influx-export_testfile_header_only.csv'
+    with pytest.raises(mk.FileTooShort):
+        mk.read_columns(path, engine='numpy')
+
+def test_read_columns_unknown_engine(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    with pytest.raises(ValueError):
+        mk.read_columns(path, engine='nonsense')
+
+# typed columns
+
+def test_process_data_typed():
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, typed=True)
+    assert columns['time'].dtype == np.dtype('datetime64[ns]')
+    assert columns['time'][0] == np.datetime64('2018-09-22T04:30:36.258478152')
+    assert columns['co2_hum'].dtype == np.float64
+    assert np.isnan(columns['co2_hum'][2])
+    assert columns['rpi_t'][2] == 47.24
+
+def test_process_data_typed_malformed_time():
+    lines = export_lines[:4] + ['2018-09-22T04:30:52.1401Z0' + export_lines[4][26:]] + export_lines[5:]
+    with pytest.raises(mk.mikrolab_time.MalformedTimestamps) as error:
+        mk.process_data(lines, typed=True)
+    assert error.value.rows.tolist() == [1]
+
+def test_target_filename_malformed_time():
+    with pytest.raises(mk.mikrolab_time.MalformedTimestamps):
+        mk.target_filename(None, 'office', '2018-09-22T04:30:36.258478152Z', '2018-09-22 04:31:07Z')
+
+def test_process_data_typed_float32():
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, typed=True, dtype=np.float32)
+    assert all(columns[name].dtype == np.float32 for name in feature_names[1:])
+
+def test_process_data_as_frame():
+    location, feature_names, column_lengths, frame = mk.process_data(export_lines, as_frame=True)
+    assert frame.index.name == 'time'
+    assert list(frame.columns) == feature_names[1:]
+    assert frame.shape == (4, 8)
+    assert frame['co2_ppm'].iloc[1] == 383.2767333984375
+
+def test_read_columns_as_frame_same_as_process_data(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines)
+    frame = mk.read_columns(path, as_frame=True)[3]
+    expected = mk.process_data(mk.read_raw_file(path), as_frame=True)[3]
+    assert frame.equals(expected)
+
+# binary columnar output
+
+def test_parse_target_filename():
+    filename = mk.target_filename('lab', 'office_2', '2018-09-22T04:30:36.258478152Z', '2018-09-23T04:30:36.258Z')
+    assert mk.parse_target_filename(filename, 'lab') == ('office_2', '2018-09-22T04:30:36', '2018-09-23T04:30:36')
+    assert mk.parse_target_filename('/tmp/2018-09-22T04:30:36_office_2018-09-22T04:31:07.csv')[0] == 'office'
+
+def test_write_npz_file_round_trip(tmp_path):
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, typed=True)
+    file = mk.write_npz_file(str(tmp_path), 'test', location, feature_names, columns)
+    assert os.path.basename(file) == 'test_2018-09-22T04:30:36_office_2018-09-22T04:31:07.npz'
+    names, loaded = mk.read_npz_file(file)
+    assert names == feature_names
+    for name in feature_names:
+        assert isinstance(loaded[name], np.memmap)
+        np.testing.assert_array_equal(loaded[name], columns[name])
+
+def test_write_npz_file_compressed(tmp_path):
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, typed=True)
+    file = mk.write_npz_file(str(tmp_path), None, location, feature_names, columns, compress=True)
+    names, loaded = mk.read_npz_file(file)
+    for name in feature_names:
+        assert not isinstance(loaded[name], np.memmap)
+        np.testing.assert_array_equal(loaded[name], columns[name])
+
+def test_write_npz_file_untyped_columns(tmp_path):
+    location, feature_names, column_lengths, columns = mk.read_columns(_write_export(tmp_path / 'export.csv', export_lines))
+    file = mk.write_npz_file(str(tmp_path), None, location, feature_names, columns)
+    assert mk.read_npz_file(file)[1]['time'].dtype == np.dtype('datetime64[ns]')
+
+# incremental conversion
+
+def _read_lines(path):
+    with open(path) as fh:
+        return fh.read().splitlines()
+
+def test_convert_incremental_appends_new_rows(tmp_path):
+    source = tmp_path / 'export.csv'
+    target = tmp_path / 'converted'
+    target.mkdir()
+    _write_export(source, export_lines[:5])
+    first = mk.convert_incremental(str(source), str(target))
+    assert os.path.basename(first) == '2018-09-22T04:30:36_office_2018-09-22T04:30:52.csv'
+
+    with open(str(source), 'a') as fh:
+        fh.write('\n'.join(export_lines[5:]) + '\n')
+    second = mk.convert_incremental(str(source), str(target))
+    assert os.path.basename(second) == '2018-09-22T04:30:36_office_2018-09-22T04:31:07.csv'
+    assert not os.path.exists(first)
+
+    expected = mk.convert_file(str(source), str(tmp_path))
+    assert _read_lines(second) == _read_lines(expected)
+
+class _Mirror(io.StringIO):
+    # the converted file is still being written when the mirror gets rows
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.while_writing = []
+
+    def write(self, data):
+        self.while_writing.append(any(name.endswith('.part') for name in os.listdir(self.directory)))
+        return super().write(data)
+
+def test_convert_file_mirror(tmp_path):
+    source = _write_export(tmp_path / 'export.csv', export_lines)
+    mirror = _Mirror(str(tmp_path))
+    path = mk.convert_file(source, str(tmp_path), mirror=mirror)
+    assert mirror.getvalue().splitlines() == _read_lines(path)
+    assert all(mirror.while_writing)
+
+def test_convert_incremental_mirror_gets_whole_file(tmp_path):
+    source = tmp_path / 'export.csv'
+    target = tmp_path / 'converted'
+    target.mkdir()
+    _write_export(source, export_lines[:5])
+    first = mk.convert_incremental(str(source), str(target), mirror=io.StringIO())
+    with open(str(source), 'a') as fh:
+        fh.write('\n'.join(export_lines[5:]) + '\n')
+    mirror = io.StringIO()
+    second = mk.convert_incremental(str(source), str(target), mirror=mirror)
+    assert mirror.getvalue().splitlines() == _read_lines(second)
+
+def test_convert_incremental_no_new_rows(tmp_path):
+    source = _write_export(tmp_path / 'export.csv', export_lines)
+    first = mk.convert_incremental(source, str(tmp_path))
+    assert mk.convert_incremental(source, str(tmp_path)) == first
+    assert _read_lines(first).__len__() == 5
+
+def test_convert_incremental_skips_incomplete_line(tmp_path):
+    source = tmp_path / 'export.csv'
+    _write_export(source, export_lines[:4])
+    with open(str(source), 'a') as fh:
+        fh.write(export_lines[4][:40])
+    first = mk.convert_incremental(str(source), str(tmp_path))
+    assert _read_lines(first).__len__() == 2
+
+    with open(str(source), 'a') as fh:
+        fh.write(export_lines[4][40:] + '\n')
+    second = mk.convert_incremental(str(source), str(tmp_path))
+    assert _read_lines(second)[2] == '2,' + ','.join(mk.process_data(export_lines)[3][1])
+
+def test_convert_incremental_rebuilds_on_header_change(tmp_path):
+    source = tmp_path / 'export.csv'
+    target = tmp_path / 'converted'
+    target.mkdir()
+    _write_export(source, export_lines)
+    first = mk.convert_incremental(str(source), str(target))
+    _write_export(source, ['name: lab'] + export_lines[1:])
+    second = mk.convert_incremental(str(source), str(target))
+    assert os.path.basename(second) == '2018-09-22T04:30:36_lab_2018-09-22T04:31:07.csv'
+    assert [f for f in os.listdir(str(target)) if f.endswith('.csv')] == [os.path.basename(second)]
+    assert _read_lines(second).__len__() == 5
+
+def test_convert_incremental_rebuilds_on_rewritten_export(tmp_path):
+    source = tmp_path / 'export.csv'
+    _write_export(source, export_lines[:5])
+    mk.convert_incremental(str(source), str(tmp_path))
+    _write_export(source, export_lines[:4] + export_lines[5:])
+    path = mk.convert_incremental(str(source), str(tmp_path))
+    assert [line.split(',')[1] for line in _read_lines(path)[1:]] == \
+        ['2018-09-22T04:30:36.258478152Z', '2018-09-22T04:31:03.339845297Z', '2018-09-22T04:31:07.972184149Z']
+
+# parallel conversion
+
+def _write_long_export(path, repeat=8000):
+    return _write_export(path, export_lines[:3] + [line for line in export_lines[3:] for _ in range(repeat)])
+
+def test_convert_file_parallel_same_as_serial(tmp_path):
+    path = _write_long_export(tmp_path / 'export.csv')
+    serial = tmp_path / 'serial'
+    parallel = tmp_path / 'parallel'
+    serial.mkdir()
+    parallel.mkdir()
+    expected = mk.convert_file(path, str(serial))
+    file = mk.convert_file(path, str(parallel), workers=2)
+    assert os.path.basename(file) == os.path.basename(expected)
+    assert _read_lines(file) == _read_lines(expected)
+    assert _read_lines(file)[-1].startswith('32000,')
+
+def test_ordered_results_bounds_chunks_in_flight():
+    submitted = []
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        original = pool.submit
+        pool.submit = lambda *arguments: submitted.append(arguments) or original(*arguments)
+        results = []
+        for result in mk._ordered_results(pool, lambda value: value * 2, [(value,) for value in range(20)], 3):
+            assert submitted.__len__() - results.__len__() <= 3
+            results.append(result)
+    assert results == [value * 2 for value in range(20)]
+
+def test_read_columns_parallel_same_as_serial(tmp_path):
+    path = _write_long_export(tmp_path / 'export.csv')
+    expected = mk.read_columns(path)[3]
+    for engine in ['numpy', 'python']:
+        columns = mk.read_columns(path, engine=engine, workers=2)[3]
+        for name in expected:
+            np.testing.assert_array_equal(columns[name], expected[name])
+
+def test_split_export_ranges_are_aligned(tmp_path):
+    path = _write_long_export(tmp_path / 'export.csv')
+    location, feature_names, column_lengths, ranges = mk._split_export(path, 4, 8)
+    assert ranges.__len__() == 8
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    assert ranges[0][0] == len(b''.join(data.splitlines(True)[:3]))
+    assert ranges[-1][1] == len(data)
+    for start, end in ranges:
+        assert data[end - 1:end] == b'\n'
+
+def test_split_export_caps_chunk_size(tmp_path):
+    path = _write_long_export(tmp_path / 'export.csv')
+    ranges = mk._split_export(path, 4, 2, minimal_chunk=1 << 10, maximal_chunk=1 << 12)[3]
+    assert ranges.__len__() > 2
+    assert max(end - start for start, end in ranges) <= (1 << 12) + 200
+    ranges = mk._split_export(path, 4, 2, minimal_chunk=1 << 10)[3]
+    assert ranges.__len__() == 2
+
+# batch conversion
+
+def _write_exports(directory):
+    directory.mkdir()
+    _write_export(directory / 'export_1.csv', export_lines[:5])
+    _write_export(directory / 'export_2.csv', export_lines[:3] + export_lines[4:])
+    return str(directory)
+
+def test_convert_directory_converts_every_export(tmp_path):
+    source_directory = _write_exports(tmp_path / 'exports')
+    files = mk.convert_directory(source_directory, str(tmp_path), workers=2)
+    assert [os.path.basename(file) for file in files] == ['2018-09-22T04:30:36_office_2018-09-22T04:30:52.csv',
+                                                          '2018-09-22T04:30:52_office_2018-09-22T04:31:07.csv']
+    assert files[1] == mk.convert_file(os.path.join(source_directory, 'export_2.csv'), str(tmp_path))
+
+def test_convert_directory_skips_converted_exports(tmp_path):
+    source_directory = _write_exports(tmp_path / 'exports')
+    files = mk.convert_directory(source_directory, str(tmp_path), workers=1)
+    os.remove(files[0])
+    with open(files[1], 'w') as fh:
+        fh.write('unchanged')
+    assert mk.convert_directory(source_directory, str(tmp_path), workers=1) == files
+    assert _read_lines(files[0])[-1].startswith('2,')
+    assert _read_lines(files[1]) == ['unchanged']
+
+def test_convert_directory_replaces_output_of_changed_export(tmp_path):
+    source_directory = _write_exports(tmp_path / 'exports')
+    files = mk.convert_directory(source_directory, str(tmp_path), workers=1)
+    _write_export(tmp_path / 'exports' / 'export_1.csv', export_lines[:6])
+    changed = mk.convert_directory(source_directory, str(tmp_path), workers=1)
+    assert os.path.basename(changed[0]) == '2018-09-22T04:30:36_office_2018-09-22T04:31:03.csv'
+    assert changed[1] == files[1]
+    assert not os.path.exists(files[0])
+
+def test_convert_directory_keeps_going_after_broken_export(tmp_path):
+    source_directory = _write_exports(tmp_path / 'exports')
+    _write_export(tmp_path / 'exports' / 'broken.csv', export_lines[:2])
+    files = mk.convert_directory(source_directory, str(tmp_path), workers=1)
+    assert files.__len__() == 2
+
+def test_convert_directory_keeps_going_after_malformed_export(tmp_path):
+    source_directory = _write_exports(tmp_path / 'exports')
+    _write_export(tmp_path / 'exports' / 'malformed.csv', malformed_export_lines)
+    with open(tmp_path / 'exports' / 'undecodable.csv', 'wb') as fh:
+        fh.write(''.join(export_lines).encode().replace(b'office', b'\xff\xfe'))
+    files = mk.convert_directory(source_directory, str(tmp_path), workers=1)
+    assert files.__len__() == 2
+    manifest = mk._read_checkpoint(str(tmp_path / '.manifest'))
+    assert sorted(manifest) == ['export_1.csv', 'export_2.csv']
+
+# merging sparse rpi_t rows
+
+def test_process_data_merges_sparse_rows():
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, merge_tolerance=30)
+    assert columns['time'].__len__() == 3
+    assert columns['time'][2] == np.datetime64('2018-09-22T04:31:07.972184149')
+    assert columns['rpi_t'][2] == 47.24
+    assert np.isnan(columns['rpi_t'][:2]).all()
+
+def test_merge_sparse_rows_outside_tolerance():
+    location, feature_names, column_lengths, columns = mk.process_data(export_lines, merge_tolerance=2)
+    assert columns['time'].__len__() == 4
+
+def test_merge_sparse_rows_closest_wins():
+    feature_names = ['time', 'co2_hum', 'rpi_t']
+    columns = {
+        'time': np.array(['2018-09-22T04:30:00', '2018-09-22T04:30:10', '2018-09-22T04:30:14', '2018-09-22T04:31:00'],
+                         dtype='datetime64[ns]'),
+        'co2_hum': np.array([np.nan, 78.4, np.nan, np.nan]),
+        'rpi_t': np.array([47.1, np.nan, 47.2, 47.3]),
+    }
+    merged = mk.merge_sparse_rows(feature_names, columns, tolerance=30)
+    assert merged['time'].tolist() == columns['time'][[0, 1, 3]].tolist()
+    assert merged['rpi_t'].tolist() == [47.1, 47.2, 47.3]
+    assert merged['co2_hum'][1] == 78.4
+
+def test_merge_sparse_rows_keeps_reading_when_target_has_one():
+    feature_names = ['time', 'co2_hum', 'rpi_t']
+    columns = {
+        'time': np.array(['2018-09-22T04:30:00', '2018-09-22T04:30:05'], dtype='datetime64[ns]'),
+        'co2_hum': np.array([78.4, np.nan]),
+        'rpi_t': np.array([40.0, 47.2]),
+    }
+    merged = mk.merge_sparse_rows(feature_names, columns, tolerance=30)
+    assert merged['time'].tolist() == columns['time'].tolist()
+    assert merged['rpi_t'].tolist() == [40.0, 47.2]
+
+def test_merge_sparse_rows_merges_all_values_or_none():
+    feature_names = ['time', 'co2_hum', 'rpi_t', 'rtd_t']
+    columns = {
+        'time': np.array(['2018-09-22T04:30:00', '2018-09-22T04:30:05'], dtype='datetime64[ns]'),
+        'co2_hum': np.array([78.4, np.nan]),
+        'rpi_t': np.array([np.nan, 47.2]),
+        'rtd_t': np.array([12.8, 12.9]),
+    }
+    merged = mk.merge_sparse_rows(feature_names, columns, tolerance=30, sparse_features=('rpi_t', 'rtd_t'))
+    assert np.isnan(merged['rpi_t'][0])
+    assert merged['rpi_t'][1] == 47.2
+    assert merged['rtd_t'].tolist() == [12.8, 12.9]
+
+def test_merge_sparse_frame_keeps_timezone():
+    location, feature_names, column_lengths, frame = mk.process_data(export_lines, as_frame=True)
+    frame.index = frame.index.tz_localize('UTC')
+    merged = mk.merge_sparse_frame(frame, tolerance=30)
+    assert str(merged.index.tz) == 'UTC'
+    assert merged.shape == (3, 8)
+    assert merged['rpi_t'].iloc[2] == 47.24
+
+# multiple blocks
+
+lab_lines = [
+    "name: lab",
+    "time                           co2_hum           co2_ppm            co2_tmp            ec                 ph    rpi_t rtd_t  tsl",
+    "----                           -------           -------            -------            --                 --    ----- -----  ---",
+    "2018-09-23T10:00:00.5Z         60.968017578125   350.97528076171875 22.901123046875    0.907              5.052       19.319 65.3",
+    "2018-09-23T10:00:15.25Z                                                                                         48.31",
+]
+
+def _write_blocks(path):
+    return _write_export(path, export_lines[:5] + [""] + lab_lines + [""] + export_lines[:3] + export_lines[5:])
+
+def test_index_blocks(tmp_path):
+    path = _write_blocks(tmp_path / 'export.csv')
+    blocks = mk.index_blocks(path)
+    assert [block[0] for block in blocks] == ['office', 'lab', 'office']
+    assert blocks[0][1] == 0
+    assert blocks[-1][3] == os.path.getsize(path)
+    for block, following in zip(blocks, blocks[1:]):
+        assert block[3] == following[1]
+
+def test_convert_blocks_one_file_per_location(tmp_path):
+    path = _write_blocks(tmp_path / 'export.csv')
+    target = tmp_path / 'converted'
+    target.mkdir()
+    office, lab = mk.convert_blocks(path, str(target))
+    assert os.path.basename(lab) == '2018-09-23T10:00:00_lab_2018-09-23T10:00:15.csv'
+    assert _read_lines(lab)[2] == '2,2018-09-23T10:00:15.25Z,,,,,,48.31,,'
+    assert os.path.basename(office) == '2018-09-22T04:30:36_office_2018-09-22T04:31:07.csv'
+    assert _read_lines(office) == _read_lines(mk.convert_file(_write_export(tmp_path / 'office.csv', export_lines),
+                                                              str(tmp_path)))
+
+def test_convert_blocks_parallel(tmp_path):
+    path = _write_blocks(tmp_path / 'export.csv')
+    serial = tmp_path / 'serial'
+    parallel = tmp_path / 'parallel'
+    serial.mkdir()
+    parallel.mkdir()
+    expected = mk.convert_blocks(path, str(serial))
+    files = mk.convert_blocks(path, str(parallel), workers=2)
+    assert [os.path.basename(file) for file in files] == [os.path.basename(file) for file in expected]
+    for file, expected_file in zip(files, expected):
+        assert _read_lines(file) == _read_lines(expected_file)
+
+def test_convert_blocks_parses_every_block_of_a_location(tmp_path, monkeypatch):
+    # five blocks of one location, one after the other in time
+    lines = []
+    for day in range(5):
+        lines += export_lines[:3] + [line.replace('2018-09-22', '2018-09-2{}'.format(day)) for line in export_lines[3:-1]]
+    path = _write_export(tmp_path / 'export.csv', lines)
+    parse_block = mk._parse_block
+    parsed = []
+    monkeypatch.setattr(mk, '_parse_block', lambda *arguments: parsed.append(arguments) or parse_block(*arguments))
+    (tmp_path / 'serial').mkdir()
+    (office,) = mk.convert_blocks(path, str(tmp_path / 'serial'))
+    assert parsed.__len__() == 5
+    assert _read_lines(office)[-1].startswith('20,2018-09-24T04:31:07')
+
+    monkeypatch.setattr(mk, '_parse_block', parse_block)
+    (tmp_path / 'parallel').mkdir()
+    (parallel,) = mk.convert_blocks(path, str(tmp_path / 'parallel'), workers=2)
+    assert _read_lines(parallel) == _read_lines(office)
+
+def test_convert_blocks_different_columns(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines + ["name: office", "time  ph", "----  --", "2018-09-23T10:00:00Z 5.1"])
+    with pytest.raises(mk.HeaderBroken):
+        mk.convert_blocks(path, str(tmp_path))
+
+def test_convert_blocks_broken_block_header(tmp_path):
+    broken = [lab_lines[0].replace('lab', 'kitchen'), lab_lines[1], "---- broken separator x"] + lab_lines[3:]
+    path = _write_export(tmp_path / 'export.csv', export_lines[:5] + broken + export_lines[:3] + export_lines[5:])
+    with pytest.raises(mk.HeaderBroken) as error:
+        mk.index_blocks(path)
+    assert error.value.header[0] == 'name: kitchen'
+    with pytest.raises(mk.HeaderBroken):
+        mk.convert_blocks(path, str(tmp_path))
+    assert os.listdir(str(tmp_path)) == ['export.csv']
+
+def test_convert_blocks_no_header(tmp_path):
+    path = _write_export(tmp_path / 'export.csv', export_lines[1:])
+    with pytest.raises(mk.HeaderBroken):
+        mk.convert_blocks(path, str(tmp_path))
@@ -0,0 +1,98 @@
+import mikrolab_charts as charts
+import mikrolab_source_data as mk
+import mikrolab_stats as stats
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_mikrolab_source_data as source_data
+
+
+def _values(size=100000, seed=0):
+    random = np.random.default_rng(seed)
+    return np.concatenate([random.normal(400.0, 30.0, size), random.exponential(5.0, size // 10) + 1e6])
+
+def _accumulate(values, parts):
+    accumulated = {}
+    for part in np.array_split(values, parts):
+        partial = stats.update_stats({}, ['time', 'x'], {'x': part})
+        stats.merge_stats(accumulated, partial)
+    return accumulated['x']
+
+
+# test the accumulator
+
+def test_moments_are_exact():
+    values = _values()
+    entry = _accumulate(values, 1)
+    assert entry['count'] == values.size
+    assert entry['mean'] == pytest.approx(values.mean(), rel=1e-12)
+    assert np.sqrt(entry['m2'] / (entry['count'] - 1)) == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert (entry['min'], entry['max']) == (values.min(), values.max())
+
+def test_merged_parts_same_as_one_pass():
+    values = _values()
+    whole, merged = _accumulate(values, 1), _accumulate(values, 7)
+    assert merged['count'] == whole['count'] and merged['bins'].sum() == values.size
+    assert merged['mean'] == pytest.approx(whole['mean'], rel=1e-12)
+    assert merged['m2'] == pytest.approx(whole['m2'], rel=1e-9)
+    assert merged['bins'].size <= stats.MAX_BINS
+
+def test_quantiles_within_one_bin():
+    values = np.random.default_rng(1).normal(12.8, 2.0, 200000)
+    entry = _accumulate(values, 5)
+    width = 2.0 ** entry['exponent']
+    for q in [0.01, 0.25, 0.5, 0.75, 0.99]:
+        assert abs(stats.quantile(entry, q) - np.quantile(values, q)) <= width
+
+def test_nan_values_are_skipped():
+    entry = stats.update_stats({}, ['time', 'x'], {'x': np.array([1.0, np.nan, 3.0])})['x']
+    assert entry['count'] == 2 and entry['mean'] == 2.0
+
+def test_describe_same_as_pandas():
+    location, feature_names, column_lengths, data = mk.process_data(source_data.export_lines, as_frame=True)
+    description = stats.describe(stats.frame_stats(data))
+    expected = data.describe()
+    for row in ['count', 'mean', 'std', 'min', 'max']:
+        pd.testing.assert_series_equal(description.loc[row], expected.loc[row], check_names=False)
+
+def test_histogram_counts_every_value():
+    values = _values(10000)
+    counts, edges = stats.histogram(_accumulate(values, 3), 30)
+    assert counts.sum() == values.size and edges.size == 31
+    assert edges[0] == values.min() and edges[-1] == values.max()
+
+
+# test collecting while streaming
+
+def test_process_data_collects_stats():
+    collected = {}
+    location, feature_names, column_lengths, columns = mk.process_data(
+        source_data.export_lines, typed=True, stats=collected)
+    assert collected['co2_hum']['count'] == 3
+    assert collected['rpi_t']['max'] == 47.24
+    assert collected['tsl']['mean'] == 0.0
+
+def test_convert_file_parallel_stats_same_as_serial(tmp_path):
+    path = str(tmp_path / 'export.csv')
+    source_data._write_long_export(path, repeat=2000)
+    serial, parallel = {}, {}
+    mk.convert_file(path, str(tmp_path), stats=serial)
+    mk.convert_file(path, str(tmp_path), workers=2, stats=parallel)
+    for name, entry in serial.items():
+        assert parallel[name]['count'] == entry['count']
+        assert parallel[name]['mean'] == pytest.approx(entry['mean'], rel=1e-12)
+        assert parallel[name]['m2'] == pytest.approx(entry['m2'], rel=1e-9, abs=1e-9)
+
+def test_stats_from_export(tmp_path):
+    path = source_data._write_export(tmp_path / 'export.csv', source_data.export_lines)
+    assert stats.stats_from_export(path)['ec']['count'] == 3
+
+def test_desc_num_feature_from_stats(tmp_path):
+    location, feature_names, column_lengths, data = mk.process_data(source_data.export_lines, as_frame=True)
+    filename = charts.desc_num_feature(None, 'co2_hum', str(tmp_path / 'co2_hum.png'), dpi=50,
+                                       stats=stats.frame_stats(data))
+    assert os.path.getsize(filename) > 0
@@ -0,0 +1,42 @@
+import mikrolab_source_data as mk
+import mikrolab_synthetic as synthetic
+
+import numpy as np
+
+
+# test generated exports
+
+def test_generate_lines_header_layout():
+    lines = list(synthetic.generate_lines(10))
+    location, feature_names, column_lengths = mk.process_stream(lines)[:3]
+    assert location == 'office'
+    assert feature_names == [name for name, width in synthetic.LAYOUT]
+    assert column_lengths[:-1] == [width for name, width in synthetic.LAYOUT][:-1]
+    assert lines.__len__() == 13
+
+def test_generate_lines_sparse_rows():
+    location, feature_names, column_lengths, data_points = mk.process_data(list(synthetic.generate_lines(10)))
+    assert [bool(row[6]) for row in data_points] == [False, False, False, False, True] * 2
+    assert all(row[1:6] + row[7:] == [''] * 7 for row in data_points[4::5])
+    times = [row[0] for row in data_points]
+    assert times == sorted(times)
+
+def test_generate_lines_blank_cells():
+    location, feature_names, column_lengths, columns = mk.process_data(
+        list(synthetic.generate_lines(5000, sparse_every=0, blank_probability=0.1)), typed=True)
+    blank = np.isnan(columns['co2_hum']).mean()
+    assert 0.05 < blank < 0.15
+    assert np.isnan(columns['rpi_t']).all()
+
+def test_generate_lines_chunks_stay_ordered():
+    lines = list(synthetic.generate_lines(100, chunk_size=7))
+    assert lines.__len__() == 103
+    assert lines[3:] == sorted(lines[3:])
+    assert list(synthetic.generate_lines(100, chunk_size=7)) == lines
+    assert list(synthetic.generate_lines(100, chunk_size=7, seed=1)) != lines
+
+def test_write_export(tmp_path):
+    path = synthetic.write_export(str(tmp_path / 'export.csv'), 1000)
+    assert mk.read_raw_file(path).__len__() == 1003
+    with open(path, 'rb') as fh:
+        assert fh.readline().endswith(b'\r\n')
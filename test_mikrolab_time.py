@@ -0,0 +1,97 @@
+import mikrolab_time as mt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+times = [
+    '2018-09-22T04:30:36.258478152Z',
+    '2018-09-22T04:30:52.93403931Z',
+    '2018-09-22T04:31:03.5Z',
+    '2018-09-22T04:31:07Z',
+    '2018-09-22T04:31:07.000000001',
+    '2000-02-29T23:59:59.999999999Z',
+    '1969-12-31T23:59:59.9Z',
+    '2100-03-01T00:00:00Z',
+]
+
+malformed = [
+    '2018-13-22T04:30:36Z',
+    '2019-02-29T04:30:36Z',
+    '2018-09-22 04:30:36Z',
+    '2018-09-22T24:00:00Z',
+    '2018-09-22T04:60:00Z',
+    '2018-09-22T04:30:60Z',
+    '2018-09-22T04:30:36.Z',
+    '2018-09-22T04:30:36.1234567891Z',
+    '2018-09-22T04:30:36ZZ',
+    '2018-09-22T04:30:36.1Z2',
+    '2018-09-22T04:30:36.12a',
+    '2018-09-22T04:30:3612',
+    '2018-09-22T04:30:36+01:00',
+    '2018-09-22',
+    'nan',
+    '',
+]
+
+
+# test decoding
+
+def test_decode_times_same_as_pandas():
+    expected = pd.to_datetime(times, utc=True, format='ISO8601').as_unit('ns').asi8
+    np.testing.assert_array_equal(mt.decode_times(times), expected)
+
+@pytest.mark.parametrize('values', [np.array(times, dtype='S'), np.array(times, dtype=object), times])
+def test_decode_times_input_types(values):
+    np.testing.assert_array_equal(mt.decode_times(values), mt.decode_times(np.array(times)))
+
+def test_decode_times_blocks(monkeypatch):
+    monkeypatch.setattr(mt, 'BLOCK_SIZE', 3)
+    expected = pd.to_datetime(times, utc=True, format='ISO8601').as_unit('ns').asi8
+    np.testing.assert_array_equal(mt.decode_times(times), expected)
+
+def test_decode_times_empty():
+    assert mt.decode_times([]).size == 0
+
+def test_decode_time():
+    assert mt.decode_time(b'1970-01-01T00:00:01.5Z') == 1500000000
+
+def test_decode_times_numpy_str():
+    time = np.datetime64('2018-09-22T04:30:36.258478152', 'ns')
+    assert mt.decode_time(str(time)) == time.astype(np.int64)
+
+
+# test malformed times
+
+@pytest.mark.parametrize('value', malformed)
+def test_malformed_rows(value):
+    assert mt.malformed_rows(times[:3] + [value] + times[3:]).tolist() == [3]
+
+def test_decode_times_raises_with_rows():
+    with pytest.raises(mt.MalformedTimestamps) as error:
+        mt.decode_times(times + malformed[:2])
+    assert error.value.rows.tolist() == [times.__len__(), times.__len__() + 1]
+    assert malformed[0] in error.value.message
+
+def test_decode_times_coerce():
+    nanoseconds = mt.decode_times([times[0], malformed[0]], errors='coerce')
+    assert nanoseconds[1] == mt.NAT
+    assert np.isnat(nanoseconds.view('datetime64[ns]')[1])
+
+def test_decode_times_unknown_errors():
+    with pytest.raises(ValueError):
+        mt.decode_times(times, errors='ignore')
+
+def test_malformed_rows_non_ascii():
+    assert mt.malformed_rows([times[0], 'xé']).tolist() == [1]
+
+
+# test conversions
+
+def test_to_datetime_same_as_pandas():
+    expected = pd.DatetimeIndex(pd.to_datetime(times, utc=True, format='ISO8601')).as_unit('ns')
+    pd.testing.assert_index_equal(mt.to_datetime(times), expected)
+
+def test_format_seconds():
+    assert mt.format_seconds(mt.decode_times(times[:2])).tolist() == ['2018-09-22T04:30:36', '2018-09-22T04:30:52']